@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import pathlib
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'costsummary.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,9 +91,32 @@ DATABASES = {
       'OPTIONS': {
         'timeout': 20,
     }
-    }
+    },
+    # read-only connection to the same file for statistics & exports
+    'reporting': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': pathlib.Path(BASE_DIR, 'db.sqlite3').as_uri() + '?mode=ro',
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+# alias of long reporting reads, see costsummary.database.reporting_alias()
+REPORTING_DATABASE = 'reporting'
+
+# pragmas run on every new sqlite connection, on top of costsummary.database.SQLITE_PRAGMAS
+SQLITE_PRAGMAS = {}
+
+# seconds between two writes of the collected metrics to MetricSample, see costsummary.metrics
+METRICS_FLUSH_INTERVAL = 60
+
+# release the metrics are recorded for, charted against each other by /costsummary/metrics
+METRICS_RELEASE = os.environ.get('INBOUND_RELEASE', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
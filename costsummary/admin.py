@@ -1,11 +1,16 @@
 from django.forms import ModelForm
 from django.contrib import admin
+from django.contrib.admin.options import IS_POPUP_VAR, IncorrectLookupParameters
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.views.main import ALL_VAR, ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.paginator import Paginator
 from django.utils import timezone
 from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.shortcuts import Http404
 from django.db import connection as RawConnection
-from django.db.models import Max
+from django.db.models import IntegerField, Max, OuterRef, Q, Subquery
 from django.apps import apps
 import logging
 import os
@@ -18,6 +23,14 @@ import numpy as np
 from . import models
 from . import statistic
 from . import upload
+from . import jobs
+from .dependencies import consumers, row_keys
+from .engine import BatchCostEngine
+from .loader import EbomBulkLoader, WideTableLoader, replace_configures
+from .metrics import timed, timer
+from .resolvers import EbomCounts
+from .sheets import SheetReader, SheetSchema
+from .wide import attach_satellites
 # from django.views.decorators.csrf import csrf_protect
 # from django.utils.decorators import method_decorator
 # from django.db import models, router, transaction
@@ -34,6 +47,61 @@ admin.site.site_title = 'Inbound 数据管理'
 
 
 # Register your models here.
+class RateImpactMixin:
+    """ Rate table admin showing how many parts read a row, and asking to confirm a save with the parts it flags. """
+    impact_confirmation_template = 'costsummary/rate_impact_confirmation.html'
+
+    def get_readonly_fields(self, request, obj=None):
+        return tuple(super().get_readonly_fields(request, obj)) + ('impact_preview', )
+
+    def impact_preview(self, obj):
+        """ Parts which looked this row up as stored, or whose rate lookups are not recorded yet. """
+        _ = self
+
+        if obj is None or obj.pk is None:
+            return '-'
+
+        return '%d 个零件' % consumers(type(obj), row_keys(obj, obj.__dict__)).count()
+
+    impact_preview.short_description = '当前影响零件'
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        """ A valid submission is shown with the parts its save flags, saved once posted again with _confirm_impact.
+
+        Like mark_inputs(), parts reading the stored keys & the submitted ones
+        are counted, so a new row counts the parts it may now be matched by.
+        """
+        if request.method != 'POST' or '_confirm_impact' in request.POST or IS_POPUP_VAR in request.POST:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+        obj = self.get_object(request, unquote(object_id)) if object_id else None
+
+        if (obj is None and (object_id or not self.has_add_permission(request))) or \
+                (obj is not None and not self.has_change_permission(request, obj)):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+        keys = row_keys(obj, obj.__dict__) if obj is not None else set()
+        form = self.get_form(request, obj)(request.POST, request.FILES, instance=obj)
+
+        if not form.is_valid():
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+        # the form's instance holds the submitted values, unsaved
+        keys |= row_keys(form.instance, form.instance.__dict__)
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title='确认保存',
+            opts=self.model._meta,
+            adding=obj is None,
+            impact=consumers(self.model, keys).count(),
+            post=[(name, value) for name, values in request.POST.lists() if name != 'csrfmiddlewaretoken'
+                  for value in values],
+        )
+
+        return TemplateResponse(request, self.impact_confirmation_template, context)
+
+
 @admin.register(models.TecCore)
 class TecCoreAdmin(admin.ModelAdmin):
     """ Tec Core admin. """
@@ -74,7 +142,7 @@ class PackingFoldingRateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.WhCubePrice)
-class WhCubePriceAdmin(admin.ModelAdmin):
+class WhCubePriceAdmin(RateImpactMixin, admin.ModelAdmin):
     list_display = [
         'km',
         'cube_price',
@@ -163,7 +231,7 @@ class NominalLabelMappingAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.AirFreightRate)
-class AirFreightRateAdmin(admin.ModelAdmin):
+class AirFreightRateAdmin(RateImpactMixin, admin.ModelAdmin):
     """Nominal label mapping admin. """
     list_display = (
         'country',
@@ -279,6 +347,144 @@ class ConfValueFilter(admin.SimpleListFilter):
             return queryset
 
 
+# changelist parameters of keyset pagination: "<label id>-<id>" of the row a page follows or precedes
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+# changelist filters EbomCounts can count, by the field they filter
+COUNTED_FILTERS = {'label__id__exact': 'label_id', 'veh_pt__exact': 'veh_pt'}
+
+
+class LabelListFilter(admin.RelatedFieldListFilter):
+    """ Labels which have parts, like RelatedOnlyFieldListFilter, without scanning Ebom on every page. """
+
+    def field_choices(self, field, request, model_admin):
+        return field.get_choices(include_blank=False, limit_choices_to={'pk__in': EbomCounts.current().label_ids})
+
+
+class EbomPaginator(Paginator):
+    """ Paginator given its count, when known, instead of counting the queryset. """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, count=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+
+        if count is not None:
+            # count is a cached_property
+            self.__dict__['count'] = count
+
+
+def ebom_key(ebom_object) -> str:
+    """ Keyset pagination key of a part. """
+    return '%s-%d' % ('' if ebom_object.label_id is None else ebom_object.label_id, ebom_object.pk)
+
+
+def seek(queryset, key: str, forward=True) -> list:
+    """ Querysets of the parts after, or before, a key in (label id, id) order, read in turn.
+
+    Parts without label come first. Each queryset is a range of the label index,
+    so a page reads its own rows only.
+    """
+    label_id, _, pk = key.rpartition('-')
+
+    try:
+        label_id = int(label_id) if label_id else None
+        pk = int(pk)
+    except ValueError:
+        raise IncorrectLookupParameters('Invalid key %r.' % key)
+
+    if forward:
+        if label_id is None:
+            return [queryset.filter(label_id__isnull=True, id__gt=pk), queryset.filter(label_id__isnull=False)]
+
+        return [queryset.filter(label_id__gte=label_id).exclude(label_id=label_id, id__lte=pk)]
+
+    if label_id is None:
+        return [queryset.filter(label_id__isnull=True, id__lt=pk)]
+
+    return [queryset.filter(label_id__lte=label_id).exclude(label_id=label_id, id__gte=pk),
+            queryset.filter(label_id__isnull=True)]
+
+
+class WideChangeList(ChangeList):
+    """ Changelist whose parts get their satellites from the wide table row read along.
+
+    In the default (label id, id) order, pages are sought from the key of the
+    row before (?after=) or after (?before=) them, so a deep page costs the same
+    as the first one; sorting by a column or showing all falls back to offsets.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(AFTER_VAR)
+        self.before = request.GET.get(BEFORE_VAR)
+
+        # not a lookup of the filters
+        if self.after is not None or self.before is not None:
+            request.GET = request.GET.copy()
+            request.GET.pop(AFTER_VAR, None)
+            request.GET.pop(BEFORE_VAR, None)
+
+        self.first_url = None
+        self.next_url = None
+        self.previous_url = None
+        super().__init__(request, *args, **kwargs)
+
+    @property
+    def keyset(self) -> bool:
+        return ORDER_VAR not in self.params and not self.show_all
+
+    def get_results(self, request):
+        if self.keyset:
+            self.get_keyset_results(request)
+        else:
+            super().get_results(request)
+
+        self.result_list = attach_satellites(self.result_list)
+
+    def get_keyset_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+        # sqlite sorts NULL first, the label index serves the order
+        if self.before is not None:
+            querysets = seek(self.queryset, self.before, forward=False)
+            ordering = ('-label_id', '-id')
+        else:
+            querysets = [self.queryset] if self.after is None else seek(self.queryset, self.after)
+            ordering = ('label_id', 'id')
+
+        result_list = []
+
+        for queryset in querysets:
+            result_list += queryset.order_by(*ordering)[: self.list_per_page + 1 - len(result_list)]
+
+            if len(result_list) > self.list_per_page:
+                break
+
+        more = len(result_list) > self.list_per_page
+        result_list = result_list[: self.list_per_page]
+
+        if self.before is not None:
+            result_list.reverse()
+            has_previous, has_next = more, True
+        else:
+            has_previous, has_next = self.after is not None, more
+
+        if result_list and has_next:
+            self.next_url = self.get_query_string({AFTER_VAR: ebom_key(result_list[-1])})
+
+        if result_list and has_previous:
+            self.first_url = self.get_query_string()
+            self.previous_url = self.get_query_string({BEFORE_VAR: ebom_key(result_list[0])})
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = has_previous or has_next
+        self.paginator = paginator
+
+
 @admin.register(models.Ebom)
 class EbomAdmin(admin.ModelAdmin):
     """ EBOM admin. """
@@ -290,6 +496,15 @@ class EbomAdmin(admin.ModelAdmin):
 
     list_per_page = 20
 
+    # a page is read in one query, whatever its size; satellites come with the wide table row
+    list_select_related = ('label', 'tec', 'rel_wide')
+
+    # keyset pagination order, see WideChangeList
+    ordering = ('label_id', 'id')
+
+    # the unfiltered count is not worth a second COUNT(*) per page
+    show_full_result_count = False
+
     list_display = (
         'label',
         # 'conf',
@@ -389,7 +604,7 @@ class EbomAdmin(admin.ModelAdmin):
 
     list_filter = (
         ConfValueFilter,
-        ('label', admin.RelatedOnlyFieldListFilter),
+        ('label', LabelListFilter),
         'veh_pt',
     )
 
@@ -407,13 +622,32 @@ class EbomAdmin(admin.ModelAdmin):
         InboundCalculationInline,
     ]
 
+    def get_changelist(self, request, **kwargs):
+        return WideChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        """ Count of EbomCounts when the changelist filters by label & veh_pt at most. """
+        count = None
+        params = set(request.GET) - {PAGE_VAR, ORDER_VAR, ALL_VAR}
+
+        if params <= set(COUNTED_FILTERS):
+            try:
+                count = EbomCounts.current().count(
+                    **{COUNTED_FILTERS[param]: int(request.GET[param]) for param in params})
+            except ValueError:
+                pass
+
+        return EbomPaginator(queryset, per_page, orphans, allow_empty_first_page, count=count)
+
     def save_model(self, request, obj, form, change):
-        """ Force update and recalculate result. """
+        """ Force update. """
         change = True
         super().save_model(request, obj, form, change)
 
-        if hasattr(obj, 'rel_calc'):
-            obj.rel_calc.save(force_update=True)
+    def save_related(self, request, form, formsets, change):
+        """ Recalculate result once the inlines are saved, if any input has changed. """
+        super().save_related(request, form, formsets, change)
+        BatchCostEngine().recalculate_dirty(models.Ebom.objects.filter(pk=form.instance.pk))
 
     # 这里导致对车型筛选后不能返回全量
     # def changelist_view(self, request, extra_context=None):
@@ -430,9 +664,22 @@ class EbomAdmin(admin.ModelAdmin):
 
     #     return super(EbomAdmin, self).changelist_view(request, extra_context=extra_context)
 
+    def get_queryset(self, request):
+        """ Annotate max of configuration quantity. """
+        max_quantity = models.EbomConfiguration.objects.filter(bom=OuterRef('pk')).order_by().values('bom').annotate(
+            max_quantity=Max('quantity')).values('max_quantity')
+
+        return super().get_queryset(request).annotate(
+            max_configuration_quantity=Subquery(max_quantity, output_field=IntegerField())
+        )
+
     def get_quantity(self, obj):
         """ max of configuration quanity. """
         _ = self
+
+        if hasattr(obj, 'max_configuration_quantity'):
+            return obj.max_configuration_quantity
+
         conf_objects = obj.rel_configuration
         return conf_objects.aggregate(Max('quantity'))['quantity__max']
 
@@ -2101,152 +2348,28 @@ class AEbomEntryAdmin(admin.ModelAdmin):
 
     def load(self, request, queryset):
         """ Load ebom of selected labels """
+        loader = EbomBulkLoader()
+
         for entry_object in queryset:
             label = entry_object.label
 
             if not entry_object.whether_loaded:
-                # fetch all ebom records
-                with RawConnection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT UPC, FNA,
-                          COMPONENT_MATERIAL_NUMBER, COMPONENT_MATERIAL_DESC_E, COMPONENT_MATERIAL_DESC_C, 
-                          HEADER_PART_NUMBER, AR_EM_MATERIAL_FLAG, 
-                          WORKSHOP, DUNS_NUMBER, VENDOR_NAME, EWO_NUMBER, MODEL_OPTION, VPPS, 
-                          PACKAGE, ORDER_SAMPLE, USAGE_QTY
-                          FROM ta_ebom 
-                          WHERE MODEL_YEAR = %d AND BOOK = '%s' AND PLANT_CODE = '%s' AND MODEL = '%s'
-                    """ % (entry_object.model_year, label.book, label.plant_code, label.model))
-
-                    for row in cursor.fetchall():
-                        if row[6] == 'AR':
-                            _ar_em = True
-                        elif row[6] == 'EM':
-                            _ar_em = False
-                        else:
-                            _ar_em = None
-
-                        ebom_object, _ = models.Ebom.objects.get_or_create(
-                            label=label,
-                            upc=row[0],
-                            fna=row[1],
-                            part_number=row[2],
-                            description_en=row[3],
-                            description_cn=row[4],
-                            header_part_number=row[5],
-                            ar_em_material_indicator=_ar_em,
-                            work_shop=row[7],
-                            vendor_duns_number=row[8],
-                            supplier_name=row[9],
-                            ewo_number=row[10],
-                            model_and_option=row[11],
-                            vpps=row[12]
-                        )
-
-                        configuration_object = models.EbomConfiguration(
-                            bom=ebom_object,
-                            package=row[13],
-                            order_sample=row[14],
-                            quantity=row[15]
-                        )
-
-                        configuration_object.save()
-
-                        # create related object
-                        # tcs object
-
-                        if not hasattr(ebom_object, 'rel_tcs'):
-                            tcs_object = models.InboundTCS(
-                                bom=ebom_object
-                            )
-                            tcs_object.save()
-
-                        # buyer object
-                        if not hasattr(ebom_object, 'rel_buyer'):
-                            buyer_object = models.InboundBuyer(
-                                bom=ebom_object
-                            )
-                            buyer_object.save()
-
-                        # address object
-                        if not hasattr(ebom_object, 'rel_address'):
-                            address_object = models.InboundAddress(
-                                bom=ebom_object
-                            )
-
-                            if ebom_object.duns:
-                                supplier_queryset = models.Supplier.objects.filter(duns=ebom_object.duns)
-
-                                if supplier_queryset.count() == 1:
-                                    address_object.supplier_matched = supplier_queryset.first()
-
-                            address_object.save()
-
-                        # tcs package object
-                        if not hasattr(ebom_object, 'rel_tcs_package'):
-                            tcs_pkg_object = models.InboundTCSPackage(
-                                bom=ebom_object
-                            )
-                            tcs_pkg_object.save()
-
-                        # header part object
-                        if not hasattr(ebom_object, 'rel_header'):
-                            header_object = models.InboundHeaderPart(
-                                bom=ebom_object
-                            )
-                            header_object.save()
-
-                        # operational mode object
-                        if not hasattr(ebom_object, 'rel_op_mode'):
-                            op_mode_object = models.InboundOperationalMode(
-                                bom=ebom_object
-                            )
-                            op_mode_object.save()
-
-                        # mode object
-                        if not hasattr(ebom_object, 'rel_mode'):
-                            mode_object = models.InboundMode(
-                                bom=ebom_object
-                            )
-                            mode_object.save()
-
-                        # operational package object
-                        if not hasattr(ebom_object, 'rel_op_package'):
-                            op_pkg_object = models.InboundOperationalPackage(
-                                bom=ebom_object
-                            )
-                            op_pkg_object.save()
-
-                        # package object
-                        if not hasattr(ebom_object, 'rel_package'):
-                            pkg_object = models.InboundPackage(
-                                bom=ebom_object
-                            )
-                            pkg_object.save()
-
-                        # calculation object
-                        if not hasattr(ebom_object, 'rel_calc'):
-                            calc_object = models.InboundCalculation(
-                                bom=ebom_object
-                            )
-                            calc_object.save()
-                        # configure calculation object
-                        if not hasattr(ebom_object, 'rel_conf_calc'):
-                            conf_calc_object = models.ConfigureCalculation(bom=ebom_object)
-                            conf_calc_object.save()
-
-                    # update entry object
-                    entry_object.whether_loaded = True
-                    entry_object.loaded_time = timezone.now()
-                    entry_object.user = request.user
-                    entry_object.save()
+                # keyed lookup of existing parts, bulk insert of parts & satellites
+                loader.load_entry(entry_object)
+
+                # update entry object
+                entry_object.whether_loaded = True
+                entry_object.loaded_time = timezone.now()
+                entry_object.user = request.user
+                entry_object.save()
 
                 self.message_user(request, f"车型 {str(label)} 已成功加载.")
 
             else:
                 self.message_user(request, f"车型 {str(label)} 之前已加载.")
 
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.Ebom._meta.model_name) +
-                                        '?label__id__exact=%d' % queryset[0].label.id)
+        return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.Ebom._meta.model_name) +
+                                    '?label__id__exact=%d' % queryset[0].label.id)
 
     load.short_description = "载入选中的车型"
 
@@ -2268,6 +2391,395 @@ class UploadForm(ModelForm):
             self.add_error('label', "请指定一个车型!")
 
 
+# production upload header
+PRODUCTION_HEADER = [
+    {'r_offset': 0, 'ex_header': '基地', 'in_header': 'base', 'model_name': 'Production', 'field_name': 'base'},
+    {'r_offset': 0, 'ex_header': '工厂', 'in_header': 'plant', 'model_name': 'Production', 'field_name': 'plant'},
+    {'r_offset': 0, 'ex_header': '车型', 'in_header': 'label', 'model_name': 'Production','field_name': 'label'},
+    {'r_offset': 0, 'ex_header': '配置', 'in_header': 'configure', 'model_name': 'Production','field_name': 'configure',
+     'convert': lambda value: value.replace(' ','')},
+    {'r_offset': 0, 'ex_header': '产量', 'in_header': 'production', 'model_name': 'Production','field_name': 'production'},
+    {'r_offset': 0, 'ex_header': '产量年', 'in_header': 'prd_year', 'model_name': 'Production','field_name': 'prd_year'},
+]
+
+# tcs header
+TCS_HEADER = [
+    {'r_offset': 0, 'ex_header': 'P/N', 'in_header': 'part_number', 'skip': True},
+    {'r_offset': 0, 'ex_header': 'DUNS', 'in_header': 'duns'},
+    {'r_offset': 0, 'ex_header': 'Bidderlist No.', 'in_header': 'bidder_list_number'},
+    {'r_offset': 0, 'ex_header': 'Program', 'in_header': 'program'},
+    {'r_offset': 0, 'ex_header': 'Supplier Address', 'in_header': 'supplier_ship_from_address'},
+    {'r_offset': 0, 'ex_header': 'Process', 'in_header': 'process'},
+    {'r_offset': 0, 'ex_header': 'Suggest Delivery Method', 'in_header': 'suggest_delivery_method'},
+    {'r_offset': 0, 'ex_header': 'SGM\'s Transport Duty', 'in_header': 'sgm_transport_duty',
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'Supplier\'s Transport Duty', 'in_header': 'supplier_transport_duty',
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'SGM\'s Returnable Package Duty', 'in_header': 'sgm_returnable_duty',
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'Supplier\'s Returnable Package Duty',
+     'in_header': 'supplier_returnable_duty', 'match_display': True},
+    {'r_offset': -1, 'ex_header': '外协加工业务模式\nConsignment Mode', 'in_header': 'consignment_mode',
+     'match_display': True},
+
+    {'r_offset': 0, 'ex_header': 'Container Name', 'in_header': 'supplier_pkg_name'},
+    {'r_offset': 0, 'ex_header': 'Quantity', 'in_header': 'supplier_pkg_pcs'},
+    {'r_offset': 0, 'ex_header': 'Length', 'in_header': 'supplier_pkg_length'},
+    {'r_offset': 0, 'ex_header': 'Height', 'in_header': 'supplier_pkg_height'},
+    {'r_offset': 0, 'ex_header': 'Width', 'in_header': 'supplier_pkg_width'},
+
+    {'r_offset': 0, 'ex_header': 'GM_PKG_CONTAINER_NAME', 'in_header': 'sgm_pkg_name'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_QTY', 'in_header': 'sgm_pkg_pcs'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_LENGTH', 'in_header': 'sgm_pkg_length'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_WIDTH', 'in_header': 'sgm_pkg_width'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_HEIGHT', 'in_header': 'sgm_pkg_height'},
+]
+
+# wide table header
+WIDE_HEADER = [
+    {'r_offset': 0, 'ex_header': 'UPC', 'in_header': 'upc', 'model_name': 'ebom', 'field_name': 'upc',
+     'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'FNA', 'in_header': 'fna', 'model_name': 'ebom', 'field_name': 'fna',
+     'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'STRUCTURE NODE', 'in_header': 'structure_node', 'model_name': 'ebom',
+     'field_name': 'structure_node', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TEC NO.', 'in_header': 'tec', 'model_name': 'ebom', 'field_name': 'tec_id',
+     'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'P/N - PART NUMBER', 'in_header': 'part_number', 'model_name': 'ebom',
+     'field_name': 'part_number', 'skip': True, 'match_display': False},  # ebom lookup, not a parsed field
+    {'r_offset': 0, 'ex_header': 'DESCRIPTION EN', 'in_header': 'description_en', 'model_name': 'ebom',
+     'field_name': 'description_en', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'DESCRIPTION CN', 'in_header': 'description_cn', 'model_name': 'ebom',
+     'field_name': 'description_cn', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'HEADER PART NUMBER', 'in_header': 'header_part_number', 'model_name': 'ebom',
+     'field_name': 'header_part_number', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'QUANTITY', 'in_header': 'quantity', 'model_name': 'ebom',
+     'field_name': 'quantity', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'AR/EM MATERIAL INDICATOR', 'in_header': 'ar_em_material_indicator',
+     'model_name': 'ebom', 'field_name': 'ar_em_material_indicator', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'WORK SHOP', 'in_header': 'work_shop', 'model_name': 'ebom',
+     'field_name': 'work_shop', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'DUNS / VENDOR NUMBER', 'in_header': 'vendor_duns_number',
+     'model_name': 'ebom', 'field_name': 'vendor_duns_number', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'SUPPLIER NAME', 'in_header': 'supplier_name', 'model_name': 'ebom',
+     'field_name': 'supplier_name', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'EWO NUMBER', 'in_header': 'ewo_number', 'model_name': 'ebom',
+     'field_name': 'ewo_number', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'MODEL & OPTION', 'in_header': 'model_and_option', 'model_name': 'ebom',
+     'field_name': 'model_and_option', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'VPPS', 'in_header': 'vpps', 'model_name': 'ebom', 'field_name': 'vpps',
+     'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '头零件', 'in_header': 'get_inboundheaderpart_head_part_number',
+     'model_name': 'inboundheaderpart', 'field_name': 'head_part_number', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '头零件信息/总成供应商', 'in_header': 'get_inboundheaderpart_assembly_supplier',
+     'model_name': 'inboundheaderpart', 'field_name': 'assembly_supplier', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '头零件信息/颜色件', 'in_header': 'get_inboundheaderpart_color',
+     'model_name': 'inboundheaderpart', 'field_name': 'color', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/BIDDER号', 'in_header': 'get_inboundtcs_bidder_list_number',
+     'model_name': 'inboundtcs', 'field_name': 'bidder_list_number', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/定点项目', 'in_header': 'get_inboundtcs_program',
+     'model_name': 'inboundtcs', 'field_name': 'program', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/供应商发货地址', 'in_header': 'get_inboundtcs_supplier_ship_from_address',
+     'model_name': 'inboundtcs', 'field_name': 'supplier_ship_from_address', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/报价条款', 'in_header': 'get_inboundtcs_process',
+     'model_name': 'inboundtcs', 'field_name': 'process', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/运输模式', 'in_header': 'get_inboundtcs_suggest_delivery_method',
+     'model_name': 'inboundtcs', 'field_name': 'suggest_delivery_method', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/SGM运输责任', 'in_header': 'get_inboundtcs_sgm_transport_duty',
+     'model_name': 'inboundtcs', 'field_name': 'sgm_transport_duty', 'skip': False, 'match_display': True},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/供应商运输责任', 'in_header': 'get_inboundtcs_supplier_transport_duty',
+     'model_name': 'inboundtcs', 'field_name': 'supplier_transport_duty', 'skip': False, 'match_display': True},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/SGM外包装责任', 'in_header': 'get_inboundtcs_sgm_returnable_duty',
+     'model_name': 'inboundtcs', 'field_name': 'sgm_returnable_duty', 'skip': False, 'match_display': True},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/供应商外包装责任', 'in_header': 'get_inboundtcs_supplier_returnable_duty',
+     'model_name': 'inboundtcs', 'field_name': 'supplier_returnable_duty', 'skip': False,
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/外协加工业务模式', 'in_header': 'get_inboundtcs_consignment_mode',
+     'model_name': 'inboundtcs', 'field_name': 'consignment_mode', 'skip': False, 'match_display': True},
+    {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/备注', 'in_header': 'get_inboundtcs_comments',
+     'model_name': 'inboundtcs', 'field_name': 'comments', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '采购信息/采购员', 'in_header': 'get_inboundbuyer_buyer',
+     'model_name': 'inboundbuyer', 'field_name': 'buyer', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '采购信息/合同条款', 'in_header': 'get_inboundbuyer_contract_incoterm',
+     'model_name': 'inboundbuyer', 'field_name': 'contract_incoterm', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '采购信息/供应商运费',
+     'in_header': 'get_inboundbuyer_contract_supplier_transportation_cost', 'model_name': 'inboundbuyer',
+     'field_name': 'contract_supplier_transportation_cost', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '采购信息/供应商外包装费', 'in_header': 'get_inboundbuyer_contract_supplier_pkg_cost',
+     'model_name': 'inboundbuyer', 'field_name': 'contract_supplier_pkg_cost', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '采购信息/供应商排序费', 'in_header': 'get_inboundbuyer_contract_supplier_seq_cost',
+     'model_name': 'inboundbuyer', 'field_name': 'contract_supplier_seq_cost', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块地址/FU提供的原始地址信息', 'in_header': 'get_inboundaddress_fu_address',
+     'model_name': 'inboundaddress', 'field_name': 'fu_address', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块地址/MR取货地址', 'in_header': 'get_inboundaddress_mr_address',
+     'model_name': 'inboundaddress', 'field_name': 'mr_address', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '国产/进口/自制', 'in_header': 'get_inboundaddress_property',
+     'model_name': 'inboundaddress', 'field_name': 'property', 'skip': False, 'match_display': True},
+    {'r_offset': 0, 'ex_header': '最终地址梳理/区域划分', 'in_header': 'get_inboundaddress_region_division',
+     'model_name': 'inboundaddress', 'field_name': 'region_division', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终地址梳理/国家', 'in_header': 'get_inboundaddress_country',
+     'model_name': 'inboundaddress', 'field_name': 'country', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终地址梳理/省', 'in_header': 'get_inboundaddress_province',
+     'model_name': 'inboundaddress', 'field_name': 'province', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终地址梳理/市', 'in_header': 'get_inboundaddress_city',
+     'model_name': 'inboundaddress', 'field_name': 'city', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终地址梳理/生产地址', 'in_header': 'get_inboundaddress_mfg_location',
+     'model_name': 'inboundaddress', 'field_name': 'mfg_location', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运输距离-至生产厂区', 'in_header': 'get_inboundaddress_distance_to_sgm_plant',
+     'model_name': 'inboundaddress', 'field_name': 'distance_to_sgm_plant', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运输距离-金桥C类', 'in_header': 'get_inboundaddress_distance_to_shanghai_cc',
+     'model_name': 'inboundaddress', 'field_name': 'distance_to_shanghai_cc', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '中转库地址', 'in_header': 'get_inboundaddress_warehouse_address',
+     'model_name': 'inboundaddress', 'field_name': 'warehouse_address', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '中转库运输距离', 'in_header': 'get_inboundaddress_warehouse_to_sgm_plant',
+     'model_name': 'inboundaddress', 'field_name': 'warehouse_to_sgm_plant', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块模式/海运FCL/海运LCL/空运',
+     'in_header': 'get_inboundoperationalmode_ckd_logistics_mode', 'model_name': 'inboundoperationalmode',
+     'field_name': 'ckd_logistics_mode', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块模式/规划模式（A/B/C/自制/进口）',
+     'in_header': 'get_inboundoperationalmode_planned_logistics_mode', 'model_name': 'inboundoperationalmode',
+     'field_name': 'planned_logistics_mode', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块模式/是否供应商排序(JIT)',
+     'in_header': 'get_inboundoperationalmode_if_supplier_seq', 'model_name': 'inboundoperationalmode',
+     'field_name': 'if_supplier_seq', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块模式/结费模式（2A/2B）以此为准',
+     'in_header': 'get_inboundoperationalmode_payment_mode', 'model_name': 'inboundoperationalmode',
+     'field_name': 'payment_mode', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终模式/运输条款', 'in_header': 'get_inboundmode_logistics_incoterm_mode',
+     'model_name': 'inboundmode', 'field_name': 'logistics_incoterm_mode', 'skip': False,
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': '最终模式/入厂物流模式', 'in_header': 'get_inboundmode_operation_mode',
+     'model_name': 'inboundmode', 'field_name': 'operation_mode', 'skip': False, 'match_display': True},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PK NAME', 'in_header': 'get_inboundtcspackage_supplier_pkg_name',
+     'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_name', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PKPCS', 'in_header': 'get_inboundtcspackage_supplier_pkg_pcs',
+     'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PL', 'in_header': 'get_inboundtcspackage_supplier_pkg_length',
+     'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_length', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PW', 'in_header': 'get_inboundtcspackage_supplier_pkg_width',
+     'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_width', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PH', 'in_header': 'get_inboundtcspackage_supplier_pkg_height',
+     'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_height', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装折叠率',
+     'in_header': 'get_inboundtcspackage_supplier_pkg_folding_rate', 'model_name': 'inboundtcspackage',
+     'field_name': 'supplier_pkg_folding_rate', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装CUBIC/PCS',
+     'in_header': 'get_inboundtcspackage_supplier_pkg_cubic_pcs', 'model_name': 'inboundtcspackage',
+     'field_name': 'supplier_pkg_cubic_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装CUBIC/VEH',
+     'in_header': 'get_inboundtcspackage_supplier_pkg_cubic_veh', 'model_name': 'inboundtcspackage',
+     'field_name': 'supplier_pkg_cubic_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PK NAME', 'in_header': 'get_inboundtcspackage_sgm_pkg_name',
+     'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_name', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PKPCS', 'in_header': 'get_inboundtcspackage_sgm_pkg_pcs',
+     'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PL', 'in_header': 'get_inboundtcspackage_sgm_pkg_length',
+     'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_length', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PW', 'in_header': 'get_inboundtcspackage_sgm_pkg_width',
+     'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_width', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PH', 'in_header': 'get_inboundtcspackage_sgm_pkg_height',
+     'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_height', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装折叠率', 'in_header': 'get_inboundtcspackage_sgm_pkg_folding_rate',
+     'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_folding_rate', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PK NAME',
+     'in_header': 'get_inboundoperationalpackage_supplier_pkg_name', 'model_name': 'inboundoperationalpackage',
+     'field_name': 'supplier_pkg_name', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PKPCS',
+     'in_header': 'get_inboundoperationalpackage_supplier_pkg_pcs', 'model_name': 'inboundoperationalpackage',
+     'field_name': 'supplier_pkg_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PL',
+     'in_header': 'get_inboundoperationalpackage_supplier_pkg_length',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'supplier_pkg_length', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PW',
+     'in_header': 'get_inboundoperationalpackage_supplier_pkg_width', 'model_name': 'inboundoperationalpackage',
+     'field_name': 'supplier_pkg_width', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PH',
+     'in_header': 'get_inboundoperationalpackage_supplier_pkg_height',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'supplier_pkg_height', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装折叠率',
+     'in_header': 'get_inboundoperationalpackage_supplier_pkg_folding_rate',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'supplier_pkg_folding_rate', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PK NAME',
+     'in_header': 'get_inboundoperationalpackage_sgm_pkg_name', 'model_name': 'inboundoperationalpackage',
+     'field_name': 'sgm_pkg_name', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PKPCS', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_pcs',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PL', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_length',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_length', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PW', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_width',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_width', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PH', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_height',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_height', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装折叠率',
+     'in_header': 'get_inboundoperationalpackage_sgm_pkg_folding_rate',
+     'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_folding_rate', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PK NAME', 'in_header': 'get_inboundpackage_supplier_pkg_name',
+     'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_name', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PKPCS', 'in_header': 'get_inboundpackage_supplier_pkg_pcs',
+     'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PL', 'in_header': 'get_inboundpackage_supplier_pkg_length',
+     'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_length', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PW', 'in_header': 'get_inboundpackage_supplier_pkg_width',
+     'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_width', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PH', 'in_header': 'get_inboundpackage_supplier_pkg_height',
+     'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_height', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装折叠率', 'in_header': 'get_inboundpackage_supplier_pkg_folding_rate',
+     'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_folding_rate', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装CUBIC/PCS',
+     'in_header': 'get_inboundpackage_supplier_pkg_cubic_pcs', 'model_name': 'inboundpackage',
+     'field_name': 'supplier_pkg_cubic_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装CUBIC/VEH',
+     'in_header': 'get_inboundpackage_supplier_pkg_cubic_veh', 'model_name': 'inboundpackage',
+     'field_name': 'supplier_pkg_cubic_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PK NAME', 'in_header': 'get_inboundpackage_sgm_pkg_name',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_name', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PKPCS', 'in_header': 'get_inboundpackage_sgm_pkg_pcs',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PL', 'in_header': 'get_inboundpackage_sgm_pkg_length',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_length', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PW', 'in_header': 'get_inboundpackage_sgm_pkg_width',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_width', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PH', 'in_header': 'get_inboundpackage_sgm_pkg_height',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_height', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装折叠率', 'in_header': 'get_inboundpackage_sgm_pkg_folding_rate',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_folding_rate', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装CUBIC/PCS', 'in_header': 'get_inboundpackage_sgm_pkg_cubic_pcs',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_cubic_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装CUBIC/VEH', 'in_header': 'get_inboundpackage_sgm_pkg_cubic_veh',
+     'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_cubic_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '最终包装信息/体积放大系数', 'in_header': 'get_inboundpackage_cubic_matrix',
+     'model_name': 'inboundpackage', 'field_name': 'cubic_matrix', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/DDP运费/PCS', 'in_header': 'get_inboundcalculation_ddp_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'ddp_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/干线去程/PCS', 'in_header': 'get_inboundcalculation_linehaul_oneway_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'linehaul_oneway_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/干线VMI/PCS', 'in_header': 'get_inboundcalculation_linehaul_vmi_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'linehaul_vmi_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/干线返程/PCS', 'in_header': 'get_inboundcalculation_linehaul_backway_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'linehaul_backway_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国内陆运/PCS', 'in_header': 'get_inboundcalculation_dom_truck_ttl_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_truck_ttl_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国内水运-去程/PCS', 'in_header': 'get_inboundcalculation_dom_water_oneway_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_water_oneway_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国内CC操作费/PCS', 'in_header': 'get_inboundcalculation_dom_cc_operation_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_cc_operation_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国内水运-返程/PCS', 'in_header': 'get_inboundcalculation_dom_water_backway_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_water_backway_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国内水运/PCS', 'in_header': 'get_inboundcalculation_dom_water_ttl_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_water_ttl_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/海外段内陆运输/PCS', 'in_header': 'get_inboundcalculation_oversea_inland_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'oversea_inland_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/海外CC操作费/PCS', 'in_header': 'get_inboundcalculation_oversea_cc_op_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'oversea_cc_op_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国际海运费/PCS', 'in_header': 'get_inboundcalculation_international_ocean_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'international_ocean_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/国内拉动费/PCS', 'in_header': 'get_inboundcalculation_dom_pull_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_pull_pcs', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单证费/PCS', 'in_header': 'get_inboundcalculation_certificate_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'certificate_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/进口海运/PCS', 'in_header': 'get_inboundcalculation_oversea_ocean_ttl_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'oversea_ocean_ttl_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/进口空运/PCS', 'in_header': 'get_inboundcalculation_oversea_air_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'oversea_air_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/IB COST', 'in_header': 'get_inboundcalculation_inbound_ttl_pcs',
+     'model_name': 'inboundcalculation', 'field_name': 'inbound_ttl_pcs', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 DDP运费/VEH', 'in_header': 'get_inboundcalculation_ddp_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'ddp_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 干线去程/VEH', 'in_header': 'get_inboundcalculation_linehaul_oneway_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'linehaul_oneway_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 干线VMI/VEH', 'in_header': 'get_inboundcalculation_linehaul_vmi_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'linehaul_vmi_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 干线返程/VEH', 'in_header': 'get_inboundcalculation_linehaul_backway_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'linehaul_backway_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国内陆运/VEH', 'in_header': 'get_inboundcalculation_dom_truck_ttl_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_truck_ttl_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国内海运-去程/VEH',
+     'in_header': 'get_inboundcalculation_dom_water_oneway_veh', 'model_name': 'inboundcalculation',
+     'field_name': 'dom_water_oneway_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国内CC操作费/VEH',
+     'in_header': 'get_inboundcalculation_dom_cc_operation_veh', 'model_name': 'inboundcalculation',
+     'field_name': 'dom_cc_operation_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国内海运-返程/VEH',
+     'in_header': 'get_inboundcalculation_dom_water_backway_veh', 'model_name': 'inboundcalculation',
+     'field_name': 'dom_water_backway_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国内海运/VEH', 'in_header': 'get_inboundcalculation_dom_water_ttl_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_water_ttl_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 海外段内陆运输/VEH',
+     'in_header': 'get_inboundcalculation_oversea_inland_veh', 'model_name': 'inboundcalculation',
+     'field_name': 'oversea_inland_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 海外CC操作费/VEH', 'in_header': 'get_inboundcalculation_oversea_cc_op_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'oversea_cc_op_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国际海运费/VEH',
+     'in_header': 'get_inboundcalculation_international_ocean_veh', 'model_name': 'inboundcalculation',
+     'field_name': 'international_ocean_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 国内拉动费/VEH', 'in_header': 'get_inboundcalculation_dom_pull_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'dom_pull_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 单证费/VEH', 'in_header': 'get_inboundcalculation_certificate_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'certificate_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 进口海运/VEH',
+     'in_header': 'get_inboundcalculation_oversea_ocean_ttl_veh', 'model_name': 'inboundcalculation',
+     'field_name': 'oversea_ocean_ttl_veh', 'skip': False, 'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 进口空运/VEH', 'in_header': 'get_inboundcalculation_oversea_air_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'oversea_air_veh', 'skip': False,
+     'match_display': False},
+    {'r_offset': 0, 'ex_header': '计算/单车费用 TTL IB COST', 'in_header': 'get_inboundcalculation_inbound_ttl_veh',
+     'model_name': 'inboundcalculation', 'field_name': 'inbound_ttl_veh', 'skip': False, 'match_display': False}
+]
+
+# compiled once, shared by every upload
+PRODUCTION_SCHEMA = SheetSchema(PRODUCTION_HEADER, empty={'production': ()})
+TCS_SCHEMA = SheetSchema(TCS_HEADER, 'UnsortedInboundTCS')
+WIDE_SCHEMA = SheetSchema(WIDE_HEADER, empty={'ebom': ('', '-')})
+
+
 @admin.register(models.UploadHandler)
 class UploadHandlerAdmin(admin.ModelAdmin):
     """ Upload handler admin. """
@@ -2311,85 +2823,69 @@ class UploadHandlerAdmin(admin.ModelAdmin):
     #         ret = self._changeform_view(request, object_id, form_url, extra_context)
     #     return ret
 
-    def add_view(self, request, form_url='', extra_context=None):
-        ret = self.changeform_view(request, None, form_url, extra_context)
-        if request.method == 'POST':
-            statistic.conf_calculation()
-            statistic.model_statistic()
-            statistic.plant_statistic()
-            statistic.base_statistic()
-            statistic.sgm_statistic()
-            statistic.future_model_table()
-            statistic.summary_model_calculate()
-        return ret
-
-
     def response_add(self, request, obj, post_url_continue=None):
-        """ Redirect when add work completed. """
-        post_file = request.FILES['file_to_be_uploaded']
-
-        # default the only first sheet
-        matrix = post_file.get_array()
-
-        if obj.model_name == 1:
-            # TCS data
-            self.parse_tcs(matrix)
-
-        elif obj.model_name == 2:
-            # Buyer data
-            # ParseArray.parse_buyer(matrix)
-            pass
-        elif obj.model_name == 3:
-            self.parse_production(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.Production._meta.model_name))
-        elif obj.model_name == 4:
-            upload.load_initial_tec_num(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.TecCore._meta.model_name))
-        elif obj.model_name == 5:
-            upload.load_initial_packing_folding_rate(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.PackingFoldingRate._meta.model_name))
-        elif obj.model_name == 6:
-            upload.load_initial_air_freight_rate(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.AirFreightRate._meta.model_name))           
-        elif obj.model_name == 7:
-            upload.load_initial_wh_cube_price(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.WhCubePrice._meta.model_name))
-        elif obj.model_name == 8:
-            upload.load_initial_nl_mapping(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.NominalLabelMapping._meta.model_name))
-        elif obj.model_name == 9:
-            upload.load_initial_os_rate(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.InboundOverseaRate._meta.model_name))
-        elif obj.model_name == 10:
-            upload.load_initial_cc_location(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.InboundCcLocations._meta.model_name))
-        elif obj.model_name == 11:
-            upload.load_initial_cc_danger(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.InboundDangerPackage._meta.model_name))
-        elif obj.model_name == 12:
-            upload.load_initial_cc_supplier(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.InboundCCSupplierRate._meta.model_name))
-        elif obj.model_name == 13:
-            upload.load_initial_supplier_rate(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.InboundSupplierRate._meta.model_name))
-        elif obj.model_name == 14:
-            upload.load_initial_distance(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.Supplier._meta.model_name))
-        elif obj.model_name == 15:
-            upload.load_initial_truck_rate(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.TruckRate._meta.model_name))
-        elif obj.model_name == 16:
-            upload.load_new_model_statistic(matrix)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.NewModelStatistic._meta.model_name))
- 
-
-        elif obj.model_name == 999:
-            # wide table
-            self.parse_wide(matrix, label=obj.label, veh_pt=obj.veh_pt)
-            return HttpResponseRedirect(reverse('admin:costsummary_%s_changelist' % models.Ebom._meta.model_name))
-        else:
-            raise Http404('无法识别的数据模式.')
+        """ Queue parsing & statistics as a background job, then show the job. """
+        job = jobs.enqueue('upload', model_name=obj.model_name, path=obj.file_to_be_uploaded.path,
+                           label_id=obj.label_id, veh_pt=obj.veh_pt)
+        self.message_user(request, '后台任务 #%d: %s' % (job.pk, job.get_status_display()))
+
+        return HttpResponseRedirect(reverse('admin:costsummary_%s_change' % models.BackgroundJob._meta.model_name,
+                                            args=(job.pk, )))
+
+    def process_upload(self, model_name: int, matrix: list, label=None, veh_pt=None, progress=None):
+        """ Parse the first sheet of an upload; return ids of touched ebom objects for a wide table. """
+        # one metric per sheet kind, rows of a SheetReader are counted by the parsing pass
+        touched_ids = None
+
+        with timer('upload %d' % model_name) as span:
+            if model_name == 1:
+                # TCS data
+                self.parse_tcs(matrix)
+
+            elif model_name == 2:
+                # Buyer data
+                # ParseArray.parse_buyer(matrix)
+                pass
+            elif model_name == 3:
+                self.parse_production(matrix)
+            elif model_name == 4:
+                upload.load_initial_tec_num(matrix)
+            elif model_name == 5:
+                upload.load_initial_packing_folding_rate(matrix)
+            elif model_name == 6:
+                upload.load_initial_air_freight_rate(matrix)
+            elif model_name == 7:
+                upload.load_initial_wh_cube_price(matrix)
+            elif model_name == 8:
+                upload.load_initial_nl_mapping(matrix)
+            elif model_name == 9:
+                upload.load_initial_os_rate(matrix)
+            elif model_name == 10:
+                upload.load_initial_cc_location(matrix)
+            elif model_name == 11:
+                upload.load_initial_cc_danger(matrix)
+            elif model_name == 12:
+                upload.load_initial_cc_supplier(matrix)
+            elif model_name == 13:
+                upload.load_initial_supplier_rate(matrix)
+            elif model_name == 14:
+                upload.load_initial_distance(matrix)
+            elif model_name == 15:
+                upload.load_initial_truck_rate(matrix)
+            elif model_name == 16:
+                upload.load_new_model_statistic(matrix)
+
+
+            elif model_name == 999:
+                # wide table
+                # statistics only recomputed for the uploaded parts
+                touched_ids = self.parse_wide(matrix, label=label, veh_pt=veh_pt, progress=progress)
+            else:
+                raise Http404('无法识别的数据模式.')
+
+            span.rows = len(matrix)
 
+        return touched_ids
 
 
 
@@ -2416,71 +2912,19 @@ class UploadHandlerAdmin(admin.ModelAdmin):
     download_buyer_template.allow_tags = True
     download_wide_template.allow_tags = True
 
+    @timed()
     def parse_production(self, matrix: list):
-        PRODUCTION_HEADER = [
-            {'r_offset': 0, 'ex_header': '基地', 'in_header': 'base', 'model_name': 'Production', 'field_name': 'base'},
-            {'r_offset': 0, 'ex_header': '工厂', 'in_header': 'plant', 'model_name': 'Production', 'field_name': 'plant'},
-            {'r_offset': 0, 'ex_header': '车型', 'in_header': 'label', 'model_name': 'Production','field_name': 'label'},
-            {'r_offset': 0, 'ex_header': '配置', 'in_header': 'configure', 'model_name': 'Production','field_name': 'configure'},
-            {'r_offset': 0, 'ex_header': '产量', 'in_header': 'production', 'model_name': 'Production','field_name': 'production'},
-            {'r_offset': 0, 'ex_header': '产量年', 'in_header': 'prd_year', 'model_name': 'Production','field_name': 'prd_year'},
-            ]
-
-        for i in range(len(matrix)):
-            all_header_found = True
-            # all header field found
-            for dict_obj in PRODUCTION_HEADER:
-                if 'col' not in dict_obj:
-                    all_header_found = False
-                    break
-            if all_header_found:
-                break
-            row = matrix[i]
-            for j in range(len(row)):
-                cell = str(row[j])
-                for k in range(len(PRODUCTION_HEADER)):
-                    if cell.strip().upper() == PRODUCTION_HEADER[k]['ex_header']:
-                        PRODUCTION_HEADER[k]['col'] = j
-                        PRODUCTION_HEADER[k]['row'] = i
-
-        for dict_obj in PRODUCTION_HEADER:
-            if dict_obj['in_header'].upper() == 'base'.upper():
-                base_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'plant'.upper():
-                plant_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'label'.upper():
-                label_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'configure'.upper():
-                configure_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'production'.upper():
-                production_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'prd_year'.upper():
-                prd_year_col = dict_obj['col']
-                break
-
-        # check header row
-        data_row = None
-
-        for dict_obj in PRODUCTION_HEADER:
-            if 'col' not in dict_obj or 'row' not in dict_obj:
-                raise Http404(f'数据列{dict_obj["ex_header"]}没有找到')
-            else:
-                if data_row is not None:
-                    if dict_obj['row'] - dict_obj['r_offset'] != data_row:
-                        raise Http404('Excel 格式不正确.')
-                else:
-                    data_row = dict_obj['row'] + dict_obj['r_offset']
-
-        # start parsing row
-        start_row = data_row + 1
-
-        for row in matrix[start_row:]:
-            base_value = row[base_col]
-            plant_value = row[plant_col]
-            label_value = row[label_col]
-            configure_value = row[configure_col].replace(' ','')
-            production_value = row[production_col]
-            prd_year_value = row[prd_year_col]
+        """ Parse production data. """
+        layout, _, rows = PRODUCTION_SCHEMA.split(matrix)
+
+        for row in rows:
+            params = layout.fields(row)['production']
+            base_value = params['base']
+            plant_value = params['plant']
+            label_value = params['label']
+            configure_value = params['configure']
+            production_value = params['production']
+            prd_year_value = params['prd_year']
 
             production_object = models.Production.objects.filter(base=base_value,plant=plant_value,label=label_value, \
                                                 configure=configure_value,prd_year=prd_year_value).first()
@@ -2492,88 +2936,16 @@ class UploadHandlerAdmin(admin.ModelAdmin):
 
 
 
+    @timed()
     def parse_tcs(self, matrix: list):
         """ Parse TCS data. """
         _ = self
 
-        # tcs header
-        TCS_HEADER = [
-            {'r_offset': 0, 'ex_header': 'P/N', 'in_header': 'part_number'},
-            {'r_offset': 0, 'ex_header': 'DUNS', 'in_header': 'duns'},
-            {'r_offset': 0, 'ex_header': 'Bidderlist No.', 'in_header': 'bidder_list_number'},
-            {'r_offset': 0, 'ex_header': 'Program', 'in_header': 'program'},
-            {'r_offset': 0, 'ex_header': 'Supplier Address', 'in_header': 'supplier_ship_from_address'},
-            {'r_offset': 0, 'ex_header': 'Process', 'in_header': 'process'},
-            {'r_offset': 0, 'ex_header': 'Suggest Delivery Method', 'in_header': 'suggest_delivery_method'},
-            {'r_offset': 0, 'ex_header': 'SGM\'s Transport Duty', 'in_header': 'sgm_transport_duty',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'Supplier\'s Transport Duty', 'in_header': 'supplier_transport_duty',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'SGM\'s Returnable Package Duty', 'in_header': 'sgm_returnable_duty',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'Supplier\'s Returnable Package Duty',
-             'in_header': 'supplier_returnable_duty', 'match_display': True},
-            {'r_offset': -1, 'ex_header': '外协加工业务模式\nConsignment Mode', 'in_header': 'consignment_mode',
-             'match_display': True},
-
-            {'r_offset': 0, 'ex_header': 'Container Name', 'in_header': 'supplier_pkg_name'},
-            {'r_offset': 0, 'ex_header': 'Quantity', 'in_header': 'supplier_pkg_pcs'},
-            {'r_offset': 0, 'ex_header': 'Length', 'in_header': 'supplier_pkg_length'},
-            {'r_offset': 0, 'ex_header': 'Height', 'in_header': 'supplier_pkg_height'},
-            {'r_offset': 0, 'ex_header': 'Width', 'in_header': 'supplier_pkg_width'},
-
-            {'r_offset': 0, 'ex_header': 'GM_PKG_CONTAINER_NAME', 'in_header': 'sgm_pkg_name'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_QTY', 'in_header': 'sgm_pkg_pcs'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_LENGTH', 'in_header': 'sgm_pkg_length'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_WIDTH', 'in_header': 'sgm_pkg_width'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_HEIGHT', 'in_header': 'sgm_pkg_height'},
-        ]
-
-        #logger.debug("TCS_HEADER: %s" % (TCS_HEADER,))
-        for i in range(len(TCS_HEADER)):
-            TCS_HEADER[i]['ex_header'] = TCS_HEADER[i]['ex_header'].upper()  # upper-case
-
-        # cursor
-        for i in range(len(matrix)):
-            all_header_found = True
-
-            # all header field found
-            for dict_obj in TCS_HEADER:
-                if 'col' not in dict_obj:
-                    all_header_found = False
-                    break
-
-            if all_header_found:
-                break
-
-            row = matrix[i]
-
-            for j in range(len(row)):
-                cell = str(row[j])
-
-                for k in range(len(TCS_HEADER)):
-                    if cell.strip().upper() == TCS_HEADER[k]['ex_header']:
-                        TCS_HEADER[k]['col'] = j
-                        TCS_HEADER[k]['row'] = i
+        layout, _, rows = TCS_SCHEMA.split(matrix)
+        part_col = layout.column('part_number')
 
-        # check header row
-        data_row = None
-
-        for dict_obj in TCS_HEADER:
-            if 'col' not in dict_obj or 'row' not in dict_obj:
-                raise Http404(f'数据列{dict_obj["ex_header"]}没有找到')
-            else:
-                if data_row is not None:
-                    if dict_obj['row'] - dict_obj['r_offset'] != data_row:
-                        raise Http404('Excel 格式不正确.')
-                else:
-                    data_row = dict_obj['row'] + dict_obj['r_offset']
-
-        # start parsing row
-        start_row = data_row + 1
-
-        for row in matrix[start_row:]:
-            lookup_value = row[TCS_HEADER[0]['col']]
+        for row in rows:
+            lookup_value = row[part_col]
 
             # if no actual value
             if lookup_value == '':
@@ -2581,25 +2953,9 @@ class UploadHandlerAdmin(admin.ModelAdmin):
 
             # always create new tcs & package objects
             unsorted_tcs_object = models.UnsortedInboundTCS(part_number=lookup_value)
-            params = dict()
-
-            for dict_obj in TCS_HEADER[1:]:
-                if 'match_display' in dict_obj:
-                    choice = getattr(unsorted_tcs_object, dict_obj['in_header'] + '_choice')
-
-                    for int_val, str_val in choice:
-                        if row[dict_obj['col']].strip().upper() == str_val.upper():
-                            params[dict_obj['in_header']] = int_val
-                            break
-
-                else:
-                    params[dict_obj['in_header']] = row[dict_obj['col']]
 
-
-            for attribute in params:
-                if params[attribute] == '':
-                    params[attribute] = None
-                setattr(unsorted_tcs_object, attribute, params[attribute])
+            for attribute, value in layout.fields(row)['unsortedinboundtcs'].items():
+                setattr(unsorted_tcs_object, attribute, value)
 
             unsorted_tcs_object.save()
 
@@ -2634,424 +2990,40 @@ class UploadHandlerAdmin(admin.ModelAdmin):
             '''
 
 
-    def parse_wide(self, matrix: list, label: models.NominalLabelMapping, veh_pt=None):#conf: str=None, 
-        """ Parse wide table """
-        _ = self
-
-        WIDE_HEADER = [
-            {'r_offset': 0, 'ex_header': 'UPC', 'in_header': 'upc', 'model_name': 'ebom', 'field_name': 'upc',
-             'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'FNA', 'in_header': 'fna', 'model_name': 'ebom', 'field_name': 'fna',
-             'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'STRUCTURE NODE', 'in_header': 'structure_node', 'model_name': 'ebom',
-             'field_name': 'structure_node', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TEC NO.', 'in_header': 'tec', 'model_name': 'ebom', 'field_name': 'tec_id',
-             'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'P/N - PART NUMBER', 'in_header': 'part_number', 'model_name': 'ebom',
-             'field_name': 'part_number', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'DESCRIPTION EN', 'in_header': 'description_en', 'model_name': 'ebom',
-             'field_name': 'description_en', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'DESCRIPTION CN', 'in_header': 'description_cn', 'model_name': 'ebom',
-             'field_name': 'description_cn', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'HEADER PART NUMBER', 'in_header': 'header_part_number', 'model_name': 'ebom',
-             'field_name': 'header_part_number', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'QUANTITY', 'in_header': 'quantity', 'model_name': 'ebom',
-             'field_name': 'quantity', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'AR/EM MATERIAL INDICATOR', 'in_header': 'ar_em_material_indicator',
-             'model_name': 'ebom', 'field_name': 'ar_em_material_indicator', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'WORK SHOP', 'in_header': 'work_shop', 'model_name': 'ebom',
-             'field_name': 'work_shop', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'DUNS / VENDOR NUMBER', 'in_header': 'vendor_duns_number',
-             'model_name': 'ebom', 'field_name': 'vendor_duns_number', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'SUPPLIER NAME', 'in_header': 'supplier_name', 'model_name': 'ebom',
-             'field_name': 'supplier_name', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'EWO NUMBER', 'in_header': 'ewo_number', 'model_name': 'ebom',
-             'field_name': 'ewo_number', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'MODEL & OPTION', 'in_header': 'model_and_option', 'model_name': 'ebom',
-             'field_name': 'model_and_option', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'VPPS', 'in_header': 'vpps', 'model_name': 'ebom', 'field_name': 'vpps',
-             'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '头零件', 'in_header': 'get_inboundheaderpart_head_part_number',
-             'model_name': 'inboundheaderpart', 'field_name': 'head_part_number', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '头零件信息/总成供应商', 'in_header': 'get_inboundheaderpart_assembly_supplier',
-             'model_name': 'inboundheaderpart', 'field_name': 'assembly_supplier', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '头零件信息/颜色件', 'in_header': 'get_inboundheaderpart_color',
-             'model_name': 'inboundheaderpart', 'field_name': 'color', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/BIDDER号', 'in_header': 'get_inboundtcs_bidder_list_number',
-             'model_name': 'inboundtcs', 'field_name': 'bidder_list_number', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/定点项目', 'in_header': 'get_inboundtcs_program',
-             'model_name': 'inboundtcs', 'field_name': 'program', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/供应商发货地址', 'in_header': 'get_inboundtcs_supplier_ship_from_address',
-             'model_name': 'inboundtcs', 'field_name': 'supplier_ship_from_address', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/报价条款', 'in_header': 'get_inboundtcs_process',
-             'model_name': 'inboundtcs', 'field_name': 'process', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/运输模式', 'in_header': 'get_inboundtcs_suggest_delivery_method',
-             'model_name': 'inboundtcs', 'field_name': 'suggest_delivery_method', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/SGM运输责任', 'in_header': 'get_inboundtcs_sgm_transport_duty',
-             'model_name': 'inboundtcs', 'field_name': 'sgm_transport_duty', 'skip': False, 'match_display': True},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/供应商运输责任', 'in_header': 'get_inboundtcs_supplier_transport_duty',
-             'model_name': 'inboundtcs', 'field_name': 'supplier_transport_duty', 'skip': False, 'match_display': True},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/SGM外包装责任', 'in_header': 'get_inboundtcs_sgm_returnable_duty',
-             'model_name': 'inboundtcs', 'field_name': 'sgm_returnable_duty', 'skip': False, 'match_display': True},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/供应商外包装责任', 'in_header': 'get_inboundtcs_supplier_returnable_duty',
-             'model_name': 'inboundtcs', 'field_name': 'supplier_returnable_duty', 'skip': False,
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/外协加工业务模式', 'in_header': 'get_inboundtcs_consignment_mode',
-             'model_name': 'inboundtcs', 'field_name': 'consignment_mode', 'skip': False, 'match_display': True},
-            {'r_offset': 0, 'ex_header': 'TCS 物流跟踪/备注', 'in_header': 'get_inboundtcs_comments',
-             'model_name': 'inboundtcs', 'field_name': 'comments', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '采购信息/采购员', 'in_header': 'get_inboundbuyer_buyer',
-             'model_name': 'inboundbuyer', 'field_name': 'buyer', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '采购信息/合同条款', 'in_header': 'get_inboundbuyer_contract_incoterm',
-             'model_name': 'inboundbuyer', 'field_name': 'contract_incoterm', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '采购信息/供应商运费',
-             'in_header': 'get_inboundbuyer_contract_supplier_transportation_cost', 'model_name': 'inboundbuyer',
-             'field_name': 'contract_supplier_transportation_cost', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '采购信息/供应商外包装费', 'in_header': 'get_inboundbuyer_contract_supplier_pkg_cost',
-             'model_name': 'inboundbuyer', 'field_name': 'contract_supplier_pkg_cost', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '采购信息/供应商排序费', 'in_header': 'get_inboundbuyer_contract_supplier_seq_cost',
-             'model_name': 'inboundbuyer', 'field_name': 'contract_supplier_seq_cost', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块地址/FU提供的原始地址信息', 'in_header': 'get_inboundaddress_fu_address',
-             'model_name': 'inboundaddress', 'field_name': 'fu_address', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块地址/MR取货地址', 'in_header': 'get_inboundaddress_mr_address',
-             'model_name': 'inboundaddress', 'field_name': 'mr_address', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '国产/进口/自制', 'in_header': 'get_inboundaddress_property',
-             'model_name': 'inboundaddress', 'field_name': 'property', 'skip': False, 'match_display': True},
-            {'r_offset': 0, 'ex_header': '最终地址梳理/区域划分', 'in_header': 'get_inboundaddress_region_division',
-             'model_name': 'inboundaddress', 'field_name': 'region_division', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终地址梳理/国家', 'in_header': 'get_inboundaddress_country',
-             'model_name': 'inboundaddress', 'field_name': 'country', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终地址梳理/省', 'in_header': 'get_inboundaddress_province',
-             'model_name': 'inboundaddress', 'field_name': 'province', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终地址梳理/市', 'in_header': 'get_inboundaddress_city',
-             'model_name': 'inboundaddress', 'field_name': 'city', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终地址梳理/生产地址', 'in_header': 'get_inboundaddress_mfg_location',
-             'model_name': 'inboundaddress', 'field_name': 'mfg_location', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运输距离-至生产厂区', 'in_header': 'get_inboundaddress_distance_to_sgm_plant',
-             'model_name': 'inboundaddress', 'field_name': 'distance_to_sgm_plant', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运输距离-金桥C类', 'in_header': 'get_inboundaddress_distance_to_shanghai_cc',
-             'model_name': 'inboundaddress', 'field_name': 'distance_to_shanghai_cc', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '中转库地址', 'in_header': 'get_inboundaddress_warehouse_address',
-             'model_name': 'inboundaddress', 'field_name': 'warehouse_address', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '中转库运输距离', 'in_header': 'get_inboundaddress_warehouse_to_sgm_plant',
-             'model_name': 'inboundaddress', 'field_name': 'warehouse_to_sgm_plant', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块模式/海运FCL/海运LCL/空运',
-             'in_header': 'get_inboundoperationalmode_ckd_logistics_mode', 'model_name': 'inboundoperationalmode',
-             'field_name': 'ckd_logistics_mode', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块模式/规划模式（A/B/C/自制/进口）',
-             'in_header': 'get_inboundoperationalmode_planned_logistics_mode', 'model_name': 'inboundoperationalmode',
-             'field_name': 'planned_logistics_mode', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块模式/是否供应商排序(JIT)',
-             'in_header': 'get_inboundoperationalmode_if_supplier_seq', 'model_name': 'inboundoperationalmode',
-             'field_name': 'if_supplier_seq', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块模式/结费模式（2A/2B）以此为准',
-             'in_header': 'get_inboundoperationalmode_payment_mode', 'model_name': 'inboundoperationalmode',
-             'field_name': 'payment_mode', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终模式/运输条款', 'in_header': 'get_inboundmode_logistics_incoterm_mode',
-             'model_name': 'inboundmode', 'field_name': 'logistics_incoterm_mode', 'skip': False,
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': '最终模式/入厂物流模式', 'in_header': 'get_inboundmode_operation_mode',
-             'model_name': 'inboundmode', 'field_name': 'operation_mode', 'skip': False, 'match_display': True},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PK NAME', 'in_header': 'get_inboundtcspackage_supplier_pkg_name',
-             'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_name', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PKPCS', 'in_header': 'get_inboundtcspackage_supplier_pkg_pcs',
-             'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PL', 'in_header': 'get_inboundtcspackage_supplier_pkg_length',
-             'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_length', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PW', 'in_header': 'get_inboundtcspackage_supplier_pkg_width',
-             'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_width', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装PH', 'in_header': 'get_inboundtcspackage_supplier_pkg_height',
-             'model_name': 'inboundtcspackage', 'field_name': 'supplier_pkg_height', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装折叠率',
-             'in_header': 'get_inboundtcspackage_supplier_pkg_folding_rate', 'model_name': 'inboundtcspackage',
-             'field_name': 'supplier_pkg_folding_rate', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装CUBIC/PCS',
-             'in_header': 'get_inboundtcspackage_supplier_pkg_cubic_pcs', 'model_name': 'inboundtcspackage',
-             'field_name': 'supplier_pkg_cubic_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/供应商出厂包装CUBIC/VEH',
-             'in_header': 'get_inboundtcspackage_supplier_pkg_cubic_veh', 'model_name': 'inboundtcspackage',
-             'field_name': 'supplier_pkg_cubic_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PK NAME', 'in_header': 'get_inboundtcspackage_sgm_pkg_name',
-             'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_name', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PKPCS', 'in_header': 'get_inboundtcspackage_sgm_pkg_pcs',
-             'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PL', 'in_header': 'get_inboundtcspackage_sgm_pkg_length',
-             'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_length', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PW', 'in_header': 'get_inboundtcspackage_sgm_pkg_width',
-             'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_width', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装PH', 'in_header': 'get_inboundtcspackage_sgm_pkg_height',
-             'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_height', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': 'TCS包装/先期规划包装折叠率', 'in_header': 'get_inboundtcspackage_sgm_pkg_folding_rate',
-             'model_name': 'inboundtcspackage', 'field_name': 'sgm_pkg_folding_rate', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PK NAME',
-             'in_header': 'get_inboundoperationalpackage_supplier_pkg_name', 'model_name': 'inboundoperationalpackage',
-             'field_name': 'supplier_pkg_name', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PKPCS',
-             'in_header': 'get_inboundoperationalpackage_supplier_pkg_pcs', 'model_name': 'inboundoperationalpackage',
-             'field_name': 'supplier_pkg_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PL',
-             'in_header': 'get_inboundoperationalpackage_supplier_pkg_length',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'supplier_pkg_length', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PW',
-             'in_header': 'get_inboundoperationalpackage_supplier_pkg_width', 'model_name': 'inboundoperationalpackage',
-             'field_name': 'supplier_pkg_width', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装PH',
-             'in_header': 'get_inboundoperationalpackage_supplier_pkg_height',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'supplier_pkg_height', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/供应商包装折叠率',
-             'in_header': 'get_inboundoperationalpackage_supplier_pkg_folding_rate',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'supplier_pkg_folding_rate', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PK NAME',
-             'in_header': 'get_inboundoperationalpackage_sgm_pkg_name', 'model_name': 'inboundoperationalpackage',
-             'field_name': 'sgm_pkg_name', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PKPCS', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_pcs',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PL', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_length',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_length', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PW', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_width',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_width', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装PH', 'in_header': 'get_inboundoperationalpackage_sgm_pkg_height',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_height', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '运作功能块包装/SGM包装折叠率',
-             'in_header': 'get_inboundoperationalpackage_sgm_pkg_folding_rate',
-             'model_name': 'inboundoperationalpackage', 'field_name': 'sgm_pkg_folding_rate', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PK NAME', 'in_header': 'get_inboundpackage_supplier_pkg_name',
-             'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_name', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PKPCS', 'in_header': 'get_inboundpackage_supplier_pkg_pcs',
-             'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PL', 'in_header': 'get_inboundpackage_supplier_pkg_length',
-             'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_length', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PW', 'in_header': 'get_inboundpackage_supplier_pkg_width',
-             'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_width', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装PH', 'in_header': 'get_inboundpackage_supplier_pkg_height',
-             'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_height', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装折叠率', 'in_header': 'get_inboundpackage_supplier_pkg_folding_rate',
-             'model_name': 'inboundpackage', 'field_name': 'supplier_pkg_folding_rate', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装CUBIC/PCS',
-             'in_header': 'get_inboundpackage_supplier_pkg_cubic_pcs', 'model_name': 'inboundpackage',
-             'field_name': 'supplier_pkg_cubic_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/供应商包装CUBIC/VEH',
-             'in_header': 'get_inboundpackage_supplier_pkg_cubic_veh', 'model_name': 'inboundpackage',
-             'field_name': 'supplier_pkg_cubic_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PK NAME', 'in_header': 'get_inboundpackage_sgm_pkg_name',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_name', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PKPCS', 'in_header': 'get_inboundpackage_sgm_pkg_pcs',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PL', 'in_header': 'get_inboundpackage_sgm_pkg_length',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_length', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PW', 'in_header': 'get_inboundpackage_sgm_pkg_width',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_width', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装PH', 'in_header': 'get_inboundpackage_sgm_pkg_height',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_height', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装折叠率', 'in_header': 'get_inboundpackage_sgm_pkg_folding_rate',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_folding_rate', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装CUBIC/PCS', 'in_header': 'get_inboundpackage_sgm_pkg_cubic_pcs',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_cubic_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/SGM包装CUBIC/VEH', 'in_header': 'get_inboundpackage_sgm_pkg_cubic_veh',
-             'model_name': 'inboundpackage', 'field_name': 'sgm_pkg_cubic_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '最终包装信息/体积放大系数', 'in_header': 'get_inboundpackage_cubic_matrix',
-             'model_name': 'inboundpackage', 'field_name': 'cubic_matrix', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/DDP运费/PCS', 'in_header': 'get_inboundcalculation_ddp_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'ddp_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/干线去程/PCS', 'in_header': 'get_inboundcalculation_linehaul_oneway_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'linehaul_oneway_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/干线VMI/PCS', 'in_header': 'get_inboundcalculation_linehaul_vmi_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'linehaul_vmi_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/干线返程/PCS', 'in_header': 'get_inboundcalculation_linehaul_backway_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'linehaul_backway_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国内陆运/PCS', 'in_header': 'get_inboundcalculation_dom_truck_ttl_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_truck_ttl_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国内水运-去程/PCS', 'in_header': 'get_inboundcalculation_dom_water_oneway_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_water_oneway_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国内CC操作费/PCS', 'in_header': 'get_inboundcalculation_dom_cc_operation_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_cc_operation_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国内水运-返程/PCS', 'in_header': 'get_inboundcalculation_dom_water_backway_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_water_backway_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国内水运/PCS', 'in_header': 'get_inboundcalculation_dom_water_ttl_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_water_ttl_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/海外段内陆运输/PCS', 'in_header': 'get_inboundcalculation_oversea_inland_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'oversea_inland_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/海外CC操作费/PCS', 'in_header': 'get_inboundcalculation_oversea_cc_op_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'oversea_cc_op_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国际海运费/PCS', 'in_header': 'get_inboundcalculation_international_ocean_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'international_ocean_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/国内拉动费/PCS', 'in_header': 'get_inboundcalculation_dom_pull_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_pull_pcs', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单证费/PCS', 'in_header': 'get_inboundcalculation_certificate_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'certificate_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/进口海运/PCS', 'in_header': 'get_inboundcalculation_oversea_ocean_ttl_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'oversea_ocean_ttl_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/进口空运/PCS', 'in_header': 'get_inboundcalculation_oversea_air_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'oversea_air_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/IB COST', 'in_header': 'get_inboundcalculation_inbound_ttl_pcs',
-             'model_name': 'inboundcalculation', 'field_name': 'inbound_ttl_pcs', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 DDP运费/VEH', 'in_header': 'get_inboundcalculation_ddp_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'ddp_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 干线去程/VEH', 'in_header': 'get_inboundcalculation_linehaul_oneway_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'linehaul_oneway_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 干线VMI/VEH', 'in_header': 'get_inboundcalculation_linehaul_vmi_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'linehaul_vmi_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 干线返程/VEH', 'in_header': 'get_inboundcalculation_linehaul_backway_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'linehaul_backway_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国内陆运/VEH', 'in_header': 'get_inboundcalculation_dom_truck_ttl_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_truck_ttl_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国内海运-去程/VEH',
-             'in_header': 'get_inboundcalculation_dom_water_oneway_veh', 'model_name': 'inboundcalculation',
-             'field_name': 'dom_water_oneway_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国内CC操作费/VEH',
-             'in_header': 'get_inboundcalculation_dom_cc_operation_veh', 'model_name': 'inboundcalculation',
-             'field_name': 'dom_cc_operation_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国内海运-返程/VEH',
-             'in_header': 'get_inboundcalculation_dom_water_backway_veh', 'model_name': 'inboundcalculation',
-             'field_name': 'dom_water_backway_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国内海运/VEH', 'in_header': 'get_inboundcalculation_dom_water_ttl_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_water_ttl_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 海外段内陆运输/VEH',
-             'in_header': 'get_inboundcalculation_oversea_inland_veh', 'model_name': 'inboundcalculation',
-             'field_name': 'oversea_inland_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 海外CC操作费/VEH', 'in_header': 'get_inboundcalculation_oversea_cc_op_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'oversea_cc_op_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国际海运费/VEH',
-             'in_header': 'get_inboundcalculation_international_ocean_veh', 'model_name': 'inboundcalculation',
-             'field_name': 'international_ocean_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 国内拉动费/VEH', 'in_header': 'get_inboundcalculation_dom_pull_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'dom_pull_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 单证费/VEH', 'in_header': 'get_inboundcalculation_certificate_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'certificate_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 进口海运/VEH',
-             'in_header': 'get_inboundcalculation_oversea_ocean_ttl_veh', 'model_name': 'inboundcalculation',
-             'field_name': 'oversea_ocean_ttl_veh', 'skip': False, 'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 进口空运/VEH', 'in_header': 'get_inboundcalculation_oversea_air_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'oversea_air_veh', 'skip': False,
-             'match_display': False},
-            {'r_offset': 0, 'ex_header': '计算/单车费用 TTL IB COST', 'in_header': 'get_inboundcalculation_inbound_ttl_veh',
-             'model_name': 'inboundcalculation', 'field_name': 'inbound_ttl_veh', 'skip': False, 'match_display': False}
-        ]
-
-        # cursor
-        for i in range(len(matrix)):
-            all_header_found = True
-
-            # all header field found
-            for dict_obj in WIDE_HEADER:
-                if 'col' not in dict_obj:
-                    all_header_found = False
-                    break
-
-            if all_header_found:
-                break
-
-            row = matrix[i]
-
-            for j in range(len(row)):
-                cell = str(row[j])
-
-                for k in range(len(WIDE_HEADER)):
-                    if cell.strip().upper() == WIDE_HEADER[k]['ex_header']:
-                        WIDE_HEADER[k]['col'] = j
-                        WIDE_HEADER[k]['row'] = i
-
-        # check header row
-        data_row = None
-        related_model_names = set()
+    @timed(rows=len)
+    def parse_wide(self, matrix: list, label: models.NominalLabelMapping, veh_pt=None, progress=None):#conf: str=None, 
+        """ Parse wide table, reporting rows done to progress(done, total) if given. """
+        _ = self
 
-        for dict_obj in WIDE_HEADER:
-            if 'col' not in dict_obj or 'row' not in dict_obj:
-                raise Http404(f'数据列{dict_obj["ex_header"]}没有找到')
-            else:
-                if data_row is not None:
-                    if dict_obj['row'] - dict_obj['r_offset'] != data_row:
-                        raise Http404('Excel 格式不正确.')
-                else:
-                    data_row = dict_obj['row'] + dict_obj['r_offset']
-            #把设计的字段除了属于ebom表的全部都存进集合
-            # if dict_obj['model_name'] != 'ebom':
-            #     related_model_names.add(dict_obj['model_name'])
+        # header & data rows from one pass over the sheet
+        layout, head, rows = WIDE_SCHEMA.split(matrix)
 
         # start parsing row
-        start_row = data_row + 1
+        start_row = layout.start_row
 
         # look up field
         #只是为了找到零件号对应的列
-        part_col = None
-
-        for dict_obj in WIDE_HEADER:
-            if dict_obj['in_header'].upper() == 'UPC'.upper():
-                upc_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'FNA'.upper():
-                fna_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'part_number'.upper():
-                part_col = dict_obj['col']
-            elif dict_obj['in_header'].upper() == 'header_part_number'.upper():
-                header_part_number_col = dict_obj['col']
-                break
+        upc_col = layout.column('upc', 'ebom')
+        fna_col = layout.column('fna', 'ebom')
+        part_col = layout.column('part_number', 'ebom')
+        header_part_number_col = layout.column('header_part_number', 'ebom')
 
         # assert upc_col
         # assert fna_col
         # assert part_col
 
         # for char in matrix[data_row-1][130:]:
-        new_configutes_dict = dict()
+        touched_ids = set()
         df_list = []
 
         dict_conf = dict()
-        data_row_objects = matrix[2]
+        data_row_objects = head[2]
         for j in range(130,len(data_row_objects)):
             obj = data_row_objects[j].replace(' ','')
             obj = obj.replace('\n','')
             obj = obj.strip()
             cell = obj
             dict_conf[cell] = j
-        for attribute in dict_conf:
-            new_configutes_dict[attribute]=dict()
 
         # 配置计算用表
         # conf_cal_params = dict()
@@ -3062,166 +3034,128 @@ class UploadHandlerAdmin(admin.ModelAdmin):
         #             conf_cal_params[char][obj['field_name']] = dict()
 
 
-        related_model_names=['inboundmode','inboundoperationalpackage','inboundaddress',
-                                    'inboundpackage','inboundoperationalmode','inboundtcs','inboundheaderpart','inboundbuyer',
-                                    'inboundtcspackage',
-                                     'inboundcalculation',
-                                    ]
-                                    
+        loader = WideTableLoader(label, veh_pt)
+        # without reading the sheet, None when unknown
+        total = matrix.row_total() if isinstance(matrix, SheetReader) else len(matrix)
+
+        def load(chunk, done):
+            """ Upsert a chunk of rows in one transaction. """
+            ebom_ids = loader.load([entry for entry, _ in chunk])
+            configures = dict()
+
+            for (_, row), ebom_id in zip(chunk, ebom_ids):
+                # the calculation object is flagged for BatchCostEngine.recalculate_dirty()
+                touched_ids.add(ebom_id)
+
+                # 构建字典，里面包含属性和它对应的列
+                configures[ebom_id] = dict()
+                for attribute in dict_conf:
+                    if row[dict_conf[attribute]] == '' or row[dict_conf[attribute]] == '-' :
+                        row[dict_conf[attribute]] = None
+                    configures[ebom_id][attribute]=row[dict_conf[attribute]]
+
+            # configure values of the uploaded parts replace their previous ones
+            if dict_conf:
+                replace_configures(configures)
+
+            if progress:
+                progress(done, total)
+
         # parse list of list
-        for i in range(start_row,len(matrix)):
-            row = matrix[i]
-            print(i)
-            # for row in matrix[start_row:]:
+        chunk = []
+
+        for i, row in enumerate(rows, start_row):
             part_value = row[part_col]#首先拿到零件号
-            upc_value = row[upc_col]
-            fna_value = row[fna_col]
-            header_part_number = row[header_part_number_col]
 
             # if no actual value
             #如果零件号为空，继续下面的操作
             if part_value == '':
                 continue
 
-            # params context
-            model_params_instance = dict()
-            for dict_obj in WIDE_HEADER:
-                if dict_obj['model_name'] not in model_params_instance:
-                    model_params_instance[dict_obj['model_name']] = dict()
+            # params context, choice display values matched to their codes
+            chunk.append(((part_value, row[header_part_number_col], row[upc_col], row[fna_col], layout.fields(row)), row))
 
-            # parse row cells
-            for dict_obj in WIDE_HEADER:
-                #如果这个字段不是要略过的，而且也不是零件号
-                #这里实现了当上传表中的值不是选项时，把值直接存进字典，当值是选项时，把值对应的数值存入字典model_params_instance
-                if not dict_obj['skip'] and dict_obj['col'] != part_col:
+            if len(chunk) == loader.batch_size:
+                load(chunk, i + 1)
+                chunk = []
 
-                    if not dict_obj['match_display']:
-                        model_params_instance[dict_obj['model_name']][dict_obj['field_name']] = row[dict_obj['col']]
+        if chunk:
+            load(chunk, i + 1)
 
-                    else:
-                        choice = getattr(
-                            apps.get_model('costsummary', dict_obj['model_name']),
-                            dict_obj['field_name'] + '_choice'
-                        )
+        return touched_ids
 
-                        for int_val, str_val in choice:
-                            if type(row[dict_obj['col']]) == str:
-                                if row[dict_obj['col']].strip().upper() == str_val.upper():
-                                    model_params_instance[dict_obj['model_name']][dict_obj['field_name']] = int_val
-                                    break
-
-            # match ebom object
-            if header_part_number != '':
-                ebom_object = models.Ebom.objects.filter(part_number=part_value,header_part_number=header_part_number, \
-                                                    label=label, upc=upc_value,fna=fna_value,veh_pt=veh_pt).first()
-                if not ebom_object:
-                    ebom_object = models.Ebom(
-                        label=label,
-                        header_part_number=header_part_number,
-                        upc=upc_value,
-                        fna=fna_value,
-                        part_number=part_value,
-                        veh_pt=veh_pt,
-                    )
-            else:
-                ebom_object = models.Ebom.objects.filter(part_number=part_value, \
-                                                    label=label, upc=upc_value,fna=fna_value,veh_pt=veh_pt).first()
-                if not ebom_object:
-                    ebom_object = models.Ebom(
-                        label=label,
-                        upc=upc_value,
-                        fna=fna_value,
-                        part_number=part_value,
-                        veh_pt=veh_pt,
-                    )
-
-            # ebom object
-            native_params = model_params_instance['ebom']
-            model_params_instance.pop('ebom')
-
-            for attribute in native_params:
-                if native_params[attribute] == '' or native_params[attribute] == '-':
-                    native_params[attribute] = None
-                setattr(ebom_object, attribute, native_params[attribute])
-
-            ebom_object.save()
-
-            # related object
-            for related_model_name in related_model_names:
-                external_params = model_params_instance[related_model_name]
-                related_model = apps.get_model('costsummary', model_name=related_model_name)
-                related_object = related_model.objects.filter(bom=ebom_object).first()
-                if not related_object:
-                    related_object = related_model(bom=ebom_object)
-
-                for attribute in external_params:
-                    if external_params[attribute] == '':
-                        external_params[attribute] = None
-                    setattr(related_object, attribute, external_params[attribute])
-
-                related_object.save()
-
-            # force update the calculation object
-            ebom_object.rel_calc.save(force_update=True)
-
-            # 构建字典，里面包含属性和它对应的列
-            for attribute in dict_conf:
-                if row[dict_conf[attribute]] == '' or row[dict_conf[attribute]] == '-' :
-                    row[dict_conf[attribute]] = None
-                new_configutes_dict[attribute][ebom_object.id]=row[dict_conf[attribute]]
-        new_configutes_df=pd.DataFrame(new_configutes_dict)
-        new_configutes_df['id']=new_configutes_df.index
-        new_configutes_df=new_configutes_df.drop_duplicates(subset='id')
-        #origin configures table
-        # 当索引相同时，用新的数据替换掉就的数据
-        path = BASE_DIR + '/costsummary/persistence/CONF/configures.csv'
-
-        ori_configures_df=pd.read_csv(path,encoding='gbk')
-
-        # ori_configures_js=models.configure_data.objects.get(id=1).data
-
-        # ori_configures_dict=json.loads(ori_configures_js)
-        # ori_configures_df=pd.DataFrame(ori_configures_dict)
-        ori_configures_df=ori_configures_df[ori_configures_df['id'].notnull()]
-        ori_configures_df.index=ori_configures_df['id'].astype(int)
-        ori_configures_df.columns=ori_configures_df.columns.str.replace(' ','')
-        ori_configures_df.columns=ori_configures_df.columns.str.replace('\n','')
-        
-        new_configutes_df.index=new_configutes_df['id'].astype(int)
-        
-
-        ori_index_lst=list(ori_configures_df['id'])
-        new_index_lst=list(new_configutes_df.index)
-        index_lst=list(set(ori_index_lst).difference(set(new_index_lst)))
-        index_lst.sort()
-        ori_configures_df_keep=ori_configures_df.loc[index_lst]
-        configures_df=pd.concat([ori_configures_df_keep,new_configutes_df],axis=0)
-        configures_df.to_csv(path,encoding='gbk',index=False)
-
-        # ori_configures_df.index=ori_configures_df.index.astype(int)
-        # ori_configures_df.columns=ori_configures_df.columns.str.replace(' ','')
-        # ori_configures_df.columns=ori_configures_df.columns.str.replace('\n','')
-
-        # ori_index_lst=list(ori_configures_df['id'])
-        # print('ori_index_lst',ori_index_lst)
-        # new_index_lst=list(new_configutes_df.index)
-        # print('new_index_lst',new_index_lst)
-        # index_lst=list(set(ori_index_lst).difference(set(new_index_lst)))
-        # print('index_lst',index_lst)
-        # index_lst.sort()
-        # ori_configures_df_keep=ori_configures_df.loc[index_lst]
-        # configures_df=pd.concat([ori_configures_df_keep,new_configutes_df],axis=0)
-        # configures_df.to_csv(path,encoding='gbk')
-        # configures_df=new_configutes_df # 清空配置表
-        # configures_js=configures_df.to_json()
-        # configure_object = models.configure_data(id=1)
-        # configure_object.data=configures_js
-        # configure_object.save()
 
+@admin.register(models.BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """ Background jobs, read-only. """
+    list_display = (
+        '__str__',
+        'status',
+        'stage',
+        'progress_done',
+        'progress_total',
+        'created',
+        'started',
+        'finished',
+    )
+
+    list_filter = ('kind', 'status')
+
+    readonly_fields = (
+        'kind', 'payload', 'status', 'stage', 'progress_done', 'progress_total', 'message',
+        'cancel_requested', 'worker', 'created', 'started', 'finished', 'status_json',
+    )
+
+    actions = ['cancel_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def status_json(self, obj):
+        """ Link to the JSON status. """
+        _ = self
+        return '<a href="%s">JSON</a>' % reverse('job_status', args=(obj.pk, ))
+
+    status_json.short_description = '状态'
+    status_json.allow_tags = True
+
+    def cancel_jobs(self, request, queryset):
+        """ Cancel queued jobs, ask running ones to stop. """
+        cancelled = sum(jobs.cancel(job.pk) for job in queryset)
+        self.message_user(request, '%d 个任务已取消或请求取消' % cancelled)
+
+    cancel_jobs.short_description = '取消所选任务'
+
+
+@admin.register(models.MetricSample)
+class MetricSampleAdmin(admin.ModelAdmin):
+    """ Recorded metrics, read-only. """
+    list_display = (
+        'name',
+        'release',
+        'calls',
+        'seconds',
+        'max_seconds',
+        'queries',
+        'db_seconds',
+        'rows',
+        'worker',
+        'finished',
+    )
+
+    list_filter = ('release', 'name')
+
+    readonly_fields = (
+        'name', 'release', 'worker', 'started', 'finished', 'calls', 'seconds', 'max_seconds', 'queries',
+        'db_seconds', 'rows',
+    )
+
+    def has_add_permission(self, request):
+        return False
 
 
 @admin.register(models.Constants)
-class ConstantsAdmin(admin.ModelAdmin):
+class ConstantsAdmin(RateImpactMixin, admin.ModelAdmin):
     """ Constants """
     list_display = (
         'constant_key',
@@ -3249,7 +3183,7 @@ class FutureRateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.InboundOverseaRate)
-class InboundOverseaRateAdmin(admin.ModelAdmin):
+class InboundOverseaRateAdmin(RateImpactMixin, admin.ModelAdmin):
     """ Oversea rate. """
     list_display = (
         'region',
@@ -3327,7 +3261,7 @@ class InboundCcDangerAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.InboundCCSupplierRate)
-class InboundCCSupplierRateAdmin(admin.ModelAdmin):
+class InboundCCSupplierRateAdmin(RateImpactMixin, admin.ModelAdmin):
     list_display = (
         'supplier_duns',
         'supplier_name',
@@ -3347,7 +3281,7 @@ class InboundCCSupplierRateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.InboundSupplierRate)
-class InboundSupplierRateAdmin(admin.ModelAdmin):
+class InboundSupplierRateAdmin(RateImpactMixin, admin.ModelAdmin):
     list_display = (
         'supplier',
         'base',
@@ -3373,7 +3307,7 @@ class InboundSupplierRateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.TruckRate)
-class TruckRateAdmin(admin.ModelAdmin):
+class TruckRateAdmin(RateImpactMixin, admin.ModelAdmin):
     """ Truck rate admin class """
     list_display = (
         'name',
@@ -3402,7 +3336,7 @@ class TruckRateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.RegionRouteRate)
-class RegionRouteRateAdmin(admin.ModelAdmin):
+class RegionRouteRateAdmin(RateImpactMixin, admin.ModelAdmin):
     """ Region route rate admin class """
     list_display = (
         'region_or_route',
@@ -3518,7 +3452,7 @@ class UnsortedInboundTCSAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.VMIRate)
-class VMIRateAdmin(admin.ModelAdmin):
+class VMIRateAdmin(RateImpactMixin, admin.ModelAdmin):
     list_display = (
         'base',
         'whether_repacking',
@@ -3527,7 +3461,7 @@ class VMIRateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.WaterwayRate)
-class WaterwayRateAdmin(admin.ModelAdmin):
+class WaterwayRateAdmin(RateImpactMixin, admin.ModelAdmin):
     list_display = (
         'start_base',
         'destination_base',
@@ -5,3 +5,6 @@ class CostsummaryConfig(AppConfig):
     name = 'costsummary'
     verbose_name = 'Inbound Cost Summary'
 
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
@@ -0,0 +1,185 @@
+""" Concurrent read/write benchmark of the sqlite connection profile.
+
+    python -m costsummary.benchmarks.concurrency --seconds 10 --readers 4
+
+A writer thread updates batches of rows in short transactions, as uploads &
+recalculations do, while reader threads run grouped sums over the whole
+table, as the statistics & exports do. Both run once with sqlite's defaults
+(rollback journal, synchronous FULL) and once with the pragmas of
+costsummary.database, each on a fresh copy of the same synthetic table.
+Printed per profile: throughput, latency percentiles, the writer's lock wait
+and "database is locked" errors.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import django
+
+# sqlite's own defaults, for comparison
+DEFAULT_PRAGMAS = OrderedDict([
+    ('journal_mode', 'DELETE'),
+    ('synchronous', 'FULL'),
+])
+
+
+def create_table(path: str, rows: int, seed: int = 0):
+    """ Synthetic part table of rows rows over 50 labels. """
+    rand = random.Random(seed)
+    con = sqlite3.connect(path)
+
+    with con:
+        con.execute('create table part (id integer primary key, label integer, volume real, cost real)')
+        con.executemany('insert into part (label, volume, cost) values (?, ?, ?)', (
+            (rand.randrange(50), rand.random(), rand.random() * 100) for _ in range(rows)
+        ))
+
+    con.close()
+
+
+def connect(path: str, pragmas: dict, timeout: float):
+    """ Connection in autocommit mode, pragmas applied. """
+    from ..database import apply_pragmas
+
+    con = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    apply_pragmas(con.cursor(), pragmas)
+    return con
+
+
+class Worker(threading.Thread):
+    """ Repeat one unit of work until stopped, timing each. """
+
+    def __init__(self, con, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.con = con
+        self.stop = stop
+        self.latencies = []
+        self.waits = []
+        self.errors = 0
+
+    def run(self):
+        while not self.stop.is_set():
+            started = time.perf_counter()
+
+            try:
+                self.work()
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+
+                self.errors += 1
+
+                if self.con.in_transaction:
+                    self.con.execute('rollback')
+
+                continue
+
+            self.latencies.append(time.perf_counter() - started)
+
+        self.con.close()
+
+
+class Writer(Worker):
+    """ Update a batch of rows per transaction. """
+    batch = 500
+
+    def __init__(self, con, stop, rows: int):
+        super().__init__(con, stop)
+        self.rows = rows
+        self.start_id = 0
+
+    def work(self):
+        started = time.perf_counter()
+        self.con.execute('begin immediate')
+        self.waits.append(time.perf_counter() - started)
+
+        self.con.execute('update part set cost = cost + 1 where id > ? and id <= ?',
+                         (self.start_id, self.start_id + self.batch))
+
+        # in rollback journal mode commit waits for readers to let go of the file
+        started = time.perf_counter()
+        self.con.execute('commit')
+        self.waits[-1] += time.perf_counter() - started
+
+        self.start_id = (self.start_id + self.batch) % self.rows
+
+
+class Reader(Worker):
+    """ Grouped sums over the whole table. """
+
+    def work(self):
+        self.con.execute('select label, sum(volume * cost) from part group by label').fetchall()
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return float('nan')
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_profile(pragmas: dict, rows: int, readers: int, seconds: float, timeout: float) -> OrderedDict:
+    """ Run writer & readers against a fresh table with given pragmas. """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        create_table(path, rows)
+
+        stop = threading.Event()
+        writer = Writer(connect(path, pragmas, timeout), stop, rows)
+        reader_threads = [Reader(connect(path, pragmas, timeout), stop) for _ in range(readers)]
+
+        for thread in [writer] + reader_threads:
+            thread.start()
+
+        time.sleep(seconds)
+        stop.set()
+
+        for thread in [writer] + reader_threads:
+            thread.join()
+
+    reads = [latency for thread in reader_threads for latency in thread.latencies]
+
+    return OrderedDict([
+        ('writes_per_second', len(writer.latencies) / seconds),
+        ('reads_per_second', len(reads) / seconds),
+        ('read_p50_ms', percentile(reads, 0.5) * 1000),
+        ('read_p99_ms', percentile(reads, 0.99) * 1000),
+        ('write_lock_wait_ms', sum(writer.waits) * 1000 / max(len(writer.waits), 1)),
+        ('write_lock_wait_max_ms', max(writer.waits, default=0) * 1000),
+        ('locked_errors', writer.errors + sum(thread.errors for thread in reader_threads)),
+    ])
+
+
+def run(rows: int = 100000, readers: int = 4, seconds: float = 10, timeout: float = 5) -> OrderedDict:
+    """ Results of sqlite's default profile & of the tuned one. """
+    from ..database import sqlite_pragmas
+
+    return OrderedDict([
+        ('default', run_profile(DEFAULT_PRAGMAS, rows, readers, seconds, timeout)),
+        ('tuned', run_profile(sqlite_pragmas(), rows, readers, seconds, timeout)),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=5, help='busy timeout of every connection, in seconds')
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Inbound.settings')
+    django.setup()
+
+    results = run(options.rows, options.readers, options.seconds, options.timeout)
+
+    print('%-25s %12s %12s' % ('', 'default', 'tuned'))
+
+    for key in results['default']:
+        print('%-25s %12.2f %12.2f' % (key, results['default'][key], results['tuned'][key]))
@@ -0,0 +1,451 @@
+""" Synthetic EBOM dataset for the pipeline benchmark.
+
+generate(labels, parts, seed) fills an empty database with everything a label
+goes through from ta_ebom to the statistics: labels & their ebom entries, raw
+ta_ebom rows, suppliers with their distances to every base, every rate table,
+the constants, TEC names, production & future rates. The same seed always
+gives the same rows, so timings of two runs compare.
+
+Parts cycle through all 16 operation modes, each with the incoterm & the
+supplier (domestic, import, warehouse) its cost branch reads, with distances
+spread over the 25km, 500km & line-haul bands. The wide table & configure
+matrix to upload after loading are built from the same parts.
+"""
+import csv
+import random
+from collections import OrderedDict
+
+from django.db import connection
+
+# plant codes of the labels in turn, one per base; SY13 has the park rates
+PLANT_CODES = ('SHJQ', 'DY01', 'SY13', 'WH01')
+
+# bases of SupplierDistance & the base dependent rates
+BASES = (0, 1, 3, 4)
+
+# plant code prefixes, as AirFreightRate keys the base
+BASE_PREFIXES = ('SH', 'DY', 'SY', 'WH')
+
+# (region, province, city) of domestic suppliers, parks included
+DOMESTIC_LOCATIONS = (
+    ('华东', '上海', '上海'),
+    ('江浙', '江苏', '苏州'),
+    ('江浙', '浙江', '宁波'),
+    ('华北', '山东', '烟台'),
+    ('华中', '湖北', '武汉园区'),
+    ('东北', '辽宁', '沈阳园区'),
+    ('西南', '重庆', '重庆'),
+    ('华南', '广东', '广州'),
+)
+
+# (region, country, province, city, cc) of import suppliers; MI & OH have CC supplier rates
+IMPORT_LOCATIONS = (
+    ('北美', '美国', 'MI', 'DETROIT', 'NACC'),
+    ('北美', '美国', 'OH', 'TOLEDO', 'NACC'),
+    ('北美', '加拿大', 'ON', 'TORONTO', 'NACC'),
+    ('欧洲', '德国', 'BAVARIA', 'MUNICH', 'EUCC'),
+)
+
+# Constants read by InboundCalculation.calculate()
+CONSTANTS = OrderedDict([
+    ('国内危险品系数', 1.5),
+    ('Milkrun管理费系数', 0.08),
+    ('干线管理费系数', 0.06),
+    ('SY园区立方单价', 35.0),
+    ('WH园区立方单价', 32.0),
+    ('国内CC集装箱容积', 67.0),
+    ('国内CC单箱操作费', 800.0),
+    ('国内CC整车液体装载率', 0.85),
+    ('国内CCPT液体装载率', 0.75),
+    ('单证费系数', 0.02),
+    ('美元汇率', 6.9),
+    ('欧元汇率', 7.8),
+    ('Milkrun武汉园区费率', 30.0),
+])
+
+# 12 meter trucks of the 25km charter rule, by base
+TRUCKS = (('上海12米卡车', 0), ('东岳12米卡车', 1), ('北盛12米卡车', 3))
+
+PACKING_TYPES = OrderedDict([('B-100', 0.3), ('B-200', 0.35), ('RACK', 0.5), ('CARTON', 1.0)])
+
+CONFIGURES = ('LT', 'LTZ', 'PREMIER', 'RS')
+
+# operation modes of imported parts
+IMPORT_MODES = (8, 9, 10, 11, 12, 13)
+
+# columns of the raw ebom rows, as the loader reads them
+TA_EBOM_COLUMNS = (
+    'BOOK', 'MODEL_YEAR', 'PLANT_CODE', 'MODEL', 'UPC', 'FNA',
+    'COMPONENT_MATERIAL_NUMBER', 'COMPONENT_MATERIAL_DESC_E', 'COMPONENT_MATERIAL_DESC_C',
+    'HEADER_PART_NUMBER', 'AR_EM_MATERIAL_FLAG', 'WORKSHOP', 'DUNS_NUMBER', 'VENDOR_NAME',
+    'EWO_NUMBER', 'MODEL_OPTION', 'VPPS', 'PACKAGE', 'ORDER_SAMPLE', 'USAGE_QTY',
+)
+
+
+def create_ta_ebom():
+    """ The raw ebom table, with the columns the loader & group_ebom_by_label read. """
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS ta_ebom (ID INTEGER PRIMARY KEY, %s)' % ', '.join(
+            '%s %s' % (column, 'INTEGER' if column in ('MODEL_YEAR', 'USAGE_QTY') else 'TEXT')
+            for column in TA_EBOM_COLUMNS))
+
+
+def operation_modes(index: int) -> tuple:
+    """ (operation mode, incoterm, property) of the index-th part of a label. """
+    operation_mode = index % 16 + 1
+    cycle = index // 16
+
+    if operation_mode == 14:
+        incoterm = 3
+    elif operation_mode in (15, 16):
+        incoterm = 4
+    elif operation_mode in (1, 5) and cycle % 2:
+        incoterm = 2
+    else:
+        incoterm = 1
+
+    if operation_mode in IMPORT_MODES:
+        # every third import part is bought through a domestic agent
+        part_property = 4 if cycle % 3 == 0 else 2
+    elif operation_mode in (15, 16):
+        part_property = 3
+    else:
+        part_property = 1
+
+    return operation_mode, incoterm, part_property
+
+
+class Dataset:
+    """ Rows generate() created & the parts of every label, to build the uploads from. """
+
+    def __init__(self, labels: list, entries: list, parts: dict, suppliers: dict, warehouses: list):
+        self.labels = labels
+        self.entries = entries
+        # label id -> part dicts, in sheet order
+        self.parts = parts
+        # duns -> Supplier
+        self.suppliers = suppliers
+        self.warehouses = warehouses
+
+    def part_count(self) -> int:
+        return sum(len(label_parts) for label_parts in self.parts.values())
+
+    def wide_matrix(self, label) -> list:
+        """ Wide table of a label laid out like the template: two title rows, the header, then one row per part. """
+        from ..admin import WIDE_HEADER
+        from .. import models
+
+        columns = {(spec['model_name'], spec['field_name']): j for j, spec in enumerate(WIDE_HEADER)}
+        display = {
+            'operation_mode': dict(models.InboundMode.operation_mode_choice),
+            'logistics_incoterm_mode': dict(models.InboundMode.logistics_incoterm_mode_choice),
+            'property': dict(models.InboundAddress.property_choice),
+        }
+
+        width = len(WIDE_HEADER) + len(CONFIGURES)
+        header = [spec['ex_header'] for spec in WIDE_HEADER] + list(CONFIGURES)
+        matrix = [[''] * width, [''] * width, header]
+
+        for part in self.parts[label.id]:
+            supplier = self.suppliers[part['duns']]
+            row = [''] * width
+
+            cells = {
+                ('ebom', 'upc'): part['upc'],
+                ('ebom', 'fna'): part['fna'],
+                ('ebom', 'part_number'): part['part_number'],
+                ('ebom', 'description_en'): part['description_en'],
+                ('ebom', 'header_part_number'): part['header_part_number'],
+                ('ebom', 'quantity'): part['quantity'],
+                ('ebom', 'vendor_duns_number'): part['duns'],
+                ('ebom', 'supplier_name'): supplier.name,
+                ('inboundheaderpart', 'color'): part['color'],
+                ('inboundbuyer', 'contract_supplier_transportation_cost'): part['ddp_cost'],
+                ('inboundaddress', 'property'): display['property'][part['property']],
+                ('inboundaddress', 'country'): part['country'],
+                ('inboundaddress', 'mfg_location'): supplier.address,
+                ('inboundaddress', 'warehouse_address'): part['warehouse_address'],
+                ('inboundmode', 'logistics_incoterm_mode'): display['logistics_incoterm_mode'][part['incoterm']],
+                ('inboundmode', 'operation_mode'): display['operation_mode'][part['operation_mode']],
+            }
+
+            for prefix in ('supplier', 'sgm'):
+                for name in ('name', 'pcs', 'length', 'width', 'height'):
+                    cells[('inboundpackage', '%s_pkg_%s' % (prefix, name))] = part['%s_pkg' % prefix][name]
+
+            for key, value in cells.items():
+                row[columns[key]] = value
+
+            for j, conf_name in enumerate(CONFIGURES, len(WIDE_HEADER)):
+                row[j] = part['configures'].get(conf_name, '')
+
+            matrix.append(row)
+
+        return matrix
+
+    def write_configures(self, path: str) -> int:
+        """ configures.csv of every loaded part, as import_configures reads it; returns parts written. """
+        from .. import models
+
+        written = 0
+
+        with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(('id', ) + CONFIGURES)
+
+            for label in self.labels:
+                ids = {
+                    key[1:]: key[0] for key in models.Ebom.objects.filter(label=label).order_by('id').values_list(
+                        'id', 'part_number', 'header_part_number', 'upc', 'fna')
+                }
+
+                for part in self.parts[label.id]:
+                    bom_id = ids.get((part['part_number'], part['header_part_number'], part['upc'], part['fna']))
+
+                    if bom_id is not None:
+                        writer.writerow([bom_id] + [part['configures'].get(conf_name, '') for conf_name in CONFIGURES])
+                        written += 1
+
+        return written
+
+
+def generate_suppliers(rand: random.Random, count: int) -> tuple:
+    """ Domestic & import suppliers, warehouses, and their distances to every base. """
+    from .. import models
+
+    suppliers = []
+    warehouses = []
+
+    for k in range(count):
+        if k % 4 < 3:
+            region, province, city = DOMESTIC_LOCATIONS[k % len(DOMESTIC_LOCATIONS)]
+        else:
+            region, _, province, city, _ = IMPORT_LOCATIONS[k // 4 % len(IMPORT_LOCATIONS)]
+
+        suppliers.append(models.Supplier(
+            duns='D%06d' % k, name='SUPPLIER %d' % k, address='ADDR%05d' % k, post_code='%06d' % k,
+            region=region, province=province, district=city, original_source='benchmark'))
+
+    for k in range(max(2, count // 50)):
+        region, province, city = DOMESTIC_LOCATIONS[k % len(DOMESTIC_LOCATIONS)]
+        warehouses.append(models.Supplier(
+            duns='W%06d' % k, name='WAREHOUSE %d' % k, address='WHADDR%03d' % k, post_code='%06d' % k,
+            region=region, province=province, district=city, original_source='benchmark'))
+
+    models.Supplier.objects.bulk_create(suppliers + warehouses)
+    stored = {supplier.address: supplier for supplier in models.Supplier.objects.all()}
+
+    distances = []
+
+    for supplier in stored.values():
+        for base in BASES:
+            if supplier.region in ('北美', '欧洲'):
+                # to the port of entry
+                distance = rand.randint(30, 300)
+            else:
+                distance = rand.choice((rand.randint(1, 25), rand.randint(26, 500), rand.randint(501, 2500)))
+
+            distances.append(models.SupplierDistance(supplier=supplier, base=base, distance=distance))
+
+    models.SupplierDistance.objects.bulk_create(distances)
+
+    return (
+        [stored[supplier.address] for supplier in suppliers],
+        [stored[supplier.address] for supplier in warehouses],
+    )
+
+
+def generate_rates(rand: random.Random, suppliers: list):
+    """ Every rate table the calculation looks up, the constants & the packing folding rates. """
+    from .. import models
+
+    models.Constants.objects.bulk_create([
+        models.Constants(constant_key=key, value_type=2, constant_value_float=value) for key, value in CONSTANTS.items()
+    ])
+
+    models.PackingFoldingRate.objects.bulk_create([
+        models.PackingFoldingRate(packing_type=packing_type, folding_rate=rate) for packing_type, rate in PACKING_TYPES.items()
+    ])
+
+    models.VMIRate.objects.bulk_create([
+        models.VMIRate(base=base, whether_repacking=repacking, rate=round(rand.uniform(20, 60), 2))
+        for base in BASES for repacking in (False, True)
+    ])
+
+    models.TruckRate.objects.bulk_create([
+        models.TruckRate(name=name, base=base, cube=70, loading_ratio=0.8, capable_cube=56, avg_speed=40, load_time=2,
+                         oil_price=1.05, charter_price=round(rand.uniform(1200, 2000), 2), overdue_price=100,
+                         rate_per_km=3.5)
+        for name, base in TRUCKS
+    ])
+
+    # region_or_route is unique, each city is priced from one base
+    models.RegionRouteRate.objects.bulk_create([
+        models.RegionRouteRate(related_base=BASES[k % len(BASES)], region_or_route=city, km=rand.randint(30, 500),
+                               price_per_cube=round(rand.uniform(0.5, 2), 3))
+        for k, (_, _, city) in enumerate(DOMESTIC_LOCATIONS)
+    ])
+
+    # matched on the exact distance
+    models.WhCubePrice.objects.bulk_create([
+        models.WhCubePrice(km=km, cube_price=round(20 + km * 0.4, 2)) for km in range(0, 501)
+    ])
+
+    models.WaterwayRate.objects.bulk_create([
+        models.WaterwayRate(start_base=base, destination_base=0, rate=round(rand.uniform(3000, 6000), 2)) for base in BASES
+    ])
+
+    models.InboundSupplierRate.objects.bulk_create([
+        models.InboundSupplierRate(base=base, pickup_location=supplier.address, address=supplier.address,
+                                   duns=supplier.duns, supplier=supplier.name,
+                                   forward_rate=round(rand.uniform(0.2, 0.6), 3),
+                                   backward_rate=round(rand.uniform(0.1, 0.3), 3), manage_ratio=0.06,
+                                   vmi_rate=round(rand.uniform(20, 40), 2), oneway_km=rand.randint(500, 2500))
+        for supplier in suppliers if supplier.region not in ('北美', '欧洲') for base in BASES
+    ])
+
+    models.InboundOverseaRate.objects.bulk_create([
+        models.InboundOverseaRate(region=province, base=base, cc=cc, export_harbor='%s PORT' % city,
+                                  definition_harbor='上海港', os_dm_rate=round(rand.uniform(20, 60), 2),
+                                  cc_rate=round(rand.uniform(5, 15), 2), euro_doc_rate=50,
+                                  os_40h_rate=1500, os_40h_danger_rate=2500, inter_40h_rate=2200,
+                                  inter_40h_danger_rate=3500, dm_40h_rate=1800, dm_40h_danger_rate=2600,
+                                  delegate=600, delegate_danger=900, vol_40h=67, load_rate=0.8, cpc=30, cpc_danger=45)
+        for _, _, province, city, cc in IMPORT_LOCATIONS for base in BASES
+    ])
+
+    models.InboundCCSupplierRate.objects.bulk_create([
+        models.InboundCCSupplierRate(supplier_duns=supplier.duns, supplier_name=supplier.name,
+                                     pick_up_location=supplier.address, state=supplier.province, city=supplier.district,
+                                     zip_code=supplier.post_code, kilometers=rand.randint(10, 300),
+                                     rate=round(rand.uniform(1, 3), 2), cpc=round(rand.uniform(10, 40), 2))
+        for supplier in suppliers if supplier.province in ('MI', 'OH')
+    ])
+
+    models.AirFreightRate.objects.bulk_create([
+        models.AirFreightRate(country=country, base=prefix, rate=round(rand.uniform(20, 40), 2),
+                              danger_rate=round(rand.uniform(40, 80), 2))
+        for country in sorted({location[1] for location in IMPORT_LOCATIONS}) for prefix in BASE_PREFIXES
+    ])
+
+
+def generate_parts(rand: random.Random, label_index: int, parts: int, suppliers: list, warehouses: list) -> list:
+    """ Part dicts of a label; half of them are shared with the label before. """
+    domestic = [supplier for supplier in suppliers if supplier.region not in ('北美', '欧洲')]
+    imported = [supplier for supplier in suppliers if supplier.region in ('北美', '欧洲')]
+    countries = {location[3]: location[1] for location in IMPORT_LOCATIONS}
+    first = label_index * parts // 2
+    result = []
+
+    for index in range(parts):
+        number = first + index
+        operation_mode, incoterm, part_property = operation_modes(index)
+        supplier = rand.choice(imported if part_property in (2, 4) else domestic)
+        configures = {conf_name: rand.randint(1, 4) for conf_name in CONFIGURES if rand.random() < 0.7}
+
+        result.append({
+            'upc': 'U%02d' % (number % 40),
+            'fna': 'F%03d' % (number % 300),
+            'part_number': 'P%07d' % number,
+            'description_en': 'PART TYPE %d %s' % (number % 60, rand.choice(('LH', 'RH', 'ASM'))),
+            'description_cn': '零件 %d' % number,
+            # parts come in groups of 10 under their first one
+            'header_part_number': 'P%07d' % (number - number % 10),
+            'quantity': rand.randint(1, 4),
+            'ar_em': rand.choice(('AR', 'EM', None)),
+            'work_shop': rand.choice(('GA', 'BS', 'PS')),
+            'duns': supplier.duns,
+            'ewo_number': 'EWO%05d' % rand.randrange(100000),
+            'model_and_option': 'OPT%d' % rand.randrange(20),
+            'vpps': 'V%04d' % rand.randrange(10000),
+            'operation_mode': operation_mode,
+            'incoterm': incoterm,
+            'property': part_property,
+            'country': countries.get(supplier.district, '中国'),
+            'warehouse_address': rand.choice(warehouses).address if incoterm == 2 else '',
+            'ddp_cost': round(rand.uniform(0.1, 5), 2) if incoterm == 3 else '',
+            'color': rand.choice(('', '', 'RED', 'BLACK')),
+            'supplier_pkg': {
+                'name': rand.choice(list(PACKING_TYPES)), 'pcs': rand.randint(10, 200),
+                'length': rand.randint(300, 1200), 'width': rand.randint(200, 1000), 'height': rand.randint(150, 900),
+            },
+            'sgm_pkg': {
+                'name': rand.choice(list(PACKING_TYPES)), 'pcs': rand.randint(10, 200),
+                'length': rand.randint(300, 1200), 'width': rand.randint(200, 1000), 'height': rand.randint(150, 900),
+            },
+            'configures': configures,
+            # a fifth of the parts are used in two packages, one ta_ebom row each
+            'packages': ('PKG1', 'PKG2') if rand.random() < 0.2 else ('PKG1', ),
+        })
+
+    return result
+
+
+def generate(labels: int = 4, parts: int = 500, seed: int = 0) -> Dataset:
+    """ Fill the database with labels x parts; it should hold no costsummary rows yet. """
+    from .. import models
+    from ..resolvers import EbomCounts, SupplierDirectory, TecMatcher
+    from ..snapshot import RateSnapshot
+
+    rand = random.Random(seed)
+
+    models.TecCore.objects.bulk_create([
+        models.TecCore(tec_id=tec_id, common_part_name='PART TYPE %d' % tec_id,
+                       mgo_part_name_list='PART TYPE %d LH / PART TYPE %d RH' % (tec_id, tec_id))
+        for tec_id in range(60)
+    ])
+
+    suppliers, warehouses = generate_suppliers(rand, max(8, parts // 10))
+    generate_rates(rand, suppliers)
+
+    label_objects = []
+
+    for i in range(labels):
+        model_year = 2019 + i % 3
+        label_objects.append(models.NominalLabelMapping.objects.create(
+            value='BENCH%02d %d' % (i, model_year), book='B%02d' % i, plant_code=PLANT_CODES[i % len(PLANT_CODES)],
+            model='M%02d' % i))
+
+    create_ta_ebom()
+    supplier_names = {supplier.duns: supplier.name for supplier in suppliers}
+    entries = []
+    label_parts = OrderedDict()
+
+    for i, label in enumerate(label_objects):
+        model_year = int(label.value[-4:])
+        label_parts[label.id] = generate_parts(rand, i, parts, suppliers, warehouses)
+        rows = []
+
+        for part in label_parts[label.id]:
+            for package in part['packages']:
+                rows.append((
+                    label.book, model_year, label.plant_code, label.model, part['upc'], part['fna'],
+                    part['part_number'], part['description_en'], part['description_cn'],
+                    part['header_part_number'], part['ar_em'], part['work_shop'], part['duns'], supplier_names[part['duns']],
+                    part['ewo_number'], part['model_and_option'], part['vpps'],
+                    package, rand.choice(('O', 'S')), part['quantity'],
+                ))
+
+        with connection.cursor() as cursor:
+            cursor.executemany('INSERT INTO ta_ebom (%s) VALUES (%s)' % (
+                ', '.join(TA_EBOM_COLUMNS), ', '.join(['%s'] * len(TA_EBOM_COLUMNS))), rows)
+
+        entries.append(models.AEbomEntry.objects.create(label=label, model_year=model_year, row_count=len(rows)))
+
+        # production of every configure over the projection years
+        models.Production.objects.bulk_create([
+            models.Production(base=label.plant_code[0: 2], plant=label.plant_code, label=label.value,
+                              configure=conf_name, production=rand.randint(1000, 50000), prd_year=year)
+            for conf_name in CONFIGURES for year in range(model_year, model_year + 8)
+        ])
+
+    models.FutureRate.objects.bulk_create([
+        models.FutureRate(year=year, dom_rate=0.97, import_rate=0.98) for year in range(2019, 2035)
+    ])
+
+    # bulk_create sends no post_save, snapshots read before are dropped here
+    for snapshot in (RateSnapshot, SupplierDirectory, TecMatcher, EbomCounts):
+        snapshot.invalidate()
+
+    return Dataset(label_objects, entries, label_parts, {supplier.duns: supplier for supplier in suppliers},
+                   warehouses)
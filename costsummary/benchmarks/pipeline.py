@@ -0,0 +1,302 @@
+""" Benchmark of a label's whole way, from raw ebom rows to the statistics & the export.
+
+    python -m costsummary.benchmarks.pipeline --labels 4 --parts 1000 --repeat 3 --output baseline.json
+    python -m costsummary.benchmarks.pipeline --labels 4 --parts 1000 --repeat 3 --baseline baseline.json
+
+Creates a throwaway test database in a temporary file, fills it with
+dataset.generate() and times each stage in the order the application runs
+them: loading the ebom entries, uploading the wide table, importing the
+configure matrix, per-part & whole label recalculation, every statistic and
+the wide table download. Each stage reports seconds, queries, DB seconds, rows
+& rows per second, and the timed functions it called, as JSON.
+
+With --repeat, the pipeline runs again on fresh databases and each stage keeps
+its best time. Given a baseline of the same dataset, stages slower than the
+baseline by more than the tolerance are listed and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager, redirect_stdout
+from io import StringIO
+
+import django
+
+# a stage this much slower than its baseline is a regression, unless it takes less than NOISE_SECONDS longer
+TOLERANCE = 0.25
+NOISE_SECONDS = 0.1
+
+# parts of the first label recalculated one by one
+SAMPLE_PARTS = 200
+
+# statistic stages in the order refresh_statistics runs them, then each rollup level alone
+STATISTIC_STAGES = (
+    'conf_calculation',
+    'rollup_statistics',
+    'future_model_table',
+    'summary_model_calculate',
+    'model_statistic',
+    'plant_statistic',
+    'base_statistic',
+    'sgm_statistic',
+)
+
+
+def result_rows(result) -> int:
+    """ Rows a stage handled from its result: a count, or a tuple of counts. """
+    if isinstance(result, int):
+        return result
+
+    if isinstance(result, (tuple, list)) and all(isinstance(value, int) for value in result):
+        return sum(result)
+
+    return 0
+
+
+class Stages:
+    """ Timings of the stages run so far, each with the timed functions it called. """
+
+    def __init__(self):
+        self.results = OrderedDict()
+
+    def run(self, name: str, function, *args):
+        """ Time one stage, returns its result. """
+        from ..metrics import REGISTRY, rows_per_second, timer
+
+        before = REGISTRY.snapshot()
+
+        with timer(None) as span:
+            result = function(*args)
+
+        after = REGISTRY.snapshot()
+        calls = OrderedDict()
+
+        for metric, stat in after.items():
+            previous = before.get(metric, {'calls': 0, 'seconds': 0.0, 'rows': 0})
+
+            if stat['calls'] > previous['calls']:
+                calls[metric] = OrderedDict([
+                    ('calls', stat['calls'] - previous['calls']),
+                    ('seconds', stat['seconds'] - previous['seconds']),
+                    ('rows', stat['rows'] - previous['rows']),
+                ])
+
+        # a stage returning no count, e.g. StatisticRollup, reports its rows to the metrics
+        rows = result_rows(result) or sum(stat['rows'] for stat in calls.values())
+        self.results[name] = OrderedDict([
+            ('seconds', span.seconds),
+            ('queries', span.queries),
+            ('db_seconds', span.db_seconds),
+            ('rows', rows),
+            ('rows_per_second', rows_per_second(rows, span.seconds)),
+            ('calls', calls),
+        ])
+
+        return result
+
+
+def admin_request(path: str = '/'):
+    """ Request of a superuser, with message storage for message_user. """
+    from django.contrib.auth.models import User
+    from django.contrib.messages.storage.cookie import CookieStorage
+    from django.test import RequestFactory
+
+    request = RequestFactory().get(path)
+    request.user = User.objects.filter(is_superuser=True).first() or \
+        User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    request._messages = CookieStorage(request)
+
+    return request
+
+
+def run(labels: int = 4, parts: int = 500, seed: int = 0, sample: int = SAMPLE_PARTS) -> OrderedDict:
+    """ Generate the dataset & time every stage, on the current (empty) database. """
+    from django.contrib import admin
+    from django.core.management import call_command
+
+    from .. import models, statistic, views
+    from ..admin import AEbomEntryAdmin, UploadHandlerAdmin
+    from ..engine import BatchCostEngine
+    from ..metrics import release
+    from .dataset import generate
+
+    stages = Stages()
+    dataset = stages.run('generate', lambda: generate(labels, parts, seed))
+    request = admin_request()
+
+    def load():
+        AEbomEntryAdmin(models.AEbomEntry, admin.site).load(
+            request, models.AEbomEntry.objects.filter(id__in=[entry.id for entry in dataset.entries]))
+        return models.Ebom.objects.count()
+
+    stages.run('load', load)
+
+    def parse_wide():
+        upload_admin = UploadHandlerAdmin(models.UploadHandler, admin.site)
+        return sum(len(upload_admin.parse_wide(dataset.wide_matrix(label), label, veh_pt=1)) for label in dataset.labels)
+
+    stages.run('parse_wide', parse_wide)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'configures.csv')
+        dataset.write_configures(path)
+        stages.run('import_configures', lambda: call_command('import_configures', path, stdout=StringIO()) or
+                   models.ConfigureValue.objects.count())
+
+    def recalculate_parts():
+        calc_objects = list(models.InboundCalculation.objects.filter(
+            bom__label=dataset.labels[0]).order_by('id')[: sample])
+
+        for calc_object in calc_objects:
+            calc_object.save()
+
+        return len(calc_objects)
+
+    stages.run('recalculate_part', recalculate_parts)
+    stages.run('recalculate_label', lambda: sum(BatchCostEngine().recalculate(label) for label in dataset.labels))
+
+    for name in STATISTIC_STAGES:
+        stages.run('statistic.%s' % name, getattr(statistic, name))
+
+    def download():
+        lines = 0
+
+        for label in dataset.labels:
+            response = views.download_wide_table(admin_request('/?format=csv'), label.id)
+
+            for _ in response.streaming_content:
+                lines += 1
+
+        # without the header lines
+        return lines - len(dataset.labels)
+
+    stages.run('download_wide_table', download)
+
+    return OrderedDict([
+        ('meta', OrderedDict([
+            ('labels', labels),
+            ('parts', parts),
+            ('seed', seed),
+            ('sample', sample),
+            ('release', release()),
+            ('created', datetime.datetime.now().isoformat(timespec='seconds')),
+            ('python', platform.python_version()),
+            ('django', django.get_version()),
+            ('sqlite', sqlite3.sqlite_version),
+        ])),
+        ('stages', stages.results),
+    ])
+
+
+def compare(result: dict, baseline: dict, tolerance: float = TOLERANCE, noise: float = NOISE_SECONDS) -> list:
+    """ (stage, baseline seconds, seconds, ratio, regression) of every stage in both.
+
+    Raises ValueError when the baseline was taken on another dataset.
+    """
+    keys = ('labels', 'parts', 'seed', 'sample')
+
+    if any(result['meta'][key] != baseline['meta'].get(key) for key in keys):
+        raise ValueError('Baseline of another dataset: %s' % ', '.join(
+            '%s %s' % (key, baseline['meta'].get(key)) for key in keys))
+
+    rows = []
+
+    for stage, stat in result['stages'].items():
+        if stage not in baseline['stages']:
+            continue
+
+        baseline_seconds = baseline['stages'][stage]['seconds']
+        seconds = stat['seconds']
+        regression = seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds > noise
+
+        rows.append((stage, baseline_seconds, seconds, seconds / baseline_seconds if baseline_seconds else None,
+                     regression))
+
+    return rows
+
+
+def best_of(runs: list) -> OrderedDict:
+    """ Results of the first run, each stage taken from the run where it was fastest. """
+    results = OrderedDict(runs[0])
+    results['stages'] = OrderedDict(
+        (stage, min((run_results['stages'][stage] for run_results in runs), key=lambda stat: stat['seconds']))
+        for stage in runs[0]['stages']
+    )
+    results['meta']['repeat'] = len(runs)
+
+    return results
+
+
+@contextmanager
+def throwaway_database():
+    """ Fresh test databases for one run, in a temporary file.
+
+    A file rather than sqlite's in-memory test database: timings include the
+    journal & syncs of the connection profile, and Django never closes an
+    in-memory database, so a second run could not start empty.
+    """
+    from django.db import connections
+    from django.test.utils import setup_databases, teardown_databases
+
+    with tempfile.TemporaryDirectory() as directory:
+        connections['default'].settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        old_config = setup_databases(verbosity=0, interactive=False)
+
+        try:
+            yield
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--labels', type=int, default=4)
+    parser.add_argument('--parts', type=int, default=500, help='parts of every label')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', type=int, default=SAMPLE_PARTS, help='parts recalculated one by one')
+    parser.add_argument('--repeat', type=int, default=1, help='runs on fresh databases, the best time of each stage is kept')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Inbound.settings')
+    django.setup()
+
+    runs = []
+
+    # the calculation prints traces, which would end up in the JSON & in the timings
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(options.repeat):
+            with throwaway_database(), redirect_stdout(devnull):
+                runs.append(run(options.labels, options.parts, options.seed, options.sample))
+
+    results = best_of(runs)
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, ensure_ascii=False, indent=2)
+    else:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    if options.baseline:
+        with open(options.baseline, encoding='utf-8') as baseline_file:
+            try:
+                comparison = compare(results, json.load(baseline_file), options.tolerance)
+            except ValueError as e:
+                sys.exit(str(e))
+
+        for stage, baseline_seconds, seconds, ratio, regression in comparison:
+            print('%-34s %10.3f %10.3f %8s %s' % (
+                stage, baseline_seconds, seconds, '%.2fx' % ratio if ratio else '-', 'REGRESSION' if regression else ''),
+                file=sys.stderr)
+
+        if any(row[-1] for row in comparison):
+            sys.exit(1)
@@ -0,0 +1,123 @@
+""" Regression benchmark of the eight-year model statistic projection.
+
+    python -m costsummary.benchmarks.projection --models 2000
+
+Runs the former np.where / shift implementation of summary_model_calculate
+and projection.project on the same synthetic SummaryModel & FutureRate
+frames, checks both give identical figures and prints their timings.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..projection import DEFAULT_HORIZON, project
+
+PROJECTED = ['model_year', 'import_ib', 'dom_ddp_ib', 'dom_fca_ib', 'inbound_ttl_veh']
+
+
+def legacy_project(modelstatistic: pd.DataFrame, rate: pd.DataFrame) -> pd.DataFrame:
+    """ Projection as summary_model_calculate computed it before, 8 years only. """
+    df_mark = pd.DataFrame({'mark':'mark','year':[9999,9999,9999,9999,9999,9999,9999,9999]})
+    modelstatistic['mark']='mark'
+    rate=rate.rename(columns={'dom_rate':'dom_decline_rate'})
+    merge1=pd.merge(modelstatistic,df_mark,left_on='mark',right_on='mark',how='left')
+    merge1['index']=merge1.index
+    merge1['year']=np.where(merge1['value']==merge1['value'].shift(1),merge1['model_year']+merge1['index']%8,merge1['model_year'])
+
+    merge2=pd.merge(merge1,rate,left_on='year',right_on='year',how='left')
+    data=merge2.fillna(0)
+
+    #进口ib
+    data['import_ib_shift']=np.where(data['year']==data['model_year'],data['import_ib'],0)
+    for offset in range(1, 8):
+        data['import_ib_shift']=np.where(data['year']==data['model_year']+offset,data['import_ib_shift'].shift(1)*data['import_rate'],data['import_ib_shift'])
+
+    #国产ddp ib
+    data['dom_ddp_ib_shift']=np.where(data['year']==data['model_year'],data['dom_ddp_ib'],0)
+    for offset in range(1, 8):
+        data['dom_ddp_ib_shift']=np.where(data['year']==data['model_year']+offset,data['dom_ddp_ib_shift'].shift(1)*data['dom_decline_rate'],data['dom_ddp_ib_shift'])
+
+    #国产fca ib
+    data['dom_fca_ib_shift']=np.where(data['year']==data['model_year'],data['dom_fca_ib'],0)
+    for offset in range(1, 8):
+        data['dom_fca_ib_shift']=np.where(data['year']==data['model_year']+offset,data['dom_fca_ib_shift'].shift(1)*data['dom_decline_rate'],data['dom_fca_ib_shift'])
+
+    #删除多余的列
+    data['model_year']=data['year']
+    data = data.drop(['import_ib','dom_ddp_ib','dom_fca_ib'],axis=1)
+    data = data.rename(columns={'import_ib_shift':'import_ib','dom_ddp_ib_shift':'dom_ddp_ib','dom_fca_ib_shift':'dom_fca_ib'})
+    data['inbound_ttl_veh']=data['import_ib']+data['dom_ddp_ib']+data['dom_fca_ib']
+    return data
+
+
+def synthetic_frames(models: int, seed: int = 0) -> tuple:
+    """ SummaryModel rows of given number of models, one to three model years each, and FutureRate. """
+    random = np.random.RandomState(seed)
+    years_per_model = random.randint(1, 4, size=models)
+    rows = int(years_per_model.sum())
+
+    model_statistic = pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'value': np.repeat(['M%d' % i for i in range(models)], years_per_model),
+        'model_year': 2015 + random.randint(0, 6, size=rows),
+        'import_ib': random.choice([0, 1.5, 27.3, 112.15, np.nan], size=rows),
+        'dom_ddp_ib': random.choice([0, 3.2, 45.9, 0.35], size=rows),
+        'dom_fca_ib': random.choice([0, 8.75, 61.1, np.nan], size=rows),
+    })
+
+    years = [year for year in range(2015, 2031) if random.rand() < .9]
+    future_rate = pd.DataFrame({
+        'id': np.arange(1, len(years) + 1),
+        'year': years,
+        'dom_rate': random.choice([0.97, 0.98, 0.985, 1.0], size=len(years)),
+        'import_rate': random.choice([0.95, 0.99, 0.965], size=len(years)),
+    })
+
+    return model_statistic, future_rate
+
+
+def timed(function, *args, repeat: int = 3) -> tuple:
+    """ Result of the last call & best time of repeat calls. """
+    best = None
+
+    for _ in range(repeat):
+        frames = [frame.copy() for frame in args]
+        started = time.perf_counter()
+        result = function(*frames)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best
+
+
+def run(models: int = 2000, repeat: int = 3, seed: int = 0) -> dict:
+    """ Compare both implementations, raise AssertionError when figures differ. """
+    model_statistic, future_rate = synthetic_frames(models, seed)
+
+    legacy, legacy_seconds = timed(legacy_project, model_statistic, future_rate, repeat=repeat)
+    vectorized, vectorized_seconds = timed(
+        lambda frame, rate: project(frame, rate, DEFAULT_HORIZON), model_statistic, future_rate, repeat=repeat)
+
+    assert len(legacy) == len(vectorized)
+    for column in PROJECTED:
+        assert np.array_equal(legacy[column].values.astype(float), vectorized[column].values.astype(float)), column
+
+    return {
+        'rows': len(vectorized),
+        'legacy_seconds': legacy_seconds,
+        'vectorized_seconds': vectorized_seconds,
+        'speedup': legacy_seconds / vectorized_seconds,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    for key, value in run(options.models, options.repeat, options.seed).items():
+        print('%-20s %s' % (key, value))
@@ -0,0 +1,133 @@
+""" Query plan check of the lookups behind the cost calculation, uploads & statistics.
+
+    python -m costsummary.benchmarks.query_plans --repeat 20
+
+Runs EXPLAIN QUERY PLAN over every hot query against the configured database,
+prints each plan with the best time of repeat runs, and exits with status 1
+when any of them reads its table with a full scan instead of an index.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import django
+
+
+def hot_queries() -> list:
+    """ (name, queryset) of every lookup a calculation, upload or statistic refresh repeats. """
+    from .. import models
+
+    return [
+        # rate tables, looked up by InboundCalculation through the rate snapshot
+        ('Constants', models.Constants.objects.filter(constant_key='美元汇率')),
+        ('VMIRate', models.VMIRate.objects.filter(base=0, whether_repacking=True).order_by('pk')),
+        ('InboundSupplierRate', models.InboundSupplierRate.objects.filter(base=0, pickup_location='').order_by('pk')),
+        ('TruckRate', models.TruckRate.objects.filter(name='')),
+        ('RegionRouteRate', models.RegionRouteRate.objects.filter(related_base=0, region_or_route='')),
+        ('WhCubePrice', models.WhCubePrice.objects.filter(km=0)),
+        ('WaterwayRate', models.WaterwayRate.objects.filter(start_base=0).order_by('pk')),
+        ('InboundOverseaRate', models.InboundOverseaRate.objects.filter(base=0, region='').order_by('pk')),
+        ('InboundCCSupplierRate', models.InboundCCSupplierRate.objects.filter(supplier_duns='').order_by('pk')),
+        ('AirFreightRate', models.AirFreightRate.objects.filter(base='', country='').order_by('pk')),
+        ('PackingFoldingRate', models.PackingFoldingRate.objects.filter(packing_type='')),
+
+        # satellites filled from unsorted TCS & buyer rows, addresses matched to suppliers
+        ('UnsortedInboundTCS', models.UnsortedInboundTCS.objects.filter(part_number='', duns='').order_by('-id')),
+        ('UnsortedInboundTCS batch', models.UnsortedInboundTCS.objects.filter(part_number__in=['']).order_by('id')),
+        ('UnsortedInboundBuyer', models.UnsortedInboundBuyer.objects.filter(part_number='', duns='').order_by('pk')),
+        ('Supplier address', models.Supplier.objects.filter(address='').order_by('pk')),
+        ('Supplier duns', models.Supplier.objects.filter(duns__in=['']).order_by('pk')),
+        ('SupplierDistance', models.SupplierDistance.objects.filter(supplier_id=0, base=0).order_by('pk')),
+
+        # uploads
+        ('Ebom wide table', models.Ebom.objects.filter(label_id=0, veh_pt=1).order_by('id')),
+        ('Production', models.Production.objects.filter(
+            base='', plant='', label='', configure='', prd_year=0).order_by('pk')),
+        ('ConfigureValue', models.ConfigureValue.objects.filter(bom_id__in=[0])),
+        ('EbomWide', models.EbomWide.objects.filter(label_id__in=[0])),
+
+        # changelist pages sought by key
+        ('Ebom next page', models.Ebom.objects.filter(label_id__gte=0).exclude(
+            label_id=0, id__lte=0).order_by('label_id', 'id')[:51]),
+        ('Ebom previous page', models.Ebom.objects.filter(label_id__lte=0).exclude(
+            label_id=0, id__gte=0).order_by('-label_id', '-id')[:51]),
+
+        # recalculation
+        ('InboundCalculation dirty', models.InboundCalculation.objects.filter(dirty=True)),
+        ('RateConsumption', models.RateConsumption.objects.filter(table='Constants', key__in=[''])),
+
+        # statistic upsert keys
+        ('ConfigureCalculation', models.ConfigureCalculation.objects.filter(value__in=['']).order_by('pk')),
+        ('ModelStatistic', models.ModelStatistic.objects.filter(value__in=['']).order_by('pk')),
+        ('PlantStatistic', models.PlantStatistic.objects.filter(plant_code__in=['']).order_by('pk')),
+        ('BaseStatistic', models.BaseStatistic.objects.filter(base__in=['']).order_by('pk')),
+        ('SummaryStatistic', models.SummaryStatistic.objects.filter(company__in=['']).order_by('pk')),
+        ('SummaryModel', models.SummaryModel.objects.filter(value__in=['']).order_by('pk')),
+        ('SummaryModelStatistic', models.SummaryModelStatistic.objects.filter(value__in=['']).order_by('pk')),
+        ('NewModelStatistic', models.NewModelStatistic.objects.filter(
+            base='', plant_code='', value='', model_year=0).order_by('pk')),
+    ]
+
+
+def query_plan(queryset) -> list:
+    """ Detail lines of the sqlite query plan of a queryset. """
+    from django.db import connections
+
+    sql, params = queryset.query.sql_with_params()
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(queryset, plan: list) -> list:
+    """ Plan lines reading the queryset's table row by row. """
+    scan = re.compile(r'^SCAN (TABLE )?%s\b' % re.escape(queryset.model._meta.db_table))
+    return [detail for detail in plan if scan.match(detail)]
+
+
+def timed(queryset, repeat: int) -> float:
+    """ Best time of repeat evaluations. """
+    best = None
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def run(repeat: int = 5) -> list:
+    """ (name, plan, full scans, best seconds) of every hot query. """
+    result = []
+
+    for name, queryset in hot_queries():
+        plan = query_plan(queryset)
+        result.append((name, plan, full_scans(queryset, plan), timed(queryset, repeat)))
+
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Inbound.settings')
+    django.setup()
+
+    failed = []
+
+    for name, plan, scans, seconds in run(options.repeat):
+        print('%-25s %8.3f ms  %s' % (name, seconds * 1000, ' | '.join(plan)))
+
+        if scans:
+            failed.append(name)
+
+    if failed:
+        print('full table scans: %s' % ', '.join(failed))
+        sys.exit(1)
@@ -0,0 +1,139 @@
+""" Regression benchmark of the wide table header & row parsing.
+
+    python -m costsummary.benchmarks.sheets --rows 5000
+
+Parses the same synthetic wide table with the former per-upload header scan,
+which compared every cell with every header and every choice display value,
+and with the compiled SheetSchema, checks both give identical field values and
+prints rows per second of each.
+"""
+import argparse
+import copy
+import os
+import random
+import time
+from itertools import islice
+
+import django
+
+
+def legacy_fields(header: list, matrix: list, empty: dict) -> list:
+    """ Field values of every data row as parse_wide found them before. """
+    from django.apps import apps
+
+    header = copy.deepcopy(header)
+
+    for i, row in enumerate(matrix):
+        if all('col' in dict_obj for dict_obj in header):
+            break
+
+        for j in range(len(row)):
+            cell = str(row[j])
+
+            for k in range(len(header)):
+                if cell.strip().upper() == header[k]['ex_header']:
+                    header[k]['col'] = j
+                    header[k]['row'] = i
+
+    start_row = header[0]['row'] + header[0]['r_offset'] + 1
+    result = []
+
+    for row in islice(matrix, start_row, None):
+        params = {dict_obj['model_name']: dict() for dict_obj in header}
+
+        for dict_obj in header:
+            if dict_obj['skip']:
+                continue
+
+            if not dict_obj['match_display']:
+                value = row[dict_obj['col']]
+                params[dict_obj['model_name']][dict_obj['field_name']] = \
+                    None if value in empty.get(dict_obj['model_name'], ('', )) else value
+
+            else:
+                choice = getattr(apps.get_model('costsummary', dict_obj['model_name']), dict_obj['field_name'] + '_choice')
+
+                for int_val, str_val in choice:
+                    if type(row[dict_obj['col']]) == str:
+                        if row[dict_obj['col']].strip().upper() == str_val.upper():
+                            params[dict_obj['model_name']][dict_obj['field_name']] = int_val
+                            break
+
+        result.append(params)
+
+    return result
+
+
+def schema_fields(schema, matrix: list) -> list:
+    """ Field values of every data row by the compiled schema. """
+    layout = schema.locate(matrix)
+    return [layout.fields(row) for row in islice(matrix, layout.start_row, None)]
+
+
+def synthetic_matrix(header: list, rows: int, seed: int = 0) -> list:
+    """ Wide table laid out like the template: two title rows, the header, then data. """
+    from django.apps import apps
+
+    rand = random.Random(seed)
+    matrix = [[''] * len(header), [''] * len(header), [dict_obj['ex_header'] for dict_obj in header]]
+
+    for i in range(rows):
+        row = []
+
+        for dict_obj in header:
+            if dict_obj['match_display']:
+                choice = getattr(apps.get_model('costsummary', dict_obj['model_name']), dict_obj['field_name'] + '_choice')
+                row.append(rand.choice([str_val for _, str_val in choice] + ['', 'N/A']))
+            else:
+                row.append(rand.choice(['', '-', 'P%d' % i, 1.5, 3]))
+
+        matrix.append(row)
+
+    return matrix
+
+
+def timed(function, *args, repeat: int = 3) -> tuple:
+    """ Result of the last call & best time of repeat calls. """
+    best = None
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best
+
+
+def run(rows: int = 5000, repeat: int = 3, seed: int = 0) -> dict:
+    """ Compare both parsers, raise AssertionError when field values differ. """
+    from ..admin import WIDE_HEADER, WIDE_SCHEMA
+
+    matrix = synthetic_matrix(WIDE_HEADER, rows, seed)
+
+    legacy, legacy_seconds = timed(legacy_fields, WIDE_HEADER, matrix, {'ebom': ('', '-')}, repeat=repeat)
+    compiled, compiled_seconds = timed(schema_fields, WIDE_SCHEMA, matrix, repeat=repeat)
+
+    assert legacy == compiled
+
+    return {
+        'rows': rows,
+        'columns': len(WIDE_HEADER),
+        'legacy_rows_per_second': rows / legacy_seconds,
+        'schema_rows_per_second': rows / compiled_seconds,
+        'speedup': legacy_seconds / compiled_seconds,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Inbound.settings')
+    django.setup()
+
+    for key, value in run(options.rows, options.repeat, options.seed).items():
+        print('%-25s %s' % (key, value))
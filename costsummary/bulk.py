@@ -0,0 +1,145 @@
+import logging
+
+import pandas as pd
+from django.db import connections, router, transaction
+
+from .database import reporting_alias
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_update(objs, fields, batch_size=500, using=None) -> int:
+    """ Write given fields of many saved objects back, one prepared UPDATE per batch.
+
+    Django 1.11 has no QuerySet.bulk_update; this sends a single parameterized
+    statement through executemany instead of one save() round trip per object.
+    save() overrides & signals are skipped, as with QuerySet.update().
+    """
+    objs = list(objs)
+
+    if not objs:
+        return 0
+
+    model = type(objs[0])
+    opts = model._meta
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+
+    update_fields = [opts.get_field(name) for name in fields]
+
+    sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+        qn(opts.db_table),
+        ', '.join('%s = %%s' % qn(field.column) for field in update_fields),
+        qn(opts.pk.column)
+    )
+
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in update_fields]
+        + [opts.pk.get_db_prep_save(obj.pk, connection)]
+        for obj in objs
+    ]
+
+    with transaction.atomic(using=using, savepoint=False):
+        with connection.cursor() as cursor:
+            for start in range(0, len(params), batch_size):
+                cursor.executemany(sql, params[start: start + batch_size])
+
+    return len(params)
+
+
+def read_frame(sql, params=None, chunksize=2000, using=None) -> pd.DataFrame:
+    """ Rows of a query as a dataframe, read through Django's connection to the database.
+
+    Placeholders are %s whatever the backend, as for cursor.execute(). The cursor is
+    fetched chunksize rows at a time & closed after, the connection stays open for
+    reuse as configured by CONN_MAX_AGE. Decimals are coerced to floats like read_sql.
+    Reads go to the reporting database unless using is given.
+    """
+    frames = []
+
+    with connections[using or reporting_alias()].cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+
+        while True:
+            rows = cursor.fetchmany(chunksize)
+
+            if not rows:
+                break
+
+            frames.append(pd.DataFrame.from_records(rows, columns=columns, coerce_float=True))
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _python_value(field, value):
+    """ Python value of a dataframe cell, as the field would read it back; NaN becomes None. """
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+
+    if hasattr(value, 'item'):
+        # numpy scalar
+        value = value.item()
+
+    return field.to_python(value)
+
+
+def bulk_upsert(model, dataframe, key_columns, value_columns, batch_size=500, using=None) -> tuple:
+    """ Insert or update one row of model per dataframe row, matched on key columns.
+
+    Existing keys are read in one pass, then missing rows go through bulk_create
+    & existing rows through bulk_update, in batches within one transaction. When
+    several dataframe rows share a key, the last one wins, as with a save() per
+    row. Returns (inserted, updated), which are also logged.
+    """
+    opts = model._meta
+    using = using or router.db_for_write(model)
+    key_fields = [opts.get_field(name) for name in key_columns]
+    value_fields = [opts.get_field(name) for name in value_columns]
+
+    rows = dict()
+    for record in dataframe[list(key_columns) + list(value_columns)].itertuples(index=False, name=None):
+        key = tuple(_python_value(field, value) for field, value in zip(key_fields, record))
+        rows[key] = record[len(key_columns):]
+
+    if not rows:
+        return 0, 0
+
+    with transaction.atomic(using=using, savepoint=False):
+        existing = dict()
+        first_values = sorted({key[0] for key in rows if key[0] is not None}, key=str)
+        lookups = [{'%s__in' % key_columns[0]: first_values[start: start + batch_size]}
+                   for start in range(0, len(first_values), batch_size)]
+
+        # __in never matches NULL
+        if any(key[0] is None for key in rows):
+            lookups.append({'%s__isnull' % key_columns[0]: True})
+
+        for lookup in lookups:
+            for record in model._default_manager.using(using).filter(**lookup).order_by('pk').values_list(
+                    'pk', *key_columns):
+                existing.setdefault(record[1:], record[0])
+
+        created, updated = [], []
+
+        for key, values in rows.items():
+            obj = model(**dict(zip(key_columns, key)))
+
+            for field, value in zip(value_fields, values):
+                setattr(obj, field.attname, _python_value(field, value))
+
+            if key in existing:
+                obj.pk = existing[key]
+                updated.append(obj)
+            else:
+                created.append(obj)
+
+        model._default_manager.using(using).bulk_create(created, batch_size=batch_size)
+        bulk_update(updated, value_columns, batch_size=batch_size, using=using)
+
+    logger.info('%s: %d inserted, %d updated', opts.object_name, len(created), len(updated))
+    return len(created), len(updated)
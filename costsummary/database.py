@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# pragmas run on every new sqlite connection, overridden by settings.SQLITE_PRAGMAS
+SQLITE_PRAGMAS = OrderedDict([
+    # readers see the last commit while a writer appends to the log, instead of waiting for it
+    ('journal_mode', 'WAL'),
+    # fsync at checkpoints only, still safe against corruption in WAL mode
+    ('synchronous', 'NORMAL'),
+    # negative: KiB of page cache, 64 MiB
+    ('cache_size', -65536),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+])
+
+# pragmas which write to the database file
+WRITING_PRAGMAS = ('journal_mode', )
+
+
+def sqlite_pragmas() -> OrderedDict:
+    """ Pragmas of new sqlite connections, defaults updated by the SQLITE_PRAGMAS setting. """
+    pragmas = OrderedDict(SQLITE_PRAGMAS)
+    pragmas.update(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    return pragmas
+
+
+def apply_pragmas(cursor, pragmas: dict, read_only=False):
+    """ Run pragmas on a DB-API cursor; None values are skipped. """
+    for name, value in pragmas.items():
+        if value is None or (read_only and name in WRITING_PRAGMAS):
+            continue
+
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+
+    if read_only:
+        cursor.execute('PRAGMA query_only = ON')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """ connection_created receiver, tunes sqlite connections & keeps the reporting one from writing. """
+    if connection.vendor != 'sqlite':
+        return
+
+    read_only = connection.alias == getattr(settings, 'REPORTING_DATABASE', None)
+    cursor = connection.connection.cursor()
+
+    try:
+        apply_pragmas(cursor, sqlite_pragmas(), read_only)
+    finally:
+        cursor.close()
+
+
+def reporting_database() -> str:
+    """ Alias configured for reporting reads, the default database when there is none. """
+    alias = getattr(settings, 'REPORTING_DATABASE', None)
+    return alias if alias in connections.databases else DEFAULT_DB_ALIAS
+
+
+def reporting_alias() -> str:
+    """ Alias long reads should go through.
+
+    The reporting connection only sees committed rows, so a read within a
+    transaction of the default database goes to the default one.
+    """
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+
+    return reporting_database()
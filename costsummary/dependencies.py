@@ -0,0 +1,187 @@
+from collections import OrderedDict
+
+from django.apps import apps
+from django.db.models import Q
+
+from .snapshot import RATE_LOOKUPS, rate_key
+
+ADDRESS_FIELDS = ('property', 'city', 'province', 'mfg_location', 'distance_to_sgm_plant', 'distance_to_shanghai_cc',
+                  'warehouse_to_sgm_plant')
+
+PACKAGE_FIELDS = ('pkg_cubic_pcs', 'pkg_folding_rate', 'sgm_pkg_name', 'sgm_pkg_pcs', 'sgm_pkg_length',
+                  'sgm_pkg_width', 'sgm_pkg_height', 'supplier_pkg_name', 'supplier_pkg_pcs', 'supplier_pkg_length',
+                  'supplier_pkg_width', 'supplier_pkg_height')
+
+MODE_FIELDS = ('logistics_incoterm_mode', 'operation_mode')
+
+# inputs of each cost component of InboundCalculation.calculate(): model -> fields read,
+# None for rate tables, whose rows are matched to parts through RateConsumption
+COMPONENT_INPUTS = OrderedDict([
+    ('calculate', {
+        'InboundMode': MODE_FIELDS,
+    }),
+    ('calculate_ddp_pcs', {
+        'InboundMode': MODE_FIELDS,
+        'InboundBuyer': ('contract_supplier_transportation_cost', ),
+    }),
+    ('calculate_domestic_land_transportation_cost', {
+        'Ebom': ('label', ),
+        'NominalLabelMapping': ('plant_code', ),
+        'InboundMode': MODE_FIELDS,
+        'InboundAddress': ADDRESS_FIELDS,
+        'InboundPackage': PACKAGE_FIELDS,
+        'Constants': None,
+        'VMIRate': None,
+        'InboundSupplierRate': None,
+        'TruckRate': None,
+        'RegionRouteRate': None,
+        'WhCubePrice': None,
+    }),
+    ('calculate_domestic_shipping_cost', {
+        'Ebom': ('label', 'veh_pt'),
+        'NominalLabelMapping': ('plant_code', ),
+        'InboundMode': MODE_FIELDS,
+        'InboundAddress': ('property', ),
+        'InboundPackage': ('pkg_cubic_pcs', 'pkg_folding_rate'),
+        'Constants': None,
+        'WaterwayRate': None,
+    }),
+    ('calculate_oversea_cost', {
+        'Ebom': ('label', 'duns'),
+        'NominalLabelMapping': ('plant_code', ),
+        'InboundMode': MODE_FIELDS,
+        'InboundAddress': ('property', 'province'),
+        'InboundPackage': ('pkg_cubic_pcs', ),
+        'Constants': None,
+        'InboundOverseaRate': None,
+        'InboundCCSupplierRate': None,
+        'AirFreightRate': None,
+    }),
+    ('calculate_ib_cost', {
+        'Ebom': ('quantity', ),
+    }),
+])
+
+# changed row -> lookup of the InboundCalculation rows reading it & the row attribute it is matched to
+PART_LOOKUPS = {
+    'Ebom': ('bom_id', 'pk'),
+    'NominalLabelMapping': ('bom__label_id', 'pk'),
+    'InboundMode': ('bom_id', 'bom_id'),
+    'InboundPackage': ('bom_id', 'bom_id'),
+    'InboundAddress': ('bom_id', 'bom_id'),
+    'InboundBuyer': ('bom_id', 'bom_id'),
+}
+
+
+def input_fields() -> dict:
+    """ Fields read of each input model over all components, None for a whole table. """
+    fields = OrderedDict()
+
+    for inputs in COMPONENT_INPUTS.values():
+        for model_name, names in inputs.items():
+            if names is None or fields.get(model_name, ()) is None:
+                fields[model_name] = None
+            else:
+                fields[model_name] = tuple(OrderedDict.fromkeys(fields.get(model_name, ()) + names))
+
+    return fields
+
+
+INPUT_FIELDS = input_fields()
+
+
+def _calculations():
+    return apps.get_model('costsummary', 'InboundCalculation').objects
+
+
+def mark_dirty(calculations=None) -> int:
+    """ Flag InboundCalculation rows for recalculation, all by default; returns rows newly flagged. """
+    if calculations is None:
+        calculations = _calculations().all()
+
+    return calculations.filter(dirty=False).update(dirty=True)
+
+
+def row_keys(instance, values) -> set:
+    """ Rate keys a rate row answers to, given its values by attname. """
+    model = type(instance)
+
+    return {
+        rate_key(model, **{name: values.get(model._meta.get_field(name).attname) for name in fields})
+        for fields in RATE_LOOKUPS[model._meta.object_name]
+    }
+
+
+def consumers(model, keys):
+    """ InboundCalculation rows which looked up any of keys in a rate table, or whose lookups are not recorded. """
+    consumption = apps.get_model('costsummary', 'RateConsumption').objects.filter(
+        table=model._meta.object_name, key__in=list(keys))
+
+    return _calculations().filter(Q(bom_id__in=consumption.values('bom_id')) | Q(consumption_recorded=False))
+
+
+def record_consumption(calc_objects):
+    """ Replace the rate lookups recorded for calculated parts. """
+    rate_consumption = apps.get_model('costsummary', 'RateConsumption')
+    bom_ids = [calc_object.bom_id for calc_object in calc_objects]
+
+    for start in range(0, len(bom_ids), 500):
+        rate_consumption.objects.filter(bom_id__in=bom_ids[start: start + 500]).delete()
+
+    rate_consumption.objects.bulk_create([
+        rate_consumption(bom_id=calc_object.bom_id, table=table, key=key)
+        for calc_object in calc_objects for table, key in sorted(calc_object._consumed or ())
+    ])
+
+
+def changed_inputs(instance) -> bool:
+    """ Whether a saved row differs from its loaded values in any field the calculation reads. """
+    loaded = getattr(instance, '_loaded_values', None)
+    names = INPUT_FIELDS[instance._meta.object_name]
+
+    if loaded is None or names is None:
+        return True
+
+    for name in names:
+        attname = instance._meta.get_field(name).attname
+
+        if attname not in loaded or attname not in instance.__dict__ or loaded[attname] != instance.__dict__[attname]:
+            return True
+
+    return False
+
+
+def mark_inputs(instance, previous=True) -> int:
+    """ Flag the parts reading a row; previous: the row may have been stored with other values. """
+    model_name = instance._meta.object_name
+
+    if INPUT_FIELDS[model_name] is None:
+        loaded = getattr(instance, '_loaded_values', None)
+
+        # stored values unknown, any part may have matched them
+        if previous and loaded is None:
+            return mark_dirty()
+
+        keys = row_keys(instance, instance.__dict__) | (row_keys(instance, loaded) if previous else set())
+        return mark_dirty(consumers(type(instance), keys))
+
+    lookup, attribute = PART_LOOKUPS[model_name]
+    return mark_dirty(_calculations().filter(**{lookup: getattr(instance, attribute)}))
+
+
+def input_saved(sender, instance, created=False, raw=False, **kwargs):
+    """ post_save receiver of input models, flags parts when a field they read has changed. """
+    if raw:
+        return
+
+    if created or changed_inputs(instance):
+        mark_inputs(instance, previous=not created)
+
+    # later saves of the same instance compare against this one
+    instance._loaded_values = {field.attname: instance.__dict__.get(field.attname)
+                               for field in instance._meta.concrete_fields if field.attname in instance.__dict__}
+
+
+def input_deleted(sender, instance, **kwargs):
+    """ post_delete receiver of input models. """
+    mark_inputs(instance, previous=False)
@@ -1,11 +1,14 @@
 import os
 import csv
+from itertools import islice
 import pandas as pd
 from django.db import IntegrityError
 from django.shortcuts import Http404
 from django.core.exceptions import ValidationError
 
 from . import models
+from .resolvers import SupplierDirectory, TecMatcher
+from .sheets import SheetSchema
 
 # Persistence directory
 PERSISTENCE_DIR = os.path.join(
@@ -48,6 +51,9 @@ class InitializeData:
                 # print(index)
                 index += 1
 
+        # drop cached tec names
+        TecMatcher.invalidate()
+
         # return loaded row number
         return index
 
@@ -636,6 +642,9 @@ class InitializeData:
 
                 index += 1
 
+        # drop the cached supplier directory
+        SupplierDirectory.invalidate()
+
         return index
 
     @staticmethod
@@ -772,90 +781,65 @@ class InitializeData:
         return index
 
 
+# tcs header
+TCS_HEADER = [
+    {'r_offset': 0, 'ex_header': 'P/N', 'in_header': 'part_number', 'skip': True},
+    {'r_offset': 0, 'ex_header': 'DUNS', 'in_header': 'duns'},
+    {'r_offset': 0, 'ex_header': 'Bidderlist No.', 'in_header': 'bidder_list_number'},
+    {'r_offset': 0, 'ex_header': 'Program', 'in_header': 'program'},
+    {'r_offset': 0, 'ex_header': 'Supplier Address', 'in_header': 'supplier_ship_from_address'},
+    {'r_offset': 0, 'ex_header': 'Process', 'in_header': 'process'},
+    {'r_offset': 0, 'ex_header': 'Suggest Delivery Method', 'in_header': 'suggest_delivery_method'},
+    {'r_offset': 0, 'ex_header': 'SGM\'s Transport Duty', 'in_header': 'sgm_transport_duty',
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'Supplier\'s Transport Duty', 'in_header': 'supplier_transport_duty',
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'SGM\'s Returnable Package Duty', 'in_header': 'sgm_returnable_duty',
+     'match_display': True},
+    {'r_offset': 0, 'ex_header': 'Supplier\'s Returnable Package Duty',
+     'in_header': 'supplier_returnable_duty', 'match_display': True},
+    {'r_offset': -1, 'ex_header': '外协加工业务模式\nConsignment Mode', 'in_header': 'consignment_mode',
+     'match_display': True},
+
+    {'r_offset': 0, 'ex_header': 'Container Name', 'in_header': 'supplier_pkg_name'},
+    {'r_offset': 0, 'ex_header': 'Quantity', 'in_header': 'supplier_pkg_pcs'},
+    {'r_offset': 0, 'ex_header': 'Length', 'in_header': 'supplier_pkg_length'},
+    {'r_offset': 0, 'ex_header': 'Height', 'in_header': 'supplier_pkg_height'},
+    {'r_offset': 0, 'ex_header': 'Width', 'in_header': 'supplier_pkg_width'},
+
+    {'r_offset': 0, 'ex_header': 'GM_PKG_CONTAINER_NAME', 'in_header': 'sgm_pkg_name'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_QTY', 'in_header': 'sgm_pkg_pcs'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_LENGTH', 'in_header': 'sgm_pkg_length'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_WIDTH', 'in_header': 'sgm_pkg_width'},
+    {'r_offset': 0, 'ex_header': 'GM_PKG_HEIGHT', 'in_header': 'sgm_pkg_height'},
+]
+
+# buyer header
+BUYER_HEADER = [
+    {'r_offset': 0, 'ex_header': '零件号', 'in_header': 'bom:part_number', 'skip': True},
+    {'r_offset': 0, 'ex_header': '采购员', 'in_header': 'buyer'},
+    {'r_offset': 0, 'ex_header': '运输模式', 'in_header': 'contract_incoterm'},
+    {'r_offset': 0, 'ex_header': '运输费用', 'in_header': 'contract_supplier_transportation_cost'},
+    {'r_offset': 0, 'ex_header': '外包装费用', 'in_header': 'contract_supplier_pkg_cost'},
+    {'r_offset': 0, 'ex_header': '排序费用', 'in_header': 'contract_supplier_seq_cost'},
+]
+
+# compiled once, shared by every parse
+TCS_SCHEMA = SheetSchema(TCS_HEADER, 'UnsortedInboundTCS')
+BUYER_SCHEMA = SheetSchema(BUYER_HEADER, 'InboundBuyer')
+
+
 class ParseArray:
     """ Parse two-dimensional array of excel. """
 
     @staticmethod
     def parse_tcs(matrix: list):
         """ Parse TCS data. """
-        # tcs header
-        TCS_HEADER = [
-            {'r_offset': 0, 'ex_header': 'P/N', 'in_header': 'part_number'},
-            {'r_offset': 0, 'ex_header': 'DUNS', 'in_header': 'duns'},
-            {'r_offset': 0, 'ex_header': 'Bidderlist No.', 'in_header': 'bidder_list_number'},
-            {'r_offset': 0, 'ex_header': 'Program', 'in_header': 'program'},
-            {'r_offset': 0, 'ex_header': 'Supplier Address', 'in_header': 'supplier_ship_from_address'},
-            {'r_offset': 0, 'ex_header': 'Process', 'in_header': 'process', 'match_display': True},
-            {'r_offset': 0, 'ex_header': 'Suggest Delivery Method', 'in_header': 'suggest_delivery_method',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'SGM\'s Transport Duty', 'in_header': 'sgm_transport_duty',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'Supplier\'s Transport Duty', 'in_header': 'supplier_transport_duty',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'SGM\'s Returnable Package Duty', 'in_header': 'sgm_returnable_duty',
-             'match_display': True},
-            {'r_offset': 0, 'ex_header': 'Supplier\'s Returnable Package Duty',
-             'in_header': 'supplier_returnable_duty', 'match_display': True},
-            {'r_offset': -1, 'ex_header': '外协加工业务模式\nConsignment Mode', 'in_header': 'consignment_mode',
-             'match_display': True},
-
-            {'r_offset': 0, 'ex_header': 'Container Name', 'in_header': 'supplier_pkg_name'},
-            {'r_offset': 0, 'ex_header': 'Quantity', 'in_header': 'supplier_pkg_pcs'},
-            {'r_offset': 0, 'ex_header': 'Length', 'in_header': 'supplier_pkg_length'},
-            {'r_offset': 0, 'ex_header': 'Height', 'in_header': 'supplier_pkg_height'},
-            {'r_offset': 0, 'ex_header': 'Width', 'in_header': 'supplier_pkg_width'},
-
-            {'r_offset': 0, 'ex_header': 'GM_PKG_CONTAINER_NAME', 'in_header': 'sgm_pkg_name'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_QTY', 'in_header': 'sgm_pkg_pcs'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_LENGTH', 'in_header': 'sgm_pkg_length'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_WIDTH', 'in_header': 'sgm_pkg_width'},
-            {'r_offset': 0, 'ex_header': 'GM_PKG_HEIGHT', 'in_header': 'sgm_pkg_height'},
-        ]
-
-        for i in range(len(TCS_HEADER)):
-            TCS_HEADER[i]['ex_header'] = TCS_HEADER[i]['ex_header'].upper()  # upper-case
-
-        # cursor
-        for i in range(len(matrix)):
-            all_header_found = True
-
-            # all header field found
-            for dict_obj in TCS_HEADER:
-                if 'col' not in dict_obj:
-                    all_header_found = False
-                    break
-
-            if all_header_found:
-                break
-
-            row = matrix[i]
-
-            for j in range(len(row)):
-                cell = str(row[j])
-
-                for k in range(len(TCS_HEADER)):
-                    if cell.strip().upper() == TCS_HEADER[k]['ex_header']:
-                        TCS_HEADER[k]['col'] = j
-                        TCS_HEADER[k]['row'] = i
-
-        # check header row
-        data_row = None
-
-        for dict_obj in TCS_HEADER:
-            if 'col' not in dict_obj or 'row' not in dict_obj:
-                raise Http404(f'数据列{dict_obj["ex_header"]}没有找到')
-            else:
-                if data_row is not None:
-                    if dict_obj['row'] - dict_obj['r_offset'] != data_row:
-                        raise Http404('Excel 格式不正确.')
-                else:
-                    data_row = dict_obj['row'] + dict_obj['r_offset']
-
-        # start parsing row
-        start_row = data_row + 1
+        layout = TCS_SCHEMA.locate(matrix)
+        part_col = layout.column('part_number')
 
-        for row in matrix[start_row:]:
-            lookup_value = row[TCS_HEADER[0]['col']]
+        for row in islice(matrix, layout.start_row, None):
+            lookup_value = row[part_col]
 
             # if no actual value
             if lookup_value == '':
@@ -864,24 +848,9 @@ class ParseArray:
             # always create new tcs & package objects
             try:
                 unsorted_tcs_object = models.UnsortedInboundTCS(part_number=lookup_value)
-                params = dict()
-
-                for dict_obj in TCS_HEADER[1:]:
-                    if 'match_display' in dict_obj:
-                        choice = getattr(unsorted_tcs_object, dict_obj['in_header'] + '_choice')
-
-                        for int_val, str_val in choice:
-                            if row[dict_obj['col']].strip().upper() == str_val.upper():
-                                params[dict_obj['in_header']] = int_val
-                                break
-
-                    else:
-                        params[dict_obj['in_header']] = row[dict_obj['col']]
 
-                for attribute in params:
-                    if params[attribute] == '':
-                        params[attribute] = None
-                    setattr(unsorted_tcs_object, attribute, params[attribute])
+                for attribute, value in layout.fields(row)['unsortedinboundtcs'].items():
+                    setattr(unsorted_tcs_object, attribute, value)
 
                 unsorted_tcs_object.save()
 
@@ -891,60 +860,11 @@ class ParseArray:
     @staticmethod
     def parse_buyer(matrix: list):
         """ Parse TCS data. """
-        # buyer header
-        BUYER_HEADER = [
-            {'r_offset': 0, 'ex_header': '零件号', 'in_header': 'bom:part_number'},
-            {'r_offset': 0, 'ex_header': '采购员', 'in_header': 'buyer'},
-            {'r_offset': 0, 'ex_header': '运输模式', 'in_header': 'contract_incoterm'},
-            {'r_offset': 0, 'ex_header': '运输费用', 'in_header': 'contract_supplier_transportation_cost'},
-            {'r_offset': 0, 'ex_header': '外包装费用', 'in_header': 'contract_supplier_pkg_cost'},
-            {'r_offset': 0, 'ex_header': '排序费用', 'in_header': 'contract_supplier_seq_cost'},
-        ]
-
-        for i in range(len(BUYER_HEADER)):
-            BUYER_HEADER[i]['ex_header'] = BUYER_HEADER[i]['ex_header'].upper()  # upper-case
-
-        # cursor
-        for i in range(len(matrix)):
-            all_header_found = True
-
-            # all header field found
-            for dict_obj in BUYER_HEADER:
-                if 'col' not in dict_obj:
-                    all_header_found = False
-                    break
-
-            if all_header_found:
-                break
-
-            row = matrix[i]
-
-            for j in range(len(row)):
-                cell = str(row[j])
-
-                for k in range(len(BUYER_HEADER)):
-                    if cell.strip().upper() == BUYER_HEADER[k]['ex_header']:
-                        BUYER_HEADER[k]['col'] = j
-                        BUYER_HEADER[k]['row'] = i
-
-        # check header row
-        data_row = None
-
-        for dict_obj in BUYER_HEADER:
-            if 'col' not in dict_obj or 'row' not in dict_obj:
-                raise Http404(f'数据列{dict_obj["ex_header"]}没有找到')
-            else:
-                if data_row is not None:
-                    if dict_obj['row'] - dict_obj['r_offset'] != data_row:
-                        raise Http404('Excel 格式不正确.')
-                else:
-                    data_row = dict_obj['row'] + dict_obj['r_offset']
+        layout = BUYER_SCHEMA.locate(matrix)
+        part_col = layout.column('bom:part_number')
 
-        # start parsing row
-        start_row = data_row + 1
-
-        for row in matrix[start_row:]:
-            lookup_value = row[BUYER_HEADER[0]['col']]
+        for row in islice(matrix, layout.start_row, None):
+            lookup_value = row[part_col]
 
             # if no actual value
             if lookup_value == '':
@@ -958,25 +878,11 @@ class ParseArray:
                 pass
 
             else:
-                for buyer_object in buyer_objects:
-                    params = dict()
+                params = layout.fields(row)['inboundbuyer']
 
-                    for dict_obj in BUYER_HEADER[1:]:
-                        if 'match_display' in dict_obj:
-                            choice = getattr(buyer_object, dict_obj['in_header'] + '_choice')
-
-                            for int_val, str_val in choice:
-                                if row[dict_obj['col']].strip().upper() == str_val.upper():
-                                    params[dict_obj['in_header']] = int_val
-                                    break
-
-                        else:
-                            params[dict_obj['in_header']] = row[dict_obj['col']]
-
-                    for attribute in params:
-                        if params[attribute] == '':
-                            params[attribute] = None
-                        setattr(buyer_object, attribute, params[attribute])
+                for buyer_object in buyer_objects:
+                    for attribute, value in params.items():
+                        setattr(buyer_object, attribute, value)
 
                     buyer_object.save()
 
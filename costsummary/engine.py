@@ -0,0 +1,104 @@
+from django.db import models as db_models
+from django.db import transaction
+
+from . import models
+from .bulk import bulk_update
+from .dependencies import record_consumption
+from .metrics import timed
+from .snapshot import RateSnapshot
+from .wide import refresh_wide
+
+# satellites read by InboundCalculation.calculate()
+SATELLITE_RELATIONS = (
+    'bom',
+    'bom__label',
+    'bom__rel_mode',
+    'bom__rel_package',
+    'bom__rel_address',
+    'bom__rel_buyer',
+)
+
+# pcs & veh fields
+CALCULATED_FIELDS = [
+    field.name for field in models.InboundCalculation._meta.concrete_fields
+    if isinstance(field, db_models.FloatField)
+]
+
+
+class BatchCostEngine:
+    """ Recalculate InboundCalculation of many parts with set-based reads & writes. """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def calculations(target):
+        """ InboundCalculation queryset of a label id, a NominalLabelMapping, an Ebom or InboundCalculation queryset. """
+        if isinstance(target, models.NominalLabelMapping):
+            return models.InboundCalculation.objects.filter(bom__label=target)
+
+        if isinstance(target, int):
+            return models.InboundCalculation.objects.filter(bom__label_id=target)
+
+        if target.model is models.Ebom:
+            return models.InboundCalculation.objects.filter(bom__in=target)
+
+        if target.model is models.InboundCalculation:
+            return target
+
+        raise TypeError('Can not recalculate %r' % target)
+
+    @timed(rows=int)
+    def recalculate(self, target) -> int:
+        """ Same results as InboundCalculation.save() on every part, returns number of parts updated.
+
+        Dirty flags of a batch are cleared before its inputs are read, so a change
+        made meanwhile flags the part again instead of being lost. For the same
+        reason every batch checks the shared RateSnapshot against the last
+        invalidation once its flags are cleared; the snapshot of the run is only
+        rebuilt when a rate changed meanwhile.
+        """
+        calc_ids = list(self.calculations(target).order_by('id').values_list('id', flat=True))
+
+        rates = None
+
+        with transaction.atomic():
+            for start in range(0, len(calc_ids), self.batch_size):
+                batch_ids = calc_ids[start: start + self.batch_size]
+                models.InboundCalculation.objects.filter(id__in=batch_ids, dirty=True).update(dirty=False)
+
+                if rates is None or rates.token != RateSnapshot.shared_token():
+                    rates = RateSnapshot.current()
+
+                batch = list(
+                    models.InboundCalculation.objects.filter(
+                        id__in=batch_ids
+                    ).select_related(*SATELLITE_RELATIONS).order_by('id')
+                )
+
+                for calc_object in batch:
+                    calc_object._preloaded = True
+                    calc_object._rates = rates
+                    calc_object.calculate()
+                    calc_object.consumption_recorded = True
+
+                bulk_update(batch, CALCULATED_FIELDS + ['consumption_recorded'])
+                record_consumption(batch)
+                refresh_wide(calc_object.bom_id for calc_object in batch)
+
+        return len(calc_ids)
+
+    def recalculate_dirty(self, target=None) -> int:
+        """ Recalculate flagged parts, of target if given, one batch at a time until none is left. """
+        calculations = models.InboundCalculation.objects.all() if target is None else self.calculations(target)
+        count = 0
+
+        while True:
+            calc_ids = list(
+                calculations.filter(dirty=True).order_by('id').values_list('id', flat=True)[: self.batch_size]
+            )
+
+            if not calc_ids:
+                return count
+
+            count += self.recalculate(models.InboundCalculation.objects.filter(id__in=calc_ids))
@@ -0,0 +1,177 @@
+import json
+import logging
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import models
+from .engine import BatchCostEngine
+from .metrics import REGISTRY, timer, worker_name
+from .sheets import SheetReader
+
+logger = logging.getLogger(__name__)
+
+# job kind: handler(progress, **payload)
+HANDLERS = dict()
+
+# seconds between two progress writes of a job
+PROGRESS_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """ Raised in a running handler once cancellation of its job is requested. """
+
+
+def handler(kind):
+    """ Register a function as the handler of a job kind. """
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+
+    return register
+
+
+class Progress:
+    """ Progress of a running job, written to its row at most once per PROGRESS_INTERVAL.
+
+    Every write also looks at the cancel flag and raises JobCancelled when set.
+    """
+
+    def __init__(self, job: models.BackgroundJob):
+        self.job_id = job.pk
+        self.written = 0.0
+
+    def stage(self, name: str, total: int = None):
+        """ Start a new stage of the job. """
+        self.write(stage=name, progress_done=0, progress_total=total)
+
+    def __call__(self, done: int, total: int = None):
+        """ Rows done so far in the current stage. """
+        if time.monotonic() - self.written >= PROGRESS_INTERVAL:
+            fields = {'progress_done': done}
+
+            if total is not None:
+                fields['progress_total'] = total
+
+            self.write(**fields)
+
+    def write(self, **fields):
+        jobs = models.BackgroundJob.objects.filter(pk=self.job_id)
+        jobs.update(**fields)
+        self.written = time.monotonic()
+
+        if jobs.filter(cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+def enqueue(kind: str, **payload) -> models.BackgroundJob:
+    """ Queue a job; with the JOBS_INLINE setting it is run before returning. """
+    if kind not in HANDLERS:
+        raise ValueError('Unknown job kind %s' % kind)
+
+    job = models.BackgroundJob.objects.create(kind=kind, payload=json.dumps(payload))
+
+    if getattr(settings, 'JOBS_INLINE', False) and claim(job.pk):
+        run(job.pk)
+
+    return models.BackgroundJob.objects.get(pk=job.pk)
+
+
+def claim(job_id=None, worker: str = None):
+    """ Mark a queued job as running, the oldest one when not given; return it, or None. """
+    queued = models.BackgroundJob.objects.filter(status=models.BackgroundJob.QUEUED)
+    candidates = [job_id] if job_id is not None else queued.order_by('pk').values_list('pk', flat=True)[:10]
+
+    for pk in candidates:
+        # only one worker wins the update
+        if queued.filter(pk=pk).update(status=models.BackgroundJob.RUNNING, worker=worker or worker_name(),
+                                       started=timezone.now()):
+            return models.BackgroundJob.objects.get(pk=pk)
+
+    return None
+
+
+def run(job_id) -> models.BackgroundJob:
+    """ Run a claimed job & record how it ended. """
+    job = models.BackgroundJob.objects.get(pk=job_id)
+    fields = {'status': models.BackgroundJob.DONE, 'message': None}
+
+    try:
+        with timer('job %s' % job.kind):
+            result = HANDLERS[job.kind](Progress(job), **json.loads(job.payload))
+
+        if result is not None:
+            fields['message'] = str(result)
+
+    except JobCancelled:
+        fields = {'status': models.BackgroundJob.CANCELLED, 'message': '已取消, 已保存的行保留'}
+
+    except Exception:
+        logger.exception('Job %s failed', job)
+        fields = {'status': models.BackgroundJob.FAILED, 'message': traceback.format_exc()}
+
+    models.BackgroundJob.objects.filter(pk=job.pk).update(finished=timezone.now(), **fields)
+
+    # workers serve no requests, their metrics are written after every job
+    REGISTRY.flush(force=True)
+
+    return models.BackgroundJob.objects.get(pk=job.pk)
+
+
+def cancel(job_id) -> bool:
+    """ Cancel a queued job at once, or ask a running one to stop. """
+    jobs = models.BackgroundJob.objects.filter(pk=job_id)
+
+    if jobs.filter(status=models.BackgroundJob.QUEUED).update(
+            status=models.BackgroundJob.CANCELLED, cancel_requested=True, finished=timezone.now()):
+        return True
+
+    return bool(jobs.filter(status=models.BackgroundJob.RUNNING).update(cancel_requested=True))
+
+
+def refresh_statistics(progress: Progress, ebom_ids=None, labels=None):
+    """ Rebuild the statistic tables, the configure level only for given parts or labels. """
+    from . import statistic
+
+    steps = [
+        ('conf_calculation', lambda: statistic.conf_calculation(ebom_ids=ebom_ids, labels=labels)),
+        ('rollup_statistics', statistic.rollup_statistics),
+        ('future_model_table', statistic.future_model_table),
+        ('summary_model_calculate', statistic.summary_model_calculate),
+    ]
+
+    for index, (name, step) in enumerate(steps):
+        progress.write(stage=name, progress_done=index, progress_total=len(steps))
+        step()
+
+
+@handler('upload')
+def run_upload(progress: Progress, model_name: int, path: str, label_id=None, veh_pt=None):
+    """ Parse an uploaded sheet, then refresh statistics. """
+    from django.contrib import admin
+
+    # rows are streamed from the file by every pass of the parser
+    progress.stage('read')
+    matrix = SheetReader(path)
+
+    progress.stage('parse', matrix.row_total())
+    label = models.NominalLabelMapping.objects.get(pk=label_id) if label_id is not None else None
+    model_admin = admin.site._registry[models.UploadHandler]
+    touched_ids = model_admin.process_upload(model_name, matrix, label=label, veh_pt=veh_pt, progress=progress)
+
+    # parts flagged by this upload or by earlier edits, their statistics move too
+    progress.stage('recalculate')
+    dirty_ids = set(models.InboundCalculation.objects.filter(dirty=True).values_list('bom_id', flat=True))
+    BatchCostEngine().recalculate_dirty()
+
+    refresh_statistics(progress, ebom_ids=None if touched_ids is None else set(touched_ids) | dirty_ids)
+
+    return '%d 行' % len(matrix)
+
+
+@handler('statistic')
+def run_statistic(progress: Progress, ebom_ids=None, labels=None):
+    """ Refresh statistics. """
+    refresh_statistics(progress, ebom_ids=ebom_ids, labels=labels)
@@ -0,0 +1,565 @@
+from bisect import insort
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from . import models
+from .bulk import bulk_update
+from .resolvers import EbomCounts, SupplierDirectory, TecMatcher, plant_base
+from .snapshot import RateSnapshot
+from .wide import refresh_wide
+
+# Ebom fields filled from ta_ebom, which together identify an existing part
+EBOM_KEY_FIELDS = (
+    'upc', 'fna', 'part_number', 'description_en', 'description_cn', 'header_part_number',
+    'ar_em_material_indicator', 'work_shop', 'vendor_duns_number', 'supplier_name',
+    'ewo_number', 'model_and_option', 'vpps',
+)
+
+# one-to-one satellites created for every loaded part
+SATELLITE_MODELS = (
+    models.InboundTCS,
+    models.InboundBuyer,
+    models.InboundAddress,
+    models.InboundTCSPackage,
+    models.InboundHeaderPart,
+    models.InboundOperationalMode,
+    models.InboundMode,
+    models.InboundOperationalPackage,
+    models.InboundPackage,
+    models.InboundCalculation,
+)
+
+# sqlite allows 999 variables per statement
+CHUNK_SIZE = 500
+
+# satellites of a wide table row, in the order parse_wide saved them
+WIDE_SATELLITE_MODELS = (
+    models.InboundMode,
+    models.InboundOperationalPackage,
+    models.InboundAddress,
+    models.InboundPackage,
+    models.InboundOperationalMode,
+    models.InboundTCS,
+    models.InboundHeaderPart,
+    models.InboundBuyer,
+    models.InboundTCSPackage,
+    models.InboundCalculation,
+)
+
+# orders parts created by an upload after all existing ones, before they have ids
+NEW_PART = 10 ** 15
+
+# Ebom fields a wide table upload tells its new parts apart by, besides the label
+WIDE_KEY_FIELDS = ('veh_pt', 'part_number', 'header_part_number', 'upc', 'fna')
+
+
+class LoadError(Exception):
+    """ Rows written by a loader can not be told apart from rows written meanwhile by another process. """
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+
+    for start in range(0, len(values), size):
+        yield values[start: start + size]
+
+
+def _prep(model, name, value):
+    """ Value as the ORM stores it, e.g. True -> 'True' for a CharField. """
+    return None if value is None else model._meta.get_field(name).get_prep_value(value)
+
+
+def latest_unsorted_tcs(keys) -> dict:
+    """ Latest UnsortedInboundTCS of each (part_number, duns). """
+    matched = dict()
+    part_numbers = {part_number for part_number, _ in keys}
+
+    for chunk in _chunks(part_numbers):
+        for tcs_object in models.UnsortedInboundTCS.objects.filter(part_number__in=chunk).order_by('id'):
+            matched[(tcs_object.part_number, tcs_object.duns)] = tcs_object
+
+    return matched
+
+
+def first_unsorted_buyer(keys) -> dict:
+    """ First UnsortedInboundBuyer of each (part_number, duns). """
+    matched = dict()
+    part_numbers = {part_number for part_number, _ in keys}
+
+    for chunk in _chunks(part_numbers):
+        for buyer_object in models.UnsortedInboundBuyer.objects.filter(part_number__in=chunk).order_by('id'):
+            matched.setdefault((buyer_object.part_number, buyer_object.duns), buyer_object)
+
+    return matched
+
+
+def unique_suppliers(duns_numbers) -> dict:
+    """ Supplier of each duns number owned by exactly one supplier. """
+    matched = dict()
+
+    for chunk in _chunks(set(duns_numbers)):
+        unique_duns = models.Supplier.objects.filter(duns__in=chunk).values('duns').annotate(
+            supplier_count=Count('id')).filter(supplier_count=1).values_list('duns', flat=True)
+
+        for supplier_object in models.Supplier.objects.filter(duns__in=list(unique_duns)):
+            matched[supplier_object.duns] = supplier_object
+
+    return matched
+
+
+def replace_configures(configures: dict, batch_size=CHUNK_SIZE) -> int:
+    """ Store {ebom id: {conf name: value}}, replacing all configure values of those parts; returns rows stored. """
+    values = [
+        models.ConfigureValue(bom_id=bom_id, conf_name=conf_name, value=str(value))
+        for bom_id, conf_values in configures.items() for conf_name, value in conf_values.items()
+        if value is not None
+    ]
+
+    with transaction.atomic():
+        for chunk in _chunks(configures):
+            models.ConfigureValue.objects.filter(bom_id__in=chunk).delete()
+
+        models.ConfigureValue.objects.bulk_create(values, batch_size=batch_size)
+
+    return len(values)
+
+
+def _written_fields(model) -> list:
+    """ Fields save() writes, but the primary key & the part. """
+    return [field.name for field in model._meta.concrete_fields if not field.primary_key and field.name != 'bom']
+
+
+class ChunkLookups:
+    """ Rows the satellites' derive() looks up, read once for a chunk of parts.
+
+    Answers like models.DatabaseLookups, which save() reads one part at a time.
+    """
+
+    def __init__(self, tcs, buyers, suppliers, assembly_suppliers, rates):
+        self.latest_tcs = tcs
+        self.first_buyers = buyers
+        self.suppliers = suppliers
+        self.supplier_names = assembly_suppliers
+        self.rates = rates
+
+    def tcs(self, ebom_object):
+        return self.latest_tcs.get(WideTableLoader.part_key(ebom_object))
+
+    def buyer(self, ebom_object):
+        return self.first_buyers.get(WideTableLoader.part_key(ebom_object))
+
+    def assembly_suppliers(self, part_number, label_id) -> list:
+        return self.supplier_names.get((_prep(models.Ebom, 'part_number', part_number), label_id), [])
+
+
+class EbomBulkLoader:
+    """ Create Ebom rows and their satellites with keyed reads & bulk inserts. """
+
+    def __init__(self, batch_size=CHUNK_SIZE):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def fetch_ta_ebom(entry_object) -> list:
+        """ Raw ebom rows of an AEbomEntry. """
+        label = entry_object.label
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT UPC, FNA,
+                  COMPONENT_MATERIAL_NUMBER, COMPONENT_MATERIAL_DESC_E, COMPONENT_MATERIAL_DESC_C,
+                  HEADER_PART_NUMBER, AR_EM_MATERIAL_FLAG,
+                  WORKSHOP, DUNS_NUMBER, VENDOR_NAME, EWO_NUMBER, MODEL_OPTION, VPPS,
+                  PACKAGE, ORDER_SAMPLE, USAGE_QTY
+                  FROM ta_ebom
+                  WHERE MODEL_YEAR = %s AND BOOK = %s AND PLANT_CODE = %s AND MODEL = %s
+            """, [entry_object.model_year, label.book, label.plant_code, label.model])
+
+            return cursor.fetchall()
+
+    @staticmethod
+    def existing_keys(label) -> dict:
+        """ Id of the first Ebom of each key within a label. """
+        keys = dict()
+
+        for row in models.Ebom.objects.filter(label=label).order_by('id').values_list('id', *EBOM_KEY_FIELDS):
+            keys.setdefault(tuple(row[1:]), row[0])
+
+        return keys
+
+    def load_entry(self, entry_object) -> int:
+        """ Load all ta_ebom rows of an entry, returns the number of new parts. """
+        label = entry_object.label
+        rows = self.fetch_ta_ebom(entry_object)
+
+        with transaction.atomic():
+            keys = self.existing_keys(label)
+            new_eboms = dict()
+            row_keys = []
+
+            for row in rows:
+                if row[6] == 'AR':
+                    _ar_em = True
+                elif row[6] == 'EM':
+                    _ar_em = False
+                else:
+                    _ar_em = None
+
+                values = dict(zip(EBOM_KEY_FIELDS, row[0: 6] + (_ar_em, ) + row[7: 13]))
+                key = tuple(_prep(models.Ebom, name, values[name]) for name in EBOM_KEY_FIELDS)
+                row_keys.append(key)
+
+                if key not in keys and key not in new_eboms:
+                    new_eboms[key] = models.Ebom(label=label, **dict(zip(EBOM_KEY_FIELDS, key)))
+
+            # derived fields of new parts, resolved for the whole batch
+            tec_ids = TecMatcher.current().match_many(ebom_object.description_en for ebom_object in new_eboms.values())
+
+            for ebom_object in new_eboms.values():
+                if ebom_object.vendor_duns_number:
+                    ebom_object.duns = ebom_object.vendor_duns_number
+
+                if ebom_object.description_en:
+                    ebom_object.tec_id = tec_ids[ebom_object.description_en]
+
+            models.Ebom.objects.bulk_create(new_eboms.values(), batch_size=self.batch_size)
+
+            # bulk_create does not return sqlite ids, read keys again
+            if new_eboms:
+                keys = self.existing_keys(label)
+                EbomCounts.invalidate()
+
+            models.EbomConfiguration.objects.bulk_create([
+                models.EbomConfiguration(bom_id=keys[key], package=row[13], order_sample=row[14], quantity=row[15])
+                for key, row in zip(row_keys, rows)
+            ], batch_size=self.batch_size)
+
+            bom_ids = {keys[key] for key in row_keys}
+            self.create_satellites(bom_ids)
+
+        return len(new_eboms)
+
+    def create_satellites(self, bom_ids):
+        """ Create missing satellites of given parts, with the fields their save() would derive. """
+        eboms = []
+
+        for chunk in _chunks(bom_ids):
+            eboms.extend(models.Ebom.objects.filter(id__in=chunk).select_related('label'))
+
+        # satellites which already exist
+        existing = {model: set() for model in SATELLITE_MODELS}
+
+        for model in SATELLITE_MODELS:
+            for chunk in _chunks(bom_ids):
+                existing[model].update(model.objects.filter(bom_id__in=chunk).values_list('bom_id', flat=True))
+
+        part_keys = {(ebom_object.part_number, ebom_object.duns) for ebom_object in eboms if ebom_object.duns is not None}
+        tcs = latest_unsorted_tcs(part_keys)
+        buyers = first_unsorted_buyer(part_keys)
+        suppliers = unique_suppliers(ebom_object.duns for ebom_object in eboms if ebom_object.duns)
+        directory = SupplierDirectory.current()
+
+        # supplier names of each (label, part number), for assembly suppliers of header parts
+        label_ids = {ebom_object.label_id for ebom_object in eboms}
+        assembly_suppliers = dict()
+
+        for part_number, label_id, supplier_name in models.Ebom.objects.filter(
+                label_id__in=label_ids).order_by('id').values_list('part_number', 'label_id', 'supplier_name'):
+            if supplier_name:
+                assembly_suppliers.setdefault((part_number, label_id), []).append(f'{supplier_name}')
+
+        calc_fields = [field.name for field in models.InboundCalculation._meta.concrete_fields
+                       if field.name not in ('id', 'bom')]
+        context = ChunkLookups(tcs, buyers, directory, assembly_suppliers, RateSnapshot.current())
+        new_objects = {model: [] for model in SATELLITE_MODELS}
+
+        for ebom_object in eboms:
+            for model in (models.InboundTCS, models.InboundBuyer):
+                if ebom_object.id not in existing[model]:
+                    related_object = model(bom=ebom_object)
+                    related_object.derive(context)
+                    new_objects[model].append(related_object)
+
+            if ebom_object.id not in existing[models.InboundAddress]:
+                address_object = models.InboundAddress(bom=ebom_object)
+                supplier_object = suppliers.get(ebom_object.duns) if ebom_object.duns else None
+
+                if supplier_object:
+                    address_object.supplier_matched = supplier_object
+
+                    if supplier_object.region and supplier_object.region[0: 2] in [
+                        '江浙', '华中', '华北', '东北', '华南', '西南', '华中', '西北', '华东', '中国',
+                    ]:
+                        address_object.country = '中国'
+
+                    address_object.region_division = supplier_object.region
+                    address_object.province = supplier_object.province
+                    address_object.city = supplier_object.district
+                    address_object.mfg_location = supplier_object.address
+
+                    if ebom_object.label is not None and ebom_object.label.plant_code:
+                        plant_distance = directory.distance(supplier_object.id, plant_base(ebom_object.label.plant_code))
+                        address_object.distance_to_sgm_plant = plant_distance.distance if plant_distance else None
+
+                    jq_distance = directory.distance(supplier_object.id, 0)
+                    address_object.distance_to_shanghai_cc = jq_distance.distance if jq_distance else None
+
+                new_objects[models.InboundAddress].append(address_object)
+
+            for model in (models.InboundTCSPackage, models.InboundHeaderPart):
+                if ebom_object.id not in existing[model]:
+                    related_object = model(bom=ebom_object)
+                    related_object.derive(context)
+                    new_objects[model].append(related_object)
+
+            for model in (models.InboundOperationalMode, models.InboundMode,
+                          models.InboundOperationalPackage, models.InboundPackage):
+                if ebom_object.id not in existing[model]:
+                    new_objects[model].append(model(bom=ebom_object))
+
+            # nothing to cost before mode & package are uploaded, zero-filled like save()
+            if ebom_object.id not in existing[models.InboundCalculation]:
+                new_objects[models.InboundCalculation].append(
+                    models.InboundCalculation(bom=ebom_object, **{name: 0 for name in calc_fields}))
+
+        for model, objects in new_objects.items():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+        refresh_wide(bom_ids)
+
+
+class WideTableLoader:
+    """ Upsert the parts of a wide table upload & their satellites, a chunk of rows at a time.
+
+    Rows are matched against the Ebom keys of the label, read once, the way
+    parse_wide matched them: (part number, header part number, upc, fna), or
+    without the header part number when the row has none. Each chunk is written
+    by bulk inserts & updates in one transaction, with the fields the models'
+    save() would derive. Calculations are flagged dirty instead of being costed,
+    for BatchCostEngine.recalculate_dirty() to pick up.
+    """
+
+    def __init__(self, label, veh_pt, batch_size=CHUNK_SIZE):
+        self.label = label
+        self.veh_pt = veh_pt
+        self.batch_size = batch_size
+
+        # key -> parts in id order, parts created here are numbered from NEW_PART
+        self.full_keys = defaultdict(list)
+        self.partial_keys = defaultdict(list)
+        self.part_keys = dict()
+        self.ids = dict()
+        self.created = 0
+
+        for row in models.Ebom.objects.filter(label=label, veh_pt=veh_pt).order_by('id').values_list(
+                'id', 'part_number', 'header_part_number', 'upc', 'fna'):
+            self.index(row[0], tuple(row[1:]))
+
+    @staticmethod
+    def key(part_number, header_part_number, upc, fna) -> tuple:
+        """ Match key of a part, as the ORM compares it. """
+        return (_prep(models.Ebom, 'part_number', part_number),
+                _prep(models.Ebom, 'header_part_number', header_part_number),
+                _prep(models.Ebom, 'upc', upc),
+                _prep(models.Ebom, 'fna', fna))
+
+    def index(self, part, key):
+        """ File a part under its key, unfiling it from the previous one. """
+        previous = self.part_keys.get(part)
+
+        if previous == key:
+            return
+
+        if previous is not None:
+            self.full_keys[previous].remove(part)
+            self.partial_keys[previous[0: 1] + previous[2:]].remove(part)
+
+        insort(self.full_keys[key], part)
+        insort(self.partial_keys[key[0: 1] + key[2:]], part)
+        self.part_keys[part] = key
+
+    def match(self, key, header_part_number):
+        """ First part of a key, any header part number when the row has none. """
+        if header_part_number != '':
+            parts = self.full_keys.get(key)
+        else:
+            parts = self.partial_keys.get(key[0: 1] + key[2:])
+
+        return parts[0] if parts else None
+
+    def load(self, rows) -> list:
+        """ Upsert rows of (part number, header part number, upc, fna, fields by model), returns their ebom ids. """
+        with transaction.atomic():
+            eboms = self.upsert_eboms(rows)
+            self.upsert_satellites(rows, eboms)
+            refresh_wide(ebom_object.id for ebom_object in eboms)
+
+        return [ebom_object.id for ebom_object in eboms]
+
+    def upsert_eboms(self, rows) -> list:
+        """ Ebom of every row, with the row's fields set & saved. """
+        # every candidate shares the part number, upc & fna of its row
+        candidates = set()
+
+        for part_number, header_part_number, upc, fna, _ in rows:
+            key = self.key(part_number, header_part_number, upc, fna)
+            candidates.update(self.partial_keys.get(key[0: 1] + key[2:], ()))
+
+        fetched = dict()
+
+        for chunk in _chunks({self.ids.get(part, part) for part in candidates}):
+            fetched.update(models.Ebom.objects.in_bulk(chunk))
+
+        objects = {part: fetched[self.ids.get(part, part)] for part in candidates}
+
+        eboms = []
+        updated = dict()
+        new_parts = []
+        matcher = TecMatcher.current()
+
+        for part_number, header_part_number, upc, fna, fields in rows:
+            key = self.key(part_number, header_part_number, upc, fna)
+            part = self.match(key, header_part_number)
+
+            if part is None:
+                part = NEW_PART + self.created
+                self.created += 1
+                new_parts.append(part)
+
+                objects[part] = models.Ebom(label=self.label, upc=upc, fna=fna, part_number=part_number,
+                                            veh_pt=self.veh_pt)
+
+                if header_part_number != '':
+                    objects[part].header_part_number = header_part_number
+
+            elif part not in new_parts:
+                updated[part] = objects[part]
+
+            ebom_object = objects[part]
+            ebom_object.label = self.label
+
+            for attribute, value in fields['ebom'].items():
+                setattr(ebom_object, attribute, value)
+
+            # as Ebom.save() derives them
+            if ebom_object.vendor_duns_number:
+                ebom_object.duns = ebom_object.vendor_duns_number
+
+            if ebom_object.description_en:
+                ebom_object.tec_id = matcher.match(ebom_object.description_en)
+
+            self.index(part, self.key(ebom_object.part_number, ebom_object.header_part_number,
+                                      ebom_object.upc, ebom_object.fna))
+            eboms.append(ebom_object)
+
+        bulk_update(updated.values(), _written_fields(models.Ebom), batch_size=self.batch_size)
+        self.create_eboms([objects[part] for part in new_parts], new_parts)
+
+        return eboms
+
+    def create_eboms(self, ebom_objects, parts):
+        """ Insert new parts & learn their ids. """
+        if not ebom_objects:
+            return
+
+        last_id = models.Ebom.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        models.Ebom.objects.bulk_create(ebom_objects, batch_size=self.batch_size)
+        EbomCounts.invalidate()
+
+        # bulk_create does not return sqlite ids
+        if ebom_objects[0].id is None:
+            self.read_ids(ebom_objects, last_id)
+
+        for part, ebom_object in zip(parts, ebom_objects):
+            self.ids[part] = ebom_object.id
+
+    def read_ids(self, ebom_objects, last_id):
+        """ Set the ids of inserted parts, read back by their label & WIDE_KEY_FIELDS.
+
+        Parts sharing a key take the ids stored under it in insertion order. A
+        key stored more often than inserted here was also written by another
+        process meanwhile, which raises LoadError rather than guessing.
+        """
+        inserted = defaultdict(list)
+
+        for ebom_object in ebom_objects:
+            inserted[tuple(_prep(models.Ebom, name, getattr(ebom_object, name)) for name in WIDE_KEY_FIELDS)].append(
+                ebom_object)
+
+        stored = defaultdict(list)
+
+        for chunk in _chunks({key[1] for key in inserted}):
+            for row in models.Ebom.objects.filter(
+                    label=self.label, id__gt=last_id, part_number__in=chunk).order_by('id').values_list(
+                    'id', *WIDE_KEY_FIELDS):
+                stored[tuple(row[1:])].append(row[0])
+
+        for key, objects in inserted.items():
+            if len(stored[key]) != len(objects):
+                raise LoadError('%d parts stored with key %s for %d inserted' % (len(stored[key]), key, len(objects)))
+
+            for ebom_object, id_value in zip(objects, stored[key]):
+                ebom_object.id = id_value
+
+    def upsert_satellites(self, rows, eboms):
+        """ Satellites of every row, with the row's fields set & the others derived as their save() does. """
+        bom_ids = {ebom_object.id for ebom_object in eboms}
+        existing = {model: dict() for model in WIDE_SATELLITE_MODELS}
+
+        for model in WIDE_SATELLITE_MODELS:
+            for chunk in _chunks(bom_ids):
+                for related_object in model.objects.filter(bom_id__in=chunk).order_by('id'):
+                    existing[model].setdefault(related_object.bom_id, related_object)
+
+        context = self.derivation_context(rows, eboms)
+        new_objects = {model: dict() for model in WIDE_SATELLITE_MODELS}
+
+        for (_, _, _, _, fields), ebom_object in zip(rows, eboms):
+            for model in WIDE_SATELLITE_MODELS:
+                related_object = existing[model].get(ebom_object.id) or new_objects[model].get(ebom_object.id)
+
+                if related_object is None:
+                    related_object = new_objects[model][ebom_object.id] = model(bom=ebom_object)
+                else:
+                    related_object.bom = ebom_object
+
+                for attribute, value in fields[model._meta.model_name].items():
+                    setattr(related_object, attribute, value)
+
+                if hasattr(related_object, 'derive'):
+                    related_object.derive(context)
+
+                # costed later, by BatchCostEngine.recalculate_dirty()
+                if model is models.InboundCalculation:
+                    related_object.dirty = True
+
+        for model in WIDE_SATELLITE_MODELS:
+            bulk_update(existing[model].values(), _written_fields(model), batch_size=self.batch_size)
+            model.objects.bulk_create(new_objects[model].values(), batch_size=self.batch_size)
+
+    def derivation_context(self, rows, eboms):
+        """ Rows the satellites' derive() would look up, read for the whole chunk. """
+        part_keys = {self.part_key(ebom_object) for ebom_object in eboms if ebom_object.duns is not None}
+
+        # supplier names of each (label, part number), for assembly suppliers of header parts
+        assembly_suppliers = dict()
+        head_part_numbers = {ebom_object.header_part_number for ebom_object in eboms} | {
+            fields['inboundheaderpart'].get('head_part_number') for _, _, _, _, fields in rows}
+
+        for chunk in _chunks(head_part_numbers - {None, ''}):
+            for part_number, label_id, supplier_name in models.Ebom.objects.filter(
+                    part_number__in=chunk, label=self.label).order_by('id').values_list(
+                    'part_number', 'label_id', 'supplier_name'):
+                if supplier_name:
+                    assembly_suppliers.setdefault((part_number, label_id), []).append(f'{supplier_name}')
+
+        return ChunkLookups(
+            latest_unsorted_tcs(part_keys), first_unsorted_buyer(part_keys), SupplierDirectory.current(),
+            assembly_suppliers, RateSnapshot.current(),
+        )
+
+    @staticmethod
+    def part_key(ebom_object) -> tuple:
+        """ (part number, duns) of a part, as unsorted TCS & buyer rows are matched to it. """
+        return _prep(models.Ebom, 'part_number', ebom_object.part_number), _prep(models.Ebom, 'duns', ebom_object.duns)
@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import Http404
+
+from Inbound.settings import BASE_DIR
+from costsummary import models
+from costsummary.loader import CHUNK_SIZE, replace_configures
+from costsummary.sheets import SheetReader
+
+
+class Command(BaseCommand):
+    """ One-off import of the configure matrix parse_wide used to keep in a csv file. """
+    help = 'Import configure values of parts from configures.csv.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=os.path.join(BASE_DIR, 'costsummary/persistence/CONF/configures.csv'))
+
+    def flush(self, configures) -> int:
+        """ Store a chunk of rows, of parts which still exist. """
+        existing = set(models.Ebom.objects.filter(id__in=list(configures)).values_list('id', flat=True))
+        return replace_configures({bom_id: values for bom_id, values in configures.items() if bom_id in existing})
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError('%s not found.' % options['path'])
+
+        try:
+            rows = iter(SheetReader(options['path']))
+            header = [str(cell).replace(' ', '').replace('\n', '').strip() for cell in next(rows)]
+            id_col = header.index('id')
+        except (Http404, StopIteration, ValueError) as e:
+            raise CommandError('Not a configure matrix: %s' % e)
+
+        stored = 0
+        configures = dict()
+
+        for row in rows:
+            if row[id_col] == '':
+                continue
+
+            configures[int(row[id_col])] = {
+                conf_name: None if value in ('', '-') else value
+                for j, (conf_name, value) in enumerate(zip(header, row)) if j != id_col
+            }
+
+            if len(configures) == CHUNK_SIZE:
+                stored += self.flush(configures)
+                configures = dict()
+
+        if configures:
+            stored += self.flush(configures)
+
+        self.stdout.write('Imported %d configure values' % stored)
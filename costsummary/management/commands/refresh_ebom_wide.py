@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from costsummary import models
+from costsummary.wide import fill_wide, refresh_wide
+
+
+class Command(BaseCommand):
+    """ Rebuild the wide table, e.g. once after it is created or after writes which bypassed wide.py. """
+    help = 'Rebuild EbomWide rows from Ebom & its satellites.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--label', type=int, action='append', help='only parts of this label id, repeatable')
+        parser.add_argument('--missing', action='store_true', help='only parts which have no row yet')
+
+    def handle(self, *args, **options):
+        eboms = models.Ebom.objects.all()
+
+        if options['label']:
+            eboms = eboms.filter(label_id__in=options['label'])
+
+        if options['missing']:
+            count = fill_wide(eboms)
+        elif options['label']:
+            count = refresh_wide(list(eboms.values_list('pk', flat=True)))
+        else:
+            count = refresh_wide()
+
+        self.stdout.write('%d parts refreshed' % count)
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from costsummary import jobs
+from costsummary.engine import BatchCostEngine
+
+
+class Command(BaseCommand):
+    """ Worker running queued background jobs; start as many as needed. """
+    help = 'Run queued upload & statistic jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit once the queue is empty')
+        parser.add_argument('--poll', type=float, default=2.0, help='seconds to wait on an empty queue')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        self.stdout.write('Worker %s waiting for jobs' % worker)
+
+        while True:
+            close_old_connections()
+            job = jobs.claim(worker=worker)
+
+            if job is None:
+                # parts flagged by edits outside of jobs
+                recalculated = BatchCostEngine().recalculate_dirty()
+
+                if recalculated:
+                    self.stdout.write('Recalculated %d parts' % recalculated)
+
+                if options['once']:
+                    return
+
+                time.sleep(options['poll'])
+                continue
+
+            self.stdout.write('Running %s' % job)
+            job = jobs.run(job.pk)
+            self.stdout.write('%s %s' % (job, job.get_status_display()))
@@ -0,0 +1,56 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    """ Tables are created by syncdb, which leaves existing tables alone; this adds what was declared since.
+
+    Run after every upgrade, syncdb is not needed first: missing tables are created, missing concrete fields are
+    added as columns, existing rows getting the field default, then missing Meta.indexes created.
+    """
+    help = 'Create the tables, columns and Meta.indexes of costsummary models which are missing from the database.'
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            tables = set(connection.introspection.table_names(cursor))
+
+        created = dict(tables=0, columns=0, indexes=0)
+
+        for model in apps.get_app_config('costsummary').get_models():
+            if model._meta.db_table not in tables:
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.create_model(model)
+
+                self.stdout.write('Created table %s' % model._meta.db_table)
+                created['tables'] += 1
+                continue
+
+            with connection.cursor() as cursor:
+                columns = {column.name for column in
+                           connection.introspection.get_table_description(cursor, model._meta.db_table)}
+
+            for field in model._meta.local_concrete_fields:
+                if field.column in columns:
+                    continue
+
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.add_field(model, field)
+
+                self.stdout.write('Created %s on %s' % (field.column, model._meta.db_table))
+                created['columns'] += 1
+
+            with connection.cursor() as cursor:
+                existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+            for index in model._meta.indexes:
+                if index.name in existing:
+                    continue
+
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.add_index(model, index)
+
+                self.stdout.write('Created %s on %s' % (index.name, model._meta.db_table))
+                created['indexes'] += 1
+
+        self.stdout.write('%(tables)d tables, %(columns)d columns, %(indexes)d indexes created' % created)
@@ -0,0 +1,242 @@
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+from django.utils import timezone
+
+# seconds between two writes of the collected metrics, overridden by settings.METRICS_FLUSH_INTERVAL
+FLUSH_INTERVAL = 60
+
+# queries & DB seconds of the running thread, added to by the timed cursors
+_local = threading.local()
+
+
+def db_totals() -> tuple:
+    """ (queries, DB seconds) run by this thread so far. """
+    return getattr(_local, 'queries', 0), getattr(_local, 'db_seconds', 0.0)
+
+
+def _count_query(seconds: float):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+    _local.db_seconds = getattr(_local, 'db_seconds', 0.0) + seconds
+
+
+class TimedCursorMixin:
+    """ Counts every statement of a cursor & the time the database took to run it. """
+
+    def execute(self, sql, params=None):
+        started = time.perf_counter()
+
+        try:
+            return super().execute(sql, params)
+        finally:
+            _count_query(time.perf_counter() - started)
+
+    def executemany(self, sql, param_list):
+        started = time.perf_counter()
+
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            _count_query(time.perf_counter() - started)
+
+
+class TimedCursorWrapper(TimedCursorMixin, CursorWrapper):
+    pass
+
+
+class TimedCursorDebugWrapper(TimedCursorMixin, CursorDebugWrapper):
+    pass
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """ connection_created receiver, cursors of the connection count their statements. """
+    connection.make_cursor = lambda cursor: TimedCursorWrapper(cursor, connection)
+    connection.make_debug_cursor = lambda cursor: TimedCursorDebugWrapper(cursor, connection)
+
+
+class Registry:
+    """ Totals of every metric of this process since the last flush.
+
+    A metric is named after what it times: 'request <view>', 'action <view>
+    <action>', 'job <kind>' or the qualified name of a timed function. flush()
+    writes one MetricSample per metric, then starts over.
+    """
+
+    FIELDS = ('calls', 'seconds', 'max_seconds', 'queries', 'db_seconds', 'rows')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = OrderedDict()
+        self.started = timezone.now()
+        self.flushed = time.monotonic()
+
+    def add(self, name: str, seconds=0.0, queries=0, db_seconds=0.0, rows=0, calls=1):
+        with self.lock:
+            stat = self.stats.get(name)
+
+            if stat is None:
+                stat = self.stats[name] = dict.fromkeys(self.FIELDS, 0)
+
+            stat['calls'] += calls
+            stat['seconds'] += seconds
+            stat['max_seconds'] = max(stat['max_seconds'], seconds)
+            stat['queries'] += queries
+            stat['db_seconds'] += db_seconds
+            stat['rows'] += rows
+
+    def snapshot(self) -> OrderedDict:
+        """ Copy of the totals by metric name. """
+        with self.lock:
+            return OrderedDict((name, dict(stat)) for name, stat in self.stats.items())
+
+    def take(self) -> tuple:
+        """ Totals by metric name & when they started, the registry starts over. """
+        with self.lock:
+            stats, started = self.stats, self.started
+            self.stats = OrderedDict()
+            self.started = timezone.now()
+            self.flushed = time.monotonic()
+
+        return stats, started
+
+    def flush(self, force=False) -> int:
+        """ Write the totals to MetricSample once the flush interval is over; returns samples written. """
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', FLUSH_INTERVAL)
+
+        if not force and time.monotonic() - self.flushed < interval:
+            return 0
+
+        stats, started = self.take()
+        sample_model = apps.get_model('costsummary', 'MetricSample')
+        finished = timezone.now()
+
+        sample_model.objects.bulk_create([
+            sample_model(name=name, release=release(), worker=worker_name(), started=started, finished=finished, **stat)
+            for name, stat in stats.items()
+        ])
+
+        return len(stats)
+
+
+REGISTRY = Registry()
+
+
+def release() -> str:
+    """ Release the metrics are recorded for. """
+    return getattr(settings, 'METRICS_RELEASE', '')
+
+
+def worker_name() -> str:
+    """ Host & pid of this process. """
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def rows_per_second(rows, seconds):
+    """ Throughput of a metric, None when it handled no rows. """
+    return rows / seconds if rows and seconds else None
+
+
+class timer:
+    """ Time a block as one call of a metric, with the queries it ran; rows may be set inside it.
+
+    A timer without name only measures, its caller records the result.
+
+        with timer('parse_wide') as span:
+            span.rows = ...
+    """
+
+    def __init__(self, name: str, rows=0):
+        self.name = name
+        self.rows = rows
+        self.seconds = self.queries = self.db_seconds = None
+
+    def __enter__(self):
+        self.queries, self.db_seconds = db_totals()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self.started
+        queries, db_seconds = db_totals()
+        self.queries, self.db_seconds = queries - self.queries, db_seconds - self.db_seconds
+
+        if self.name is not None:
+            REGISTRY.add(self.name, self.seconds, self.queries, self.db_seconds, self.rows)
+
+        return False
+
+
+def timed(name: str = None, rows=None):
+    """ Decorator timing every call of a function, named by its qualified name by default.
+
+    rows: callable giving the rows handled from the result, e.g. len.
+    """
+    def decorate(function):
+        metric = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(metric) as span:
+                result = function(*args, **kwargs)
+
+                if rows is not None and result is not None:
+                    span.rows = rows(result)
+
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def count(name: str, calls=1, rows=0):
+    """ Count occurrences of a metric, without timing them. """
+    REGISTRY.add(name, calls=calls, rows=rows)
+
+
+def request_metrics(request) -> list:
+    """ Metric names of a handled request: its view, and the admin action it ran if any. """
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None else 'unresolved'
+    names = ['request %s' % view]
+
+    if request.method == 'POST' and view.startswith('admin:') and view.endswith('_changelist'):
+        action = request.POST.get('action')
+
+        if action:
+            names.append('action %s %s' % (view, action))
+
+    return names
+
+
+class MetricsMiddleware:
+    """ Times every request, its queries & DB time, and writes the totals once per flush interval.
+
+    The totals of a request are also answered in its Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with timer(None) as span:
+            response = self.get_response(request)
+
+        # the view is only known once resolved
+        for name in request_metrics(request):
+            REGISTRY.add(name, span.seconds, span.queries, span.db_seconds)
+
+        if response.status_code >= 500:
+            count('request errors')
+
+        response['Server-Timing'] = 'app;dur=%.1f, db;dur=%.1f' % (span.seconds * 1000, span.db_seconds * 1000)
+        REGISTRY.flush()
+
+        return response
@@ -1,12 +1,19 @@
 from datetime import timedelta, date
+from functools import lru_cache
 import math
 
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import Sum, Count
+from django.utils.functional import cached_property
 import pandas as pd
 from decimal import *
 
+from .dependencies import record_consumption
+from .metrics import rows_per_second, timed
+from .resolvers import SupplierDirectory, TecMatcher, plant_base
+from .snapshot import RateSnapshot, rate_key
+
 # constants
 BASE_CHOICE = (
     (0, 'JQ'),
@@ -17,6 +24,17 @@ BASE_CHOICE = (
     (-1, '3rd Party')
 )
 
+
+class LoadedValues:
+    """ Keeps field values as read from the database, to tell which fields a save changes. """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
 # Create your models here.
 class TecCore(models.Model):
     """ Tec id & part name (English). """
@@ -56,7 +74,7 @@ class PackingFoldingRate(models.Model):
         super().save(self, *args, **kwargs)
 
 
-class WhCubePrice(models.Model):
+class WhCubePrice(LoadedValues, models.Model):
     km = models.IntegerField(primary_key=True, verbose_name='km')
     cube_price = models.FloatField(verbose_name='距离立方单价')
 
@@ -91,6 +109,10 @@ class Production(models.Model):
     class Meta:
         verbose_name = '产量表'
         verbose_name_plural = '产量表'
+
+        indexes = [
+            models.Index(fields=['label', 'configure', 'prd_year', 'base', 'plant'])
+        ]
             
 #未来5年年降率
 class FutureRate(models.Model):
@@ -126,6 +148,10 @@ class NewModelStatistic(models.Model):
         verbose_name = '新车车型级别报表'
         verbose_name_plural = '新车车型级别报表'
 
+        indexes = [
+            models.Index(fields=['value', 'model_year', 'base', 'plant_code'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -161,6 +187,10 @@ class SummaryModel(models.Model):
         verbose_name = '新车车型级别报表'
         verbose_name_plural = '新车车型级别报表'
 
+        indexes = [
+            models.Index(fields=['value', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -197,6 +227,10 @@ class SummaryModelStatistic(models.Model):
         verbose_name = '未来五年车型级别报表'
         verbose_name_plural = '未来五年车型级别报表'
 
+        indexes = [
+            models.Index(fields=['value', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -235,6 +269,11 @@ class Supplier(models.Model):
         verbose_name = '供应商'
         verbose_name_plural = '供应商'
 
+        indexes = [
+            models.Index(fields=['address']),
+            models.Index(fields=['duns']),
+        ]
+
     def __str__(self):
         return self.name + ' -- ' + self.address
 
@@ -251,11 +290,15 @@ class SupplierDistance(models.Model):
         verbose_name = '供应商距离'
         verbose_name_plural = '供应商距离'
 
+        indexes = [
+            models.Index(fields=['supplier', 'base'])
+        ]
+
     def __str__(self):
         return '供应商 %s 到 %s 基地距离' % (self.supplier.duns, self.get_base_display())
 
 
-class NominalLabelMapping(models.Model):
+class NominalLabelMapping(LoadedValues, models.Model):
     """ Map book, plant code, model to vehicle label. """
     value = models.CharField(max_length=128, verbose_name='车型名称')
 
@@ -276,7 +319,7 @@ class NominalLabelMapping(models.Model):
 
 
 
-class Ebom(models.Model):
+class Ebom(LoadedValues, models.Model):
     """ EBOM data. """
     label = models.ForeignKey(NominalLabelMapping, null=True, on_delete=models.CASCADE, verbose_name='车型')
     # conf = models.CharField(max_length=64, default=None, null=True, blank=True, verbose_name='配置')
@@ -340,9 +383,7 @@ class Ebom(models.Model):
                     self.duns = None
         '''
         if self.description_en:
-            self.tec = TecCore.objects.filter(
-                models.Q(mgo_part_name_list__contains=self.description_en.upper()) | models.Q(
-                    common_part_name__contains=self.description_en.upper())).first()
+            self.tec_id = TecMatcher.current().match(self.description_en)
 
         super().save(*args, **kwargs)
 
@@ -377,6 +418,21 @@ class EbomConfiguration(models.Model):
         return self.concat()
 
 
+class ConfigureValue(models.Model):
+    """ Value of a part in a configure column of the wide table, empty cells are not stored. """
+    bom = models.ForeignKey(Ebom, on_delete=models.CASCADE, related_name='rel_configure_value')
+    conf_name = models.CharField(max_length=32, verbose_name='配置')
+    value = models.CharField(max_length=64, verbose_name='用量')
+
+    class Meta:
+        verbose_name = '配置用量'
+        verbose_name_plural = '配置用量'
+        unique_together = ('bom', 'conf_name')
+
+    def __str__(self):
+        return '%s: %s' % (self.conf_name, self.value)
+
+
 class AEbomEntry(models.Model):
     """ Entry to load raw ebom data. """
     label = models.ForeignKey(NominalLabelMapping, null=True, on_delete=models.CASCADE, verbose_name='车型')
@@ -533,6 +589,71 @@ class UnsortedInboundTCS(models.Model):
         return '零件 %s' % str(self.part_number)
 
 
+@lru_cache()
+def _unsorted_tcs_fields(model) -> list:
+    """ Non-id fields of UnsortedInboundTCS which also exist on model. """
+    names = {field.name for field in model._meta.get_fields()}
+
+    return [field.name for field in UnsortedInboundTCS._meta.concrete_fields
+            if field.name != 'id' and field.name in names]
+
+
+def _fill_from_tcs(satellite, context):
+    """ Empty fields from the latest unsorted TCS of the part. """
+    if satellite.bom.duns is not None:
+        matched_object = context.tcs(satellite.bom)
+
+        if matched_object:
+            for name in _unsorted_tcs_fields(type(satellite)):
+                if getattr(satellite, name) is None:
+                    setattr(satellite, name, getattr(matched_object, name))
+
+
+def _folding_rates(package, context):
+    """ Folding rates of the named supplier & sgm packages. """
+    if package.supplier_pkg_name is not None:
+        match_supplier_paking = context.rates.first(PackingFoldingRate, packing_type=package.supplier_pkg_name)
+        if match_supplier_paking is not None:
+            package.supplier_pkg_folding_rate = match_supplier_paking.folding_rate
+    if package.sgm_pkg_name is not None:
+        match_sgm_paking = context.rates.first(PackingFoldingRate, packing_type=package.sgm_pkg_name)
+        if match_sgm_paking is not None:
+            package.sgm_pkg_folding_rate = match_sgm_paking.folding_rate
+
+
+class DatabaseLookups:
+    """ Rows the satellites' derive() looks up, read from the database for a single part by save().
+
+    WideTableLoader passes a context with the same attributes, read for a whole chunk.
+    """
+
+    @cached_property
+    def rates(self):
+        return RateSnapshot.current()
+
+    @property
+    def suppliers(self):
+        return SupplierDirectory.current()
+
+    @staticmethod
+    def tcs(ebom_object):
+        """ Latest UnsortedInboundTCS of the part. """
+        return UnsortedInboundTCS.objects.filter(
+            part_number=ebom_object.part_number, duns=ebom_object.duns).order_by('-id').first()
+
+    @staticmethod
+    def buyer(ebom_object):
+        """ First UnsortedInboundBuyer of the part. """
+        return UnsortedInboundBuyer.objects.filter(part_number=ebom_object.part_number, duns=ebom_object.duns).first()
+
+    @staticmethod
+    def assembly_suppliers(part_number, label_id) -> list:
+        """ Supplier names of the parts numbered part_number in a label. """
+        return [f'{supplier_name}' for supplier_name in Ebom.objects.filter(
+            part_number=part_number, label_id=label_id).order_by('id').values_list('supplier_name', flat=True)
+            if supplier_name]
+
+
 class InboundTCS(models.Model):
     """ TCS data. """
     bom = models.OneToOneField(Ebom, on_delete=models.CASCADE, related_name='rel_tcs')
@@ -645,21 +766,12 @@ class InboundTCS(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
-    def save(self, *args, **kwargs):
-        if self.bom.duns is not None:
-            matched_object = UnsortedInboundTCS.objects.filter(
-                part_number=self.bom.part_number, duns=self.bom.duns).order_by('-id').first()
-
-            if matched_object:
-                for field in matched_object._meta.get_fields():
-                    if field.name == 'id':
-                        continue
-
-                    if hasattr(self, field.name):
-                        field_val = getattr(self, field.name)
-                        if field_val is None:
-                            setattr(self, field.name, getattr(matched_object, field.name))
+    def derive(self, context):
+        """ Empty fields from the latest unsorted TCS of the part. """
+        _fill_from_tcs(self, context)
 
+    def save(self, *args, **kwargs):
+        self.derive(DatabaseLookups())
         super().save(*args, **kwargs)
 
 
@@ -690,14 +802,15 @@ class UnsortedInboundBuyer(models.Model):
         verbose_name = '采购台账 信息'
         verbose_name_plural = '采购台账 信息'
         indexes = [
-            models.Index(fields=['area', 'part_number', 'duns'])
+            models.Index(fields=['area', 'part_number', 'duns']),
+            models.Index(fields=['part_number', 'duns']),
         ]
 
     def __str__(self):
         return self.part_number
 
 
-class InboundBuyer(models.Model):
+class InboundBuyer(LoadedValues, models.Model):
     """ Buyer data. """
     bom = models.OneToOneField(Ebom, on_delete=models.CASCADE, related_name='rel_buyer')
 
@@ -714,10 +827,10 @@ class InboundBuyer(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
-    def save(self, *args, **kwargs):
+    def derive(self, context):
+        """ Buyer & contract costs from the first unsorted buyer row of the part. """
         if self.bom.duns is not None:
-            matched_buyer_object: UnsortedInboundBuyer = UnsortedInboundBuyer.objects.filter(
-                part_number=self.bom.part_number, duns=self.bom.duns).first()
+            matched_buyer_object: UnsortedInboundBuyer = context.buyer(self.bom)
 
             if matched_buyer_object:
                 self.buyer = matched_buyer_object.buyer
@@ -726,10 +839,12 @@ class InboundBuyer(models.Model):
                 self.contract_supplier_pkg_cost = matched_buyer_object.outer_pkg_cost
                 self.contract_supplier_seq_cost = matched_buyer_object.seq_cost
 
+    def save(self, *args, **kwargs):
+        self.derive(DatabaseLookups())
         super().save(*args, **kwargs)
 
 
-class InboundAddress(models.Model):
+class InboundAddress(LoadedValues, models.Model):
     """ Inbound address. """
     bom = models.OneToOneField(Ebom, on_delete=models.CASCADE, related_name='rel_address')
     # operational address
@@ -763,7 +878,51 @@ class InboundAddress(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
+    def match_supplier(self, directory):
+        """ Matched supplier, its region & the distances to the plant of the part, looked up in a SupplierDirectory.
+
+        A distance missing from the directory is left empty.
+        """
+        # match supplier
+        if self.supplier_matched_id:
+            supplier_object = directory.supplier_by_id(self.supplier_matched_id) or self.supplier_matched
+        elif self.mfg_location:
+            supplier_object = self.supplier_matched = directory.supplier(self.mfg_location)
+        else:
+            supplier_object = None
+
+        if supplier_object:
+            if supplier_object.region and supplier_object.region[0: 2] in [
+                '江浙', '华中', '华北', '东北', '华南', '西南', '华中', '西北', '华东', '中国',
+            ]:
+                self.country = '中国'
+
+            self.region_division = supplier_object.region
+            self.province = supplier_object.province
+            self.city = supplier_object.district
+            self.mfg_location = supplier_object.address
+
+        # match distance
+        base = plant_base(self.bom.label.plant_code) if self.bom.label is not None else None
+
+        if supplier_object:
+            match_plant_distance = directory.distance(supplier_object.id, base)
+            self.distance_to_sgm_plant = match_plant_distance.distance if match_plant_distance else None
+            match_plant_distance_jq = directory.distance(supplier_object.id, 0)
+            self.distance_to_shanghai_cc = match_plant_distance_jq.distance if match_plant_distance_jq else None
 
+        if self.warehouse_address is not None:
+            warehouse_matched = directory.supplier(self.warehouse_address)
+
+            if warehouse_matched:
+                warehouse_distance_matched = directory.distance(warehouse_matched.id, base)
+                self.warehouse_to_sgm_plant = \
+                    warehouse_distance_matched.distance if warehouse_distance_matched else None
+
+    def derive(self, context):
+        self.match_supplier(context.suppliers)
+
+    @timed()
     def save(self, *args, **kwargs):
         #根据是否包含中文，判断时国产、进口、自制或进口横向代理
 
@@ -783,62 +942,8 @@ class InboundAddress(models.Model):
         # self.property = supplier_source(self.bom.supplier_name)
 
 
-        if not self.supplier_matched:
-            if self.mfg_location:
-                match_suppliers = Supplier.objects.filter(address=self.mfg_location).first()
-                self.supplier_matched = match_suppliers
-                super().save(*args, **kwargs)
-
-        # match supplier
+        self.derive(DatabaseLookups())
 
-        if self.supplier_matched:
-            if self.supplier_matched.region and self.supplier_matched.region[0: 2] in [
-                '江浙', '华中', '华北', '东北', '华南', '西南', '华中', '西北', '华东', '中国',
-            ]:
-                self.country = '中国'
-
-            self.region_division = self.supplier_matched.region
-            self.province = self.supplier_matched.province
-            self.city = self.supplier_matched.district
-            self.mfg_location = self.supplier_matched.address
-
-        # match distance
-        if self.bom.label is not None:
-            if self.bom.label.plant_code[0:2] == 'SH':
-                plant_code = 0
-            elif self.bom.label.plant_code[0:2] == 'DY':
-                plant_code = 1
-            elif self.bom.label.plant_code[0:2] == 'SY':
-                plant_code = 3           
-            elif self.bom.label.plant_code[0:2] == 'WH':
-                plant_code = 4
-        if self.supplier_matched :
-            match_plant_distance: SupplierDistance = SupplierDistance.objects.filter(
-                supplier_id=self.supplier_matched.id,base=plant_code).first()
-            self.distance_to_sgm_plant = match_plant_distance.distance
-            match_plant_distance_jq: SupplierDistance = SupplierDistance.objects.filter(
-                supplier_id=self.supplier_matched.id,base=0).first()
-            self.distance_to_shanghai_cc = match_plant_distance_jq.distance
-            # if match_plant_distance:
-            # self.distance_to_sgm_plant = match_plant_distance.distance
-
-        if self.warehouse_address is not None:
-            warehouse_matched:Supplier = Supplier.objects.filter(
-                address = self.warehouse_address).first()
-            if warehouse_matched:
-
-                warehouse_distance_matched:SupplierDistance = SupplierDistance.objects.filter(
-                    supplier_id = warehouse_matched.id,base=plant_code).first()
-
-                self.warehouse_to_sgm_plant = warehouse_distance_matched.distance
-            
-        
-        # if self.supplier_matched:
-        #     jq_distance = SupplierDistance.objects.filter(supplier_id=self.bom.label.plant_code).first()
-
-        #     if jq_distance:
-        #         self.distance_to_shanghai_cc = jq_distance.distance
-        
         super().save(*args, **kwargs)
 
 
@@ -872,32 +977,12 @@ class InboundTCSPackage(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
-    def save(self, *args, **kwargs):
-        if self.bom.duns is not None:
-            matched_object = UnsortedInboundTCS.objects.filter(
-                part_number=self.bom.part_number, duns=self.bom.duns).order_by('-id').first()
-
-            if matched_object:
-                for field in matched_object._meta.get_fields():
-                    if field.name == 'id':
-                        continue
-
-                    if hasattr(self, field.name):
-                        field_val = getattr(self, field.name)
-                        if field_val is None:
-                            setattr(self, field.name, getattr(matched_object, field.name))
+    def derive(self, context):
+        """ Empty fields from the latest unsorted TCS, folding rates & cubic of the package. """
+        _fill_from_tcs(self, context)
 
         #paking rate
-        if  self.supplier_pkg_name is not None:
-            match_supplier_paking  =  PackingFoldingRate.objects.filter(
-                packing_type=self.supplier_pkg_name).first()
-            if match_supplier_paking is not  None:
-                self.supplier_pkg_folding_rate = match_supplier_paking.folding_rate
-        if self.sgm_pkg_name is not None:
-            match_sgm_paking: PackingFoldingRate  =  PackingFoldingRate.objects.filter(
-                packing_type=self.sgm_pkg_name).first()
-            if match_sgm_paking is not None:
-                self.sgm_pkg_folding_rate = match_sgm_paking.folding_rate
+        _folding_rates(self, context)
 
         """ dependent fields """
         if self.supplier_pkg_length is not None and self.supplier_pkg_height is not None and \
@@ -908,6 +993,8 @@ class InboundTCSPackage(models.Model):
         if self.supplier_pkg_cubic_pcs is not None and self.bom.quantity is not None:
             self.supplier_pkg_cubic_veh = self.supplier_pkg_cubic_pcs * self.bom.quantity
 
+    def save(self, *args, **kwargs):
+        self.derive(DatabaseLookups())
         super().save(*args, **kwargs)
 
 
@@ -926,23 +1013,16 @@ class InboundHeaderPart(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
-    def save(self, *args, **kwargs):
+    def derive(self, context):
         """ match header part. """
         if not self.head_part_number:
             self.head_part_number = self.bom.header_part_number
 
         if not self.assembly_supplier:
-            duns_supplier_list = []
-            for ebom_object in Ebom.objects.filter(
-                    part_number=self.head_part_number, label=self.bom.label):
-                if ebom_object.supplier_name:
-                    duns_supplier_list.append(f'{ebom_object.supplier_name}')
-                '''
-                if ebom_object.duns and ebom_object.supplier_name:
-                    duns_supplier_list.append(f'{ebom_object.duns} - {ebom_object.supplier_name}')
-                '''
-            self.assembly_supplier = ','.join(duns_supplier_list)
-        
+            self.assembly_supplier = ','.join(context.assembly_suppliers(self.head_part_number, self.bom.label_id))
+
+    def save(self, *args, **kwargs):
+        self.derive(DatabaseLookups())
         super().save(*args, **kwargs)
         
 
@@ -964,7 +1044,7 @@ class InboundOperationalMode(models.Model):
         return '零件 %s' % str(self.bom)
 
 
-class InboundMode(models.Model):
+class InboundMode(LoadedValues, models.Model):
     """ Final mode. """
     bom = models.OneToOneField(Ebom, on_delete=models.CASCADE, related_name='rel_mode')
 
@@ -1031,21 +1111,15 @@ class InboundOperationalPackage(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
+    def derive(self, context):
+        _folding_rates(self, context)
+
     def save(self, *args, **kwargs):
-        if  self.supplier_pkg_name is not None:
-            match_supplier_paking  =  PackingFoldingRate.objects.filter(
-                packing_type=self.supplier_pkg_name).first()
-            if match_supplier_paking is not  None:
-                self.supplier_pkg_folding_rate = match_supplier_paking.folding_rate
-        if self.sgm_pkg_name is not None:
-            match_sgm_paking: PackingFoldingRate  =  PackingFoldingRate.objects.filter(
-                packing_type=self.sgm_pkg_name).first()
-            if match_sgm_paking is not None:
-                self.sgm_pkg_folding_rate = match_sgm_paking.folding_rate
+        self.derive(DatabaseLookups())
         super().save(*args, **kwargs)
 
 
-class InboundPackage(models.Model):
+class InboundPackage(LoadedValues, models.Model):
     """ Inbound Final package. """
     def __init__(self, *args, **kwagrs):
         getcontext().prec = 3
@@ -1079,8 +1153,8 @@ class InboundPackage(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
-    def save(self, *args, **kwargs):
-        """ dependent fields """
+    def derive(self, context):
+        """ dependent fields, a package without any cubic is left without one """
         # if self.bom.duns is not None:
         #     matched_object: UnsortedInboundTCS = UnsortedInboundTCS.objects.filter(
         #         part_number=self.bom.part_number, duns=self.bom.duns).order_by('-id').first()
@@ -1117,23 +1191,10 @@ class InboundPackage(models.Model):
             self.sgm_pkg_cubic_pcs = None
 
         # foding rate
-        if  self.supplier_pkg_name is not None:
-            match_supplier_paking  =  PackingFoldingRate.objects.filter(
-                packing_type=self.supplier_pkg_name).first()
-            if match_supplier_paking is not  None:
-                self.supplier_pkg_folding_rate = match_supplier_paking.folding_rate
-        if self.sgm_pkg_name is not None:
-            match_sgm_paking: PackingFoldingRate  =  PackingFoldingRate.objects.filter(
-                packing_type=self.sgm_pkg_name).first()
-            if match_sgm_paking is not None:
-                self.sgm_pkg_folding_rate = match_sgm_paking.folding_rate
+        _folding_rates(self, context)
 
         # 判定后面计算用的体积和折叠率
-        match_operation_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
-        if match_operation_mode is not None:
-            operation_mode = match_operation_mode.operation_mode
-        else:
-            operation_mode = None
+        # match_operation_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
         # if operation_mode is not None:
             #(5, '干线'),(7,'干线危险品')
             # 0822改成全部优先选择SGM
@@ -1151,8 +1212,10 @@ class InboundPackage(models.Model):
             # else:
         if self.sgm_pkg_cubic_pcs is not None:
             self.pkg_cubic_pcs = float(self.sgm_pkg_cubic_pcs)
-        else:
+        elif self.supplier_pkg_cubic_pcs is not None:
             self.pkg_cubic_pcs = float(self.supplier_pkg_cubic_pcs)
+        else:
+            self.pkg_cubic_pcs = None
 
         if self.sgm_pkg_folding_rate is not None:
             self.pkg_folding_rate = self.sgm_pkg_folding_rate
@@ -1169,11 +1232,13 @@ class InboundPackage(models.Model):
         else:
             self.sgm_pkg_cubic_veh = None
 
+    def save(self, *args, **kwargs):
+        self.derive(DatabaseLookups())
         super().save(*args, **kwargs)
 
 
 # 进口空运费率表
-class AirFreightRate(models.Model):
+class AirFreightRate(LoadedValues, models.Model):
     country = models.CharField(max_length=32,verbose_name='国家')
     base = models.CharField(max_length=32,verbose_name='基地')
     rate = models.FloatField(verbose_name='进口空运费率')
@@ -1182,6 +1247,10 @@ class AirFreightRate(models.Model):
         verbose_name = '进口空运费率表'
         verbose_name_plural = '进口空运费率表'
 
+        indexes = [
+            models.Index(fields=['base', 'country'])
+        ]
+
 
 
 class ConfigureCalculation(models.Model):
@@ -1207,6 +1276,10 @@ class ConfigureCalculation(models.Model):
         verbose_name = '配置级别报表'
         verbose_name_plural = '配置级别报表'
 
+        indexes = [
+            models.Index(fields=['value', 'conf_name', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -1241,6 +1314,10 @@ class ModelStatistic(models.Model):
         verbose_name = '车型级别报表'
         verbose_name_plural = '车型级别报表'
 
+        indexes = [
+            models.Index(fields=['value', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -1274,6 +1351,10 @@ class PlantStatistic(models.Model):
         verbose_name = '公司级别工厂报表'
         verbose_name_plural = '公司级别工厂报表'
 
+        indexes = [
+            models.Index(fields=['plant_code', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -1306,6 +1387,10 @@ class BaseStatistic(models.Model):
         verbose_name = '公司级别基地报表'
         verbose_name_plural = '公司级别基地报表'
 
+        indexes = [
+            models.Index(fields=['base', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -1339,6 +1424,10 @@ class SummaryStatistic(models.Model):
         verbose_name = '公司级别报表'
         verbose_name_plural = '公司级别报表'
 
+        indexes = [
+            models.Index(fields=['company', 'model_year'])
+        ]
+
     def get_all_attr(self):
         attrs =  serializers.serialize("python",[self],ensure_ascii = False)[0]['fields']
         for i in attrs:
@@ -1399,7 +1488,135 @@ class UploadHandler(models.Model):
         super().save(*args, **kwargs)
 
 
-class Constants(models.Model):
+class RateConsumption(models.Model):
+    """ Rate lookup made by the last calculation of a part. """
+    bom = models.ForeignKey(Ebom, on_delete=models.CASCADE, related_name='rate_consumptions')
+    table = models.CharField(max_length=32, verbose_name='费率表')
+    key = models.CharField(max_length=1024, verbose_name='查询条件')
+
+    class Meta:
+        verbose_name = '费率使用'
+        verbose_name_plural = '费率使用'
+
+        indexes = [
+            models.Index(fields=['table', 'key'])
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.table, self.key)
+
+
+class SnapshotGeneration(models.Model):
+    """ Token of the last invalidation of a shared snapshot, read by every process. """
+    name = models.CharField(max_length=64, unique=True, verbose_name='快照')
+    token = models.CharField(max_length=32, verbose_name='版本')
+
+    class Meta:
+        verbose_name = '快照版本'
+        verbose_name_plural = '快照版本'
+
+    def __str__(self):
+        return '%s %s' % (self.name, self.token)
+
+
+class BackgroundJob(models.Model):
+    """ Queued upload or statistic job, run by the run_jobs management command. """
+    status_choice = (
+        (0, '排队中'),
+        (1, '运行中'),
+        (2, '已完成'),
+        (3, '失败'),
+        (4, '已取消'),
+    )
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = 0, 1, 2, 3, 4
+
+    kind = models.CharField(max_length=32, verbose_name='类型')
+    payload = models.TextField(default='{}', verbose_name='参数')
+    status = models.IntegerField(choices=status_choice, default=QUEUED, verbose_name='状态')
+
+    stage = models.CharField(max_length=64, null=True, blank=True, verbose_name='阶段')
+    progress_done = models.IntegerField(default=0, verbose_name='已处理行数')
+    progress_total = models.IntegerField(null=True, blank=True, verbose_name='总行数')
+    message = models.TextField(null=True, blank=True, verbose_name='结果')
+
+    cancel_requested = models.BooleanField(default=False, verbose_name='请求取消')
+    worker = models.CharField(max_length=128, null=True, blank=True, verbose_name='执行进程')
+
+    created = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    started = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    finished = models.DateTimeField(null=True, blank=True, verbose_name='结束时间')
+
+    class Meta:
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+
+    def __str__(self):
+        return '%s #%s' % (self.kind, self.pk)
+
+    def as_dict(self):
+        """ Status of the job, as served by the JSON endpoint. """
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.get_status_display(),
+            'stage': self.stage,
+            'progress_done': self.progress_done,
+            'progress_total': self.progress_total,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'created': self.created.isoformat() if self.created else None,
+            'started': self.started.isoformat() if self.started else None,
+            'finished': self.finished.isoformat() if self.finished else None,
+        }
+
+
+class MetricSample(models.Model):
+    """ Totals of one metric of one process over a flush interval, see costsummary.metrics. """
+    name = models.CharField(max_length=255, verbose_name='指标')
+    release = models.CharField(max_length=64, blank=True, default='', verbose_name='版本')
+    worker = models.CharField(max_length=128, verbose_name='进程')
+
+    started = models.DateTimeField(verbose_name='开始时间')
+    finished = models.DateTimeField(verbose_name='结束时间')
+
+    calls = models.IntegerField(default=0, verbose_name='次数')
+    seconds = models.FloatField(default=0, verbose_name='耗时(秒)')
+    max_seconds = models.FloatField(default=0, verbose_name='最长耗时(秒)')
+    queries = models.IntegerField(default=0, verbose_name='查询数')
+    db_seconds = models.FloatField(default=0, verbose_name='数据库耗时(秒)')
+    rows = models.IntegerField(default=0, verbose_name='行数')
+
+    class Meta:
+        verbose_name = '性能指标'
+        verbose_name_plural = '性能指标'
+
+        indexes = [
+            models.Index(fields=['name', 'finished']),
+            models.Index(fields=['finished']),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.name, self.finished)
+
+    def as_dict(self):
+        """ Sample as served by the metrics endpoint. """
+        return {
+            'name': self.name,
+            'release': self.release,
+            'worker': self.worker,
+            'started': self.started.isoformat(),
+            'finished': self.finished.isoformat(),
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'max_seconds': self.max_seconds,
+            'queries': self.queries,
+            'db_seconds': self.db_seconds,
+            'rows': self.rows,
+            'rows_per_second': rows_per_second(self.rows, self.seconds),
+        }
+
+
+class Constants(LoadedValues, models.Model):
     constant_key = models.CharField(max_length=64, primary_key=True, verbose_name='constant name')
 
     value_type_choice = ((0, 'int'), (1, 'char'), (2, 'decimal'))
@@ -1416,7 +1633,7 @@ class Constants(models.Model):
         return self.constant_key
 
 
-class InboundOverseaRate(models.Model):
+class InboundOverseaRate(LoadedValues, models.Model):
     """ Oversea rate. """
     region = models.CharField(max_length=64, verbose_name='区域')
     base = models.IntegerField(verbose_name='基地', choices=BASE_CHOICE)
@@ -1444,6 +1661,10 @@ class InboundOverseaRate(models.Model):
         verbose_name = '进口费率'
         verbose_name_plural = '进口费率'
 
+        indexes = [
+            models.Index(fields=['base', 'region'])
+        ]
+
     def __str__(self):
         return f'{self.region}/{self.get_base_display()}/{self.cc}'
 
@@ -1499,7 +1720,7 @@ class InboundDangerPackage(models.Model):
         return f'{self.from_one} -> {self.to_one}'
 
 
-class InboundCCSupplierRate(models.Model):
+class InboundCCSupplierRate(LoadedValues, models.Model):
     """ CC supplier rate. """
     supplier_duns = models.CharField(max_length=64, verbose_name='Supplier Duns')
     supplier_name = models.CharField(max_length=128, verbose_name='Supplier Name')
@@ -1515,11 +1736,15 @@ class InboundCCSupplierRate(models.Model):
         verbose_name = '进口 CC Suppliers 费率'
         verbose_name_plural = '进口 CC Suppliers 费率'
 
+        indexes = [
+            models.Index(fields=['supplier_duns'])
+        ]
+
     def __str__(self):
         return self.supplier_duns
 
 
-class InboundSupplierRate(models.Model):
+class InboundSupplierRate(LoadedValues, models.Model):
     """ Supplier rate. """
     base = models.IntegerField(choices=BASE_CHOICE)
     pickup_location = models.CharField(null=True, blank=True, max_length=128, verbose_name='取货地址')
@@ -1536,6 +1761,10 @@ class InboundSupplierRate(models.Model):
         verbose_name = '供应商 费率'
         verbose_name_plural = '供应商 费率'
 
+        indexes = [
+            models.Index(fields=['base', 'pickup_location'])
+        ]
+
     def __str__(self):
         return self.supplier
 
@@ -1553,7 +1782,7 @@ class InboundSupplierRate(models.Model):
         super().save(*args, **kwargs)
 
 
-class TruckRate(models.Model):
+class TruckRate(LoadedValues, models.Model):
     """ The cost rate of trucks. """
     name = models.CharField(max_length=16, unique=True, verbose_name='卡车车型')
 
@@ -1577,7 +1806,7 @@ class TruckRate(models.Model):
         return self.name
 
 
-class RegionRouteRate(models.Model):
+class RegionRouteRate(LoadedValues, models.Model):
     """ The cost rate of route by region or route. """
     related_base = models.IntegerField(verbose_name='基地', choices=BASE_CHOICE)
     region_or_route = models.CharField(max_length=8, unique=True, verbose_name='区域/线路')
@@ -1594,7 +1823,7 @@ class RegionRouteRate(models.Model):
         return self.region_or_route
 
 
-class VMIRate(models.Model):
+class VMIRate(LoadedValues, models.Model):
     """ VMI rate """
     base = models.IntegerField(choices=BASE_CHOICE)
     whether_repacking = models.BooleanField()
@@ -1604,11 +1833,15 @@ class VMIRate(models.Model):
         verbose_name = 'VMI 费率'
         verbose_name_plural = 'VMI 费率'
 
+        indexes = [
+            models.Index(fields=['base', 'whether_repacking'])
+        ]
+
     def __str__(self):
         return self.get_base_display() + ' ' + 'Repacking' if self.whether_repacking else ''
 
 
-class WaterwayRate(models.Model):
+class WaterwayRate(LoadedValues, models.Model):
     """ Water way rate. """
     start_base = models.IntegerField(choices=BASE_CHOICE)
     destination_base = models.IntegerField(choices=BASE_CHOICE)
@@ -1618,6 +1851,10 @@ class WaterwayRate(models.Model):
         verbose_name = '水运费率'
         verbose_name_plural = '水运费率'
 
+        indexes = [
+            models.Index(fields=['start_base'])
+        ]
+
     def __str__(self):
         return '%s -> %s' % (self.get_start_base_display(), self.get_destination_base_display())
 
@@ -1626,6 +1863,10 @@ class WaterwayRate(models.Model):
 class InboundCalculation(models.Model):
     """ Fields to be calculated. """
     bom = models.OneToOneField(Ebom, on_delete=models.CASCADE, related_name='rel_calc')
+    # an input changed since the last calculation, see dependencies.py
+    dirty = models.BooleanField(default=False, db_index=True, editable=False, verbose_name='待重算')
+    # rate lookups of the last calculation are kept in RateConsumption
+    consumption_recorded = models.BooleanField(default=False, editable=False, verbose_name='已记录费率使用')
 
     ddp_pcs = models.FloatField(null=True, blank=True, verbose_name='DDP运费/pcs')
 
@@ -1679,6 +1920,40 @@ class InboundCalculation(models.Model):
     def __str__(self):
         return '零件 %s' % str(self.bom)
 
+    # set by BatchCostEngine: satellites loaded with select_related & the snapshot of the whole run;
+    # by save(): the shared snapshot, checked against the last invalidation once per save
+    _preloaded = False
+    _rates = None
+
+    # (rate table, rate key) looked up by calculate()
+    _consumed = None
+
+    def _satellite(self, model):
+        """ One-to-one satellite (mode, package, address) of this part. """
+        if not self._preloaded:
+            return model.objects.filter(bom_id=self.bom_id).first()
+
+        return getattr(self.bom, model._meta.get_field('bom').remote_field.related_name, None)
+
+    def _first_rate(self, model, **lookup):
+        """ Same as model.objects.filter(**lookup).first(), from the snapshot set for this run if any. """
+        rates = self._rates if self._rates is not None else RateSnapshot.current()
+
+        if self._consumed is not None:
+            self._consumed.add((model._meta.object_name, rate_key(model, **lookup)))
+
+        return rates.first(model, **lookup)
+
+    def _constant(self, constant_key):
+        """ Same as Constants.objects.get(constant_key=...).constant_value_float. """
+        match_constant = self._first_rate(Constants, constant_key=constant_key)
+
+        if match_constant is None:
+            raise Constants.DoesNotExist('Constants matching query does not exist: %s' % constant_key)
+
+        return match_constant.constant_value_float
+
+    @timed()
     def calculate_veh_fields(self):
         """ Calculate veh fields according to pcs fields. """
         if self.bom.quantity is None:
@@ -1727,6 +2002,7 @@ class InboundCalculation(models.Model):
 
 
         
+    @timed()
     def calculate_ddp_pcs(self):
         if (self.ddp_pcs is None) |  (self.ddp_pcs == 0) :
             if  hasattr(self.bom, 'rel_buyer'):
@@ -1734,7 +2010,7 @@ class InboundCalculation(models.Model):
             if self.ddp_pcs is None:
                 self.ddp_pcs = 0
         #0723 update
-        match_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
+        match_mode = self._satellite(InboundMode)
         if match_mode is not None:
             logistics_incoterm_mode = match_mode.logistics_incoterm_mode
             if logistics_incoterm_mode == 1:
@@ -1746,6 +2022,7 @@ class InboundCalculation(models.Model):
         #         self.ddp_pcs = self.bom.rel_buyer.contract_supplier_transportation_cost
 
     # 根据入场物流模式，判断公里数计算规则
+    @timed()
     def calculate_domestic_land_transportation_cost(self):
         plant_code = self.bom.label.plant_code
         global base_id
@@ -1761,7 +2038,7 @@ class InboundCalculation(models.Model):
             else:
                 base_id = -1
         # 判断是否需要更换包装
-        match_package = InboundPackage.objects.filter(bom_id=self.bom_id).first()
+        match_package = self._satellite(InboundPackage)
         if match_package is not None:
             if (match_package.supplier_pkg_name ==  match_package.sgm_pkg_name)  and \
                             (match_package.supplier_pkg_pcs ==  match_package.sgm_pkg_pcs) and \
@@ -1779,22 +2056,22 @@ class InboundCalculation(models.Model):
         else:
             whether_repacking_id = 0
         #if dangerous 
-        match_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
+        match_mode = self._satellite(InboundMode)
         if match_mode is not None:
             operation_mode = match_mode.operation_mode
             if operation_mode == 6 \
                 or operation_mode == 7:
             # if self.bom.rel_mode.operation_mode == 'MRA危险品' \
             #     or self.bom.rel_mode.operation_mode == '干线危险品':
-                Coefficient_of_dangerous_cargo = Constants.objects.get(constant_key='国内危险品系数').constant_value_float
+                Coefficient_of_dangerous_cargo = self._constant('国内危险品系数')
             else:
                 Coefficient_of_dangerous_cargo = 1
 
             logistics_incoterm_mode = match_mode.logistics_incoterm_mode 
-            match_vim_rate : VMIRate = VMIRate.objects.filter(base = base_id,whether_repacking=whether_repacking_id).first()
+            match_vim_rate : VMIRate = self._first_rate(VMIRate, base = base_id,whether_repacking=whether_repacking_id)
             # print('match_vim_rate',match_vim_rate.rate)
-            milkrun_manage_ratio = Constants.objects.get(constant_key='Milkrun管理费系数').constant_value_float
-            match_distance = InboundAddress.objects.filter(bom_id=self.bom_id).first()
+            milkrun_manage_ratio = self._constant('Milkrun管理费系数')
+            match_distance = self._satellite(InboundAddress)
             if logistics_incoterm_mode is not None and match_distance is not None:
                 # '(1, 'FCA'), (2, 'FCA Warehouse'),'
                 if logistics_incoterm_mode in [1,2] :
@@ -1807,10 +2084,9 @@ class InboundCalculation(models.Model):
                         distance = match_distance.warehouse_to_sgm_plant
                     if distance is not None:
                         if distance > 500:
-                            manage_ratio = Constants.objects.get(constant_key='干线管理费系数').constant_value_float
+                            manage_ratio = self._constant('干线管理费系数')
                             # 0813改成基地和地址对应
-                            match_supplier_rate : InboundSupplierRate = InboundSupplierRate.objects.filter(
-                                base = base_id, pickup_location=self.bom.rel_address.mfg_location).first()
+                            match_supplier_rate : InboundSupplierRate = self._first_rate(InboundSupplierRate, base = base_id, pickup_location=self.bom.rel_address.mfg_location)
                             # print('base',InboundSupplierRate.base)
                             # print('base_id',base_id)
                             # print('location',InboundSupplierRate.pickup_location)
@@ -1849,13 +2125,13 @@ class InboundCalculation(models.Model):
                             # 沈阳园区
                             print('distance',distance)
                             if self.bom.label.plant_code == 'SY13' and '沈阳园区' == self.bom.rel_address.city and self.bom.rel_package.pkg_cubic_pcs is not None:
-                                sy_price_per_cube = Constants.objects.get(constant_key='SY园区立方单价').constant_value_float
+                                sy_price_per_cube = self._constant('SY园区立方单价')
                                 self.dom_truck_ttl_pcs = Coefficient_of_dangerous_cargo * (1 + milkrun_manage_ratio) * sy_price_per_cube * float(self.bom.rel_package.pkg_cubic_pcs) 
                                 print('sy_price_per_cube',sy_price_per_cube)
                                 print('self.dom_truck_ttl_pcs',self.dom_truck_ttl_pcs)
                             # 武汉园区
                             elif self.bom.label.plant_code[0:2] == 'WH' and '武汉园区' == self.bom.rel_address.city and self.bom.rel_package.pkg_cubic_pcs is not None:
-                                wh_price_per_cube = Constants.objects.get(constant_key='WH园区立方单价').constant_value_float
+                                wh_price_per_cube = self._constant('WH园区立方单价')
                                 self.dom_truck_ttl_pcs = Coefficient_of_dangerous_cargo * (1 + milkrun_manage_ratio) * wh_price_per_cube * float(self.bom.rel_package.pkg_cubic_pcs) 
                             #JQ、DY、NS 25km以内包车
                             elif base_id in (0,1,3) and 0 < distance <= 25:
@@ -1868,7 +2144,7 @@ class InboundCalculation(models.Model):
                                         base_name = '东岳12米卡车'
                                     elif base_id == 3:
                                         base_name = '北盛12米卡车'
-                                truck_objects : TruckRate = TruckRate.objects.filter(name=base_name).first()
+                                truck_objects : TruckRate = self._first_rate(TruckRate, name=base_name)
                                 if match_package is not None and match_package.pkg_cubic_pcs is not None:
                                     self.dom_truck_ttl_pcs = Coefficient_of_dangerous_cargo * (1 + milkrun_manage_ratio) * (truck_objects.charter_price * \
                                         truck_objects.oil_price/(9/(distance * 2 / truck_objects.avg_speed + truck_objects.load_time))) \
@@ -1877,24 +2153,21 @@ class InboundCalculation(models.Model):
                             
                             elif base_id in (0,1,3) and distance > 25:
                                 if operation_mode == 2:
-                                    match_RegionRouteRate : RegionRouteRate = RegionRouteRate.objects.filter(
-                                    related_base=0,region_or_route=self.bom.rel_address.city).first()
+                                    match_RegionRouteRate : RegionRouteRate = self._first_rate(RegionRouteRate, related_base=0,region_or_route=self.bom.rel_address.city)
                                 else:
-                                    match_RegionRouteRate : RegionRouteRate = RegionRouteRate.objects.filter(
-                                        related_base=base_id,region_or_route=self.bom.rel_address.city).first()
+                                    match_RegionRouteRate : RegionRouteRate = self._first_rate(RegionRouteRate, related_base=base_id,region_or_route=self.bom.rel_address.city)
                                 if match_RegionRouteRate is not None and match_package.pkg_cubic_pcs is not None :
                                     self.dom_truck_ttl_pcs = (1 + milkrun_manage_ratio) * match_RegionRouteRate.price_per_cube \
                                         * float(match_package.pkg_cubic_pcs)* match_RegionRouteRate.km*Coefficient_of_dangerous_cargo
                             # WH 立方计费
                             elif base_id == 4:
                                 if operation_mode == 2:
-                                    match_RegionRouteRate : RegionRouteRate = RegionRouteRate.objects.filter(
-                                        related_base=0,region_or_route=self.bom.rel_address.city).first()
+                                    match_RegionRouteRate : RegionRouteRate = self._first_rate(RegionRouteRate, related_base=0,region_or_route=self.bom.rel_address.city)
                                     if match_RegionRouteRate is not None and match_package.pkg_cubic_pcs is not None :
                                         self.dom_truck_ttl_pcs = (1 + milkrun_manage_ratio) * match_RegionRouteRate.price_per_cube \
                                             * float(match_package.pkg_cubic_pcs)* match_RegionRouteRate.km*Coefficient_of_dangerous_cargo
                                 else:
-                                    match_wh_cube_price = WhCubePrice.objects.filter(km=distance).first()
+                                    match_wh_cube_price = self._first_rate(WhCubePrice, km=distance)
                                     if match_wh_cube_price is not None and self.bom.rel_package.pkg_cubic_pcs is not None: 
                                         self.dom_truck_ttl_pcs = Coefficient_of_dangerous_cargo * (1 + milkrun_manage_ratio) * match_wh_cube_price.cube_price * float(self.bom.rel_package.pkg_cubic_pcs)
 
@@ -1908,29 +2181,30 @@ class InboundCalculation(models.Model):
             self.dom_truck_ttl_pcs = 0
 
 
+    @timed()
     def calculate_domestic_shipping_cost(self):
-        match_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
+        match_mode = self._satellite(InboundMode)
         if match_mode is not None:
             if match_mode.operation_mode == 6 \
                 or match_mode.operation_mode == 7:
             # if self.bom.rel_mode.operation_mode == 'MRA危险品' \
             #     or self.bom.rel_mode.operation_mode == '干线危险品':
-                Coefficient_of_dangerous_cargo = Constants.objects.get(constant_key='国内危险品系数').constant_value_float
+                Coefficient_of_dangerous_cargo = self._constant('国内危险品系数')
             else:
                 Coefficient_of_dangerous_cargo = 1
 
             if hasattr(self.bom, 'rel_package'):
-                match_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
+                match_mode = self._satellite(InboundMode)
                 if  (match_mode is not None and match_mode.operation_mode == 2)  or \
                     (hasattr(self.bom,'rel_address') and self.bom.rel_address.property == 4):
                 # if  (hasattr(self.bom,'rel_mode') and self.bom.rel_mode.operation_mode == 'MRC')  or \
-                    match_WaterwayRate: WaterwayRate = WaterwayRate.objects.filter(start_base=base_id).first()
-                    volume : Constants = Constants.objects.filter(constant_key='国内CC集装箱容积').first()
-                    operating_expenses: Constants = Constants.objects.filter(constant_key='国内CC单箱操作费').first()
+                    match_WaterwayRate: WaterwayRate = self._first_rate(WaterwayRate, start_base=base_id)
+                    volume : Constants = self._first_rate(Constants, constant_key='国内CC集装箱容积')
+                    operating_expenses: Constants = self._first_rate(Constants, constant_key='国内CC单箱操作费')
                     if self.bom.veh_pt == 1:
-                        loading_rate = Constants.objects.get(constant_key='国内CC整车液体装载率').constant_value_float
+                        loading_rate = self._constant('国内CC整车液体装载率')
                     elif self.bom.veh_pt == 2:
-                        loading_rate = Constants.objects.get(constant_key='国内CCPT液体装载率').constant_value_float
+                        loading_rate = self._constant('国内CCPT液体装载率')
                     if volume is not None:
                         # 国内水运-去程/pcs
                         if match_WaterwayRate.rate  is not None and volume.constant_value_float is not None and \
@@ -1969,6 +2243,7 @@ class InboundCalculation(models.Model):
             self.dom_water_backway_pcs = 0
             self.dom_water_ttl_pcs = 0
 
+    @timed()
     def calculate_oversea_cost(self):
         plant_code = self.bom.label.plant_code
         global base_id
@@ -1989,26 +2264,26 @@ class InboundCalculation(models.Model):
                     province_upper=self.bom.rel_address.province.upper()
                 else:
                     province_upper=None
-                match_oversearate = InboundOverseaRate.objects.filter(base =base_id, region=province_upper).first()
+                match_oversearate = self._first_rate(InboundOverseaRate, base =base_id, region=province_upper)
                 if match_oversearate is not None:
-                    documents_coefficient = Constants.objects.get(constant_key='单证费系数').constant_value_float
-                match_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
-                match_package = InboundPackage.objects.filter(bom_id=self.bom_id).first()
-                us_exchange_rate = Constants.objects.get(constant_key='美元汇率').constant_value_float
+                    documents_coefficient = self._constant('单证费系数')
+                match_mode = self._satellite(InboundMode)
+                match_package = self._satellite(InboundPackage)
+                us_exchange_rate = self._constant('美元汇率')
                 if match_mode is not None and match_package is not None:
-                    match_address  = InboundAddress.objects.filter(bom_id=self.bom_id).first()
+                    match_address  = self._satellite(InboundAddress)
                     if match_address is not None:
                         if  match_address.property == 4:
                             '进口横向代理'
-                            match_jq_oversearate = InboundOverseaRate.objects.filter(base =0, region=province_upper).first()
+                            match_jq_oversearate = self._first_rate(InboundOverseaRate, base =0, region=province_upper)
                             if self.bom.rel_address.province is not None:
                                 if match_jq_oversearate is not None:
                                     if match_jq_oversearate.cc.strip().upper() == 'EUCC':
-                                        exchange_rate = Constants.objects.get(constant_key='欧元汇率').constant_value_float
+                                        exchange_rate = self._constant('欧元汇率')
                                     else:
-                                        exchange_rate = Constants.objects.get(constant_key='美元汇率').constant_value_float
+                                        exchange_rate = self._constant('美元汇率')
                                     if self.bom.rel_address.province.strip() == 'MI' or self.bom.rel_address.province.strip() == 'OH':
-                                        match_pcp : InboundCCSupplierRate = InboundCCSupplierRate.objects.filter(supplier_duns=self.bom.duns).first()
+                                        match_pcp : InboundCCSupplierRate = self._first_rate(InboundCCSupplierRate, supplier_duns=self.bom.duns)
                                         if match_pcp is not None and match_package.pkg_cubic_pcs is not None:
                                             self.oversea_inland_pcs =  match_pcp.cpc*float(match_package.pkg_cubic_pcs)*exchange_rate
                                     else:
@@ -2062,11 +2337,11 @@ class InboundCalculation(models.Model):
                             if self.bom.rel_address.province is not None:
                                 if match_oversearate is not None:
                                     if match_oversearate.cc.strip().upper() == 'EUCC':
-                                        exchange_rate = Constants.objects.get(constant_key='欧元汇率').constant_value_float
+                                        exchange_rate = self._constant('欧元汇率')
                                     else:
-                                        exchange_rate = Constants.objects.get(constant_key='美元汇率').constant_value_float
+                                        exchange_rate = self._constant('美元汇率')
                                     if self.bom.rel_address.province.strip() == 'MI' or self.bom.rel_address.province.strip() == 'OH':
-                                        match_pcp : InboundCCSupplierRate = InboundCCSupplierRate.objects.filter(supplier_duns=self.bom.duns).first()
+                                        match_pcp : InboundCCSupplierRate = self._first_rate(InboundCCSupplierRate, supplier_duns=self.bom.duns)
                                         if match_pcp is not None and match_package.pkg_cubic_pcs is not None:
                                             self.oversea_inland_pcs =  match_pcp.cpc*float(match_package.pkg_cubic_pcs)*exchange_rate
                                     else:
@@ -2120,11 +2395,11 @@ class InboundCalculation(models.Model):
                             if self.bom.rel_address.province is not None:
                                 if match_oversearate is not None:
                                     if match_oversearate.cc.strip().upper() == 'EUCC':
-                                        exchange_rate = Constants.objects.get(constant_key='欧元汇率').constant_value_float
+                                        exchange_rate = self._constant('欧元汇率')
                                     else:
-                                        exchange_rate = Constants.objects.get(constant_key='美元汇率').constant_value_float
+                                        exchange_rate = self._constant('美元汇率')
                                     if self.bom.rel_address.province.strip() == 'MI' or self.bom.rel_address.province.strip() == 'OH':
-                                        match_pcp : InboundCCSupplierRate = InboundCCSupplierRate.objects.filter(supplier_duns=self.bom.duns).first()
+                                        match_pcp : InboundCCSupplierRate = self._first_rate(InboundCCSupplierRate, supplier_duns=self.bom.duns)
                                         if match_pcp is not None and match_package.pkg_cubic_pcs is not None:
                                             self.oversea_inland_pcs =  match_pcp.cpc*float(match_package.pkg_cubic_pcs)*exchange_rate
                                     elif match_package.pkg_cubic_pcs is not None:
@@ -2172,8 +2447,8 @@ class InboundCalculation(models.Model):
                                             self.certificate_pcs = 0
                         elif match_mode.operation_mode == 10 or match_mode.operation_mode == 13:
                             # 进口空运,进口空运危险品
-                            match_country = InboundAddress.objects.filter(bom_id=self.bom_id).first()
-                            match_airfreightrate=AirFreightRate.objects.filter(country=match_country.country,base= plant_code[0: 2]).first()
+                            match_country = self._satellite(InboundAddress)
+                            match_airfreightrate=self._first_rate(AirFreightRate, country=match_country.country,base= plant_code[0: 2])
                             if match_airfreightrate is not None:
                                 if  match_mode.operation_mode == 10:
                                     airfreightrate=match_airfreightrate.rate
@@ -2198,6 +2473,7 @@ class InboundCalculation(models.Model):
         self.oversea_ocean_ttl_pcs = self.oversea_inland_pcs+self.oversea_cc_op_pcs+self.international_ocean_pcs \
             +self.dom_pull_pcs +self.certificate_pcs
 
+    @timed()
     def calculate_ib_cost(self):
         if self.ddp_pcs is not None:
             self.inbound_ttl_pcs = self.ddp_pcs+self.dom_truck_ttl_pcs+self.dom_water_ttl_pcs+self.oversea_ocean_ttl_pcs+self.oversea_air_pcs
@@ -2253,8 +2529,11 @@ class InboundCalculation(models.Model):
         # (15, 'INHOUSE'),
         # (16, '自供自用'),
     # )
-    def save(self, *args, **kwargs):
-        match_mode = InboundMode.objects.filter(bom_id=self.bom_id).first()
+    @timed()
+    def calculate(self):
+        """ Calculate all pcs & veh fields without saving. """
+        self._consumed = set()
+        match_mode = self._satellite(InboundMode)
         if match_mode is not None:
             logistics_incoterm_mode = match_mode.logistics_incoterm_mode
             operation_mode = match_mode.operation_mode
@@ -2338,7 +2617,96 @@ class InboundCalculation(models.Model):
             self.oversea_air_veh = 0
         if self.inbound_ttl_veh is None:
             self.inbound_ttl_veh = 0
+
+    @timed()
+    def save(self, *args, **kwargs):
+        self.dirty = False
+        self._rates = RateSnapshot.current()
+        self.calculate()
+        self.consumption_recorded = True
         super().save(*args, **kwargs)
+        record_consumption([self])
+
+
+# satellites mirrored into EbomWide
+WIDE_SATELLITES = (
+    InboundHeaderPart,
+    InboundTCS,
+    InboundBuyer,
+    InboundAddress,
+    InboundTCSPackage,
+    InboundOperationalMode,
+    InboundMode,
+    InboundOperationalPackage,
+    InboundPackage,
+    InboundCalculation,
+)
+
+
+# bookkeeping fields, changed with queryset.update() which leaves EbomWide alone
+WIDE_EXCLUDED_FIELDS = ('dirty', 'consumption_recorded')
+
+
+def wide_fields(model) -> list:
+    """ Fields of a satellite mirrored into EbomWide: editable values, relations & bookkeeping left out. """
+    return [field for field in model._meta.concrete_fields
+            if field.editable and not field.primary_key and not field.is_relation
+            and field.name not in WIDE_EXCLUDED_FIELDS]
+
+
+def wide_column(model, field_name: str) -> str:
+    """ EbomWide field of a satellite field, pk for the satellite's own id. """
+    return '%s_%s' % (model._meta.model_name, field_name)
+
+
+def _mirror_field(field):
+    """ Nullable copy of a satellite field. """
+    _, _, args, kwargs = field.deconstruct()
+
+    for key in ('primary_key', 'unique', 'db_index', 'default', 'editable'):
+        kwargs.pop(key, None)
+
+    if isinstance(field, models.BooleanField):
+        return models.NullBooleanField(*args, **kwargs)
+
+    kwargs.update(null=True, blank=True)
+    return field.__class__(*args, **kwargs)
+
+
+class EbomWide(models.Model):
+    """ Ebom joined with its satellites, one row per part, kept up to date by wide.py.
+
+    Besides its part & label, a row holds the id of every satellite (None when
+    the part has none) and a nullable copy of each of its wide_fields(), named
+    by wide_column().
+    """
+    bom = models.OneToOneField(Ebom, primary_key=True, on_delete=models.CASCADE, related_name='rel_wide')
+    label = models.ForeignKey(NominalLabelMapping, null=True, on_delete=models.CASCADE, verbose_name='车型')
+
+    class Meta:
+        verbose_name = '宽表'
+        verbose_name_plural = '宽表'
+
+    def satellite(self, model):
+        """ Satellite instance as stored, fields not mirrored are read on access; None when the part has none. """
+        pk = getattr(self, wide_column(model, 'pk'))
+
+        if pk is None:
+            return None
+
+        fields = wide_fields(model)
+        return model.from_db(
+            self._state.db,
+            ['id', 'bom_id'] + [field.attname for field in fields],
+            [pk, self.bom_id] + [getattr(self, wide_column(model, field.name)) for field in fields]
+        )
+
+
+for _satellite in WIDE_SATELLITES:
+    EbomWide.add_to_class(wide_column(_satellite, 'pk'), models.IntegerField(null=True, blank=True))
+
+    for _field in wide_fields(_satellite):
+        EbomWide.add_to_class(wide_column(_satellite, _field.name), _mirror_field(_field))
 
 
 
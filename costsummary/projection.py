@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+# projected measure & the yearly decline rate compounded on it
+DECLINES = [
+    ('import_ib', 'import_rate'),
+    ('dom_ddp_ib', 'dom_decline_rate'),
+    ('dom_fca_ib', 'dom_decline_rate'),
+]
+
+# years projected per model, the model year included
+DEFAULT_HORIZON = 8
+
+
+def horizon_setting() -> int:
+    """ PROJECTION_HORIZON setting, 8 years by default. """
+    from django.conf import settings
+    return getattr(settings, 'PROJECTION_HORIZON', DEFAULT_HORIZON)
+
+
+def project(model_statistic: pd.DataFrame, future_rate: pd.DataFrame, horizon: int = DEFAULT_HORIZON) -> pd.DataFrame:
+    """ Expand each model statistic row to horizon yearly rows & compound declines.
+
+    Row k of a model is its year model_year + k, carrying the FutureRate of that
+    year. Projected measures of year k are the model year value multiplied by
+    the rates of years 1..k, in that order. Missing values & rates become 0.
+    """
+    offsets = np.tile(np.arange(horizon), len(model_statistic))
+
+    data = model_statistic.loc[model_statistic.index.repeat(horizon)].reset_index(drop=True)
+    data['year'] = data['model_year'] + offsets
+
+    rate = future_rate.rename(columns={'dom_rate': 'dom_decline_rate'})
+    data = pd.merge(data, rate[['year', 'import_rate', 'dom_decline_rate']], on='year', how='left')
+    data = data.fillna(0)
+
+    # a block restarts at its model year, rows off the horizon are 0
+    step = data['year'] - data['model_year']
+    start = ~((step >= 1) & (step < horizon))
+    block = start.cumsum()
+    in_horizon = (step >= 0) & (step < horizon)
+
+    for measure, rate_column in DECLINES:
+        factor = data[measure].where(start, data[rate_column])
+        data[measure] = factor.groupby(block).cumprod().where(in_horizon, 0)
+
+    data['model_year'] = data['year']
+    data['inbound_ttl_veh'] = data['import_ib'] + data['dom_ddp_ib'] + data['dom_fca_ib']
+
+    return data
@@ -0,0 +1,157 @@
+from bisect import bisect_right
+
+from django.apps import apps
+from django.db.models import Count
+
+from .snapshot import SharedSnapshot
+
+# sqlite LIKE folds ascii letters only
+ASCII_UPPER = str.maketrans('abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+# separators between TEC rows & between the two names of a row, never part of a description
+ROW_SEPARATOR = '\x01'
+NAME_SEPARATOR = '\x00'
+
+# base of a plant code prefix
+PLANT_BASE = {'SH': 0, 'DY': 1, 'SY': 3, 'WH': 4}
+
+
+def plant_base(plant_code):
+    """ Base of a plant code by its two letter prefix, or None. """
+    return PLANT_BASE.get(plant_code[0: 2]) if plant_code else None
+
+
+class TecMatcher(SharedSnapshot):
+    """ Substring index over TecCore part names.
+
+    match(description) returns the same TEC id as
+    TecCore.objects.filter(Q(mgo_part_name_list__contains=d.upper()) | Q(common_part_name__contains=d.upper())).first():
+    all names are joined in tec_id order into one corpus, so the first occurrence of
+    the description belongs to the lowest matching tec_id.
+    """
+    ttl_setting = 'TEC_MATCHER_TTL'
+
+    def __init__(self):
+        super().__init__()
+        tec_core = apps.get_model('costsummary', 'TecCore')
+
+        self._tec_ids = []
+        self._offsets = []
+        names = []
+        offset = 0
+
+        for tec_id, mgo_part_name_list, common_part_name in tec_core.objects.order_by('tec_id').values_list(
+                'tec_id', 'mgo_part_name_list', 'common_part_name'):
+            name = (mgo_part_name_list + NAME_SEPARATOR + common_part_name).translate(ASCII_UPPER)
+
+            self._tec_ids.append(tec_id)
+            self._offsets.append(offset)
+            names.append(name)
+            offset += len(name) + len(ROW_SEPARATOR)
+
+        self._corpus = ROW_SEPARATOR.join(names)
+        self._matched = dict()
+
+    def match(self, description):
+        """ TEC id of a description, or None. """
+        if description in self._matched:
+            return self._matched[description]
+
+        needle = description.upper().translate(ASCII_UPPER)
+        tec_id = None
+
+        if ROW_SEPARATOR not in needle and NAME_SEPARATOR not in needle:
+            position = self._corpus.find(needle)
+
+            if position >= 0:
+                tec_id = self._tec_ids[bisect_right(self._offsets, position) - 1]
+
+        self._matched[description] = tec_id
+        return tec_id
+
+    def match_many(self, descriptions) -> dict:
+        """ TEC id of each distinct, non-empty description. """
+        return {description: self.match(description) for description in set(descriptions) if description}
+
+
+class SupplierDirectory(SharedSnapshot):
+    """ Suppliers by address & by id, distances by (supplier id, base).
+
+    supplier(address) returns the same row as Supplier.objects.filter(address=address).first()
+    and distance(supplier_id, base) the same as SupplierDistance.objects.filter(
+    supplier_id=supplier_id, base=base).first(): the lowest primary key wins. Dropped on
+    post_save / post_delete of either model and by load_initial_distance.
+    """
+    ttl_setting = 'SUPPLIER_DIRECTORY_TTL'
+
+    def __init__(self):
+        super().__init__()
+        supplier_model = apps.get_model('costsummary', 'Supplier')
+        distance_model = apps.get_model('costsummary', 'SupplierDistance')
+
+        self._address_field = supplier_model._meta.get_field('address')
+        self._suppliers = dict()
+        self._addresses = dict()
+        self._distances = dict()
+
+        for supplier_object in supplier_model.objects.order_by('pk'):
+            self._suppliers[supplier_object.pk] = supplier_object
+            self._addresses.setdefault(supplier_object.address, supplier_object)
+
+        for distance_object in distance_model.objects.order_by('pk'):
+            self._distances.setdefault((distance_object.supplier_id, distance_object.base), distance_object)
+
+    def supplier(self, address):
+        """ First supplier at an address, or None. """
+        if address is None:
+            return None
+
+        return self._addresses.get(self._address_field.get_prep_value(address))
+
+    def supplier_by_id(self, supplier_id):
+        """ Supplier of a primary key, or None. """
+        return self._suppliers.get(supplier_id)
+
+    def suppliers(self, addresses) -> dict:
+        """ First supplier of each distinct, non-empty address which has one. """
+        matched = dict()
+
+        for address in set(addresses):
+            supplier_object = self.supplier(address) if address else None
+
+            if supplier_object is not None:
+                matched[address] = supplier_object
+
+        return matched
+
+    def distance(self, supplier_id, base):
+        """ First distance of a supplier to a base, or None. """
+        return self._distances.get((supplier_id, base))
+
+
+class EbomCounts(SharedSnapshot):
+    """ Number of parts by (label id, veh_pt), read with one grouped query.
+
+    Serves the changelist paginator & label filter, which would otherwise count
+    or scan Ebom on every page. Dropped on post_save / post_delete of Ebom and by
+    the bulk loaders; writes of other processes show within the TTL.
+    """
+    ttl_setting = 'EBOM_COUNT_TTL'
+
+    def __init__(self):
+        super().__init__()
+        ebom_model = apps.get_model('costsummary', 'Ebom')
+
+        self._counts = {
+            (label_id, veh_pt): count for label_id, veh_pt, count in
+            ebom_model.objects.order_by().values('label_id', 'veh_pt').annotate(count=Count('id')).values_list(
+                'label_id', 'veh_pt', 'count')
+        }
+        self.label_ids = {label_id for label_id, _ in self._counts if label_id is not None}
+
+    def count(self, label_id=None, veh_pt=None) -> int:
+        """ Parts of a label and / or veh_pt, every part by default. """
+        return sum(
+            count for (count_label_id, count_veh_pt), count in self._counts.items()
+            if (label_id is None or count_label_id == label_id) and (veh_pt is None or count_veh_pt == veh_pt)
+        )
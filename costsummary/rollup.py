@@ -0,0 +1,142 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import models
+from .bulk import bulk_upsert, read_frame
+from .metrics import REGISTRY
+
+# production weighted measures
+MEASURES = ['volume', 'inbound_ttl_veh', 'import_ib', 'dom_ddp_ib', 'dom_fca_ib', 'dom_volume', 'local_volume',
+            'park_volume']
+
+# statistic fields of each level
+STATISTIC_FIELDS = ['volume', 'inbound_ttl_veh', 'import_ib', 'dom_ddp_ib', 'dom_fca_ib', 'production', 'dom_volume',
+                    'dom_rate', 'local_volume', 'local_rate', 'park_volume', 'park_rate']
+
+# grouped sums behind the averages
+WEIGHTED_COLUMNS = [measure + '_mul' for measure in MEASURES] + ['production']
+
+# stands in for a missing group key, which groupby would drop
+MISSING_KEY = object()
+
+# level: model, group keys, upsert keys, extra value fields
+LEVELS = OrderedDict([
+    ('model', (models.ModelStatistic, ['base', 'plant_code', 'value', 'model_year'], ['value', 'model_year'],
+               ['base', 'plant_code'])),
+    ('plant', (models.PlantStatistic, ['base', 'plant_code', 'model_year'], ['plant_code', 'model_year'],
+               ['base'])),
+    ('base', (models.BaseStatistic, ['base', 'model_year'], ['base', 'model_year'], [])),
+    ('company', (models.SummaryStatistic, ['model_year'], ['company', 'model_year'], [])),
+])
+
+
+def _ratio(numerator, denominator, guard):
+    """ numerator / denominator where guard is a non-zero number, else 0. """
+    return np.where(guard.notnull() & (guard != 0), numerator / denominator, 0)
+
+
+def weighted_sums(frame: pd.DataFrame, keys: list, dropna=True) -> pd.DataFrame:
+    """ Sum of production weighted measures & production per group, sorted by keys.
+
+    With dropna=False rows with missing keys form groups of their own, keyed by NaN.
+    """
+    weighted = frame[MEASURES].mul(frame['production'], axis=0)
+    weighted.columns = [measure + '_mul' for measure in MEASURES]
+    weighted['production'] = frame['production']
+
+    if dropna:
+        for key in keys:
+            weighted[key] = frame[key]
+
+        return weighted.groupby(keys, as_index=False)[WEIGHTED_COLUMNS].sum()
+
+    for key in keys:
+        weighted[key] = frame[key].astype(object).where(frame[key].notnull(), MISSING_KEY)
+
+    sums = weighted.groupby(keys, as_index=False, sort=False)[WEIGHTED_COLUMNS].sum()
+
+    for key in keys:
+        sums[key] = sums[key].where(sums[key] != MISSING_KEY, np.nan).infer_objects()
+
+    return sums.sort_values(keys).reset_index(drop=True)
+
+
+def weighted_averages(sums: pd.DataFrame) -> pd.DataFrame:
+    """ Measures averaged by production, with rates on top. """
+    statistic = sums.copy()
+
+    for measure in MEASURES:
+        statistic[measure] = _ratio(statistic[measure + '_mul'], statistic['production'], statistic['production'])
+
+    statistic['dom_rate'] = _ratio(statistic['dom_volume'], statistic['volume'], statistic['volume'])
+    statistic['local_rate'] = _ratio(statistic['local_volume'], statistic['volume'], statistic['dom_volume'])
+    statistic['park_rate'] = _ratio(statistic['park_volume'], statistic['volume'], statistic['dom_volume'])
+
+    return statistic
+
+
+class StatisticRollup:
+    """ Model, plant, base & company statistic in one pass.
+
+    The model level is grouped from ConfigureCalculation. Plant, base & company
+    levels share a single read of SummaryModelStatistic: weighted sums are
+    grouped once per (base, plant_code, model_year) and rolled up from there.
+    Each level is upserted in bulk; seconds spent per level are kept in timings
+    and recorded as the 'StatisticRollup <level>' metrics.
+    """
+
+    def __init__(self):
+        self.timings = OrderedDict()
+        self.counts = OrderedDict()
+
+    @staticmethod
+    def read(table: str) -> pd.DataFrame:
+        """ Whole statistic source table. """
+        return read_frame('select * from %s' % table)
+
+    def write(self, level: str, statistic: pd.DataFrame):
+        """ Upsert the rows of one level. """
+        model, _, key_columns, extra_fields = LEVELS[level]
+
+        if level == 'company':
+            statistic['company'] = 'SGM'
+
+        self.counts[level] = bulk_upsert(model, statistic, key_columns, extra_fields + STATISTIC_FIELDS)
+
+    def run(self, levels=tuple(LEVELS)) -> OrderedDict:
+        """ Compute & write given levels, return timings. """
+        started = time.perf_counter()
+
+        if 'model' in levels:
+            configure_calculation = self.read(models.ConfigureCalculation._meta.db_table)
+            sums = weighted_sums(configure_calculation, LEVELS['model'][1])
+            self.write('model', weighted_averages(sums))
+
+            self.timings['model'] = time.perf_counter() - started
+            started = time.perf_counter()
+
+        upper_levels = [level for level in ('plant', 'base', 'company') if level in levels]
+
+        if upper_levels:
+            summary_model_statistic = self.read(models.SummaryModelStatistic._meta.db_table)
+            sums = weighted_sums(summary_model_statistic, LEVELS['plant'][1], dropna=False)
+
+            self.timings['read'] = time.perf_counter() - started
+            started = time.perf_counter()
+
+            for level in upper_levels:
+                keys = LEVELS[level][1]
+                level_sums = sums.dropna(subset=keys).reset_index(drop=True) if level == 'plant' \
+                    else sums.groupby(keys, as_index=False)[WEIGHTED_COLUMNS].sum()
+                self.write(level, weighted_averages(level_sums))
+
+                self.timings[level] = time.perf_counter() - started
+                started = time.perf_counter()
+
+        for level, seconds in self.timings.items():
+            REGISTRY.add('StatisticRollup %s' % level, seconds, rows=sum(self.counts.get(level, ())))
+
+        return self.timings
@@ -0,0 +1,449 @@
+import codecs
+import csv
+import os
+import re
+import zipfile
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import chain, islice
+from xml.sax.saxutils import escape
+
+from django.apps import apps
+from django.shortcuts import Http404
+
+# encodings tried in turn for csv uploads, on a sample of this many leading bytes
+CSV_ENCODINGS = ('utf-8-sig', 'gbk')
+CSV_SAMPLE_SIZE = 1 << 20
+
+# a choice cell matching no display value, leaves the field unset
+NO_CHOICE = object()
+
+# csv text taken as numbers
+INTEGER = re.compile(r'^-?\d+$')
+DECIMAL = re.compile(r'^-?(\d+\.\d*|\.\d+)([eE][-+]?\d+)?$')
+
+# parts of a one-sheet workbook besides the sheet itself
+XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="xl/workbook.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+     '</Relationships>'),
+)
+
+# characters xml does not allow
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _number(value):
+    """ Whole floats as int, like pyexcel's get_array(). """
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+
+    return value
+
+
+def _csv_cell(value: str):
+    """ Numbers detected like pyexcel's get_array(), other text as is. """
+    if INTEGER.match(value):
+        return int(value)
+
+    if DECIMAL.match(value):
+        return _number(float(value))
+
+    return value
+
+
+class SheetReader:
+    """ Rows of the first sheet of an uploaded file, read lazily.
+
+    Rows come as lists like pyexcel's get_array(): empty cells are '', rows are
+    padded to the widest row so far. Every iteration reads the file again, so
+    parsers take one pass, see SheetSchema.split(). xlsx is streamed by openpyxl
+    in read-only mode, csv line by line; xlrd reads a whole xls sheet, which is
+    limited to 65536 rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.extension = os.path.splitext(path)[1].lower()
+        self._length = None
+        self._encoding = None
+
+        if self.extension not in ('.xlsx', '.xlsm', '.xls', '.csv'):
+            raise Http404('无法识别的文件格式 %s.' % self.extension)
+
+    def __iter__(self):
+        if self.extension == '.xls':
+            rows = self._xls_rows()
+        elif self.extension == '.csv':
+            rows = self._csv_rows()
+        else:
+            rows = self._xlsx_rows()
+
+        width = 0
+        length = 0
+
+        for row in rows:
+            width = max(width, len(row))
+            length += 1
+            yield row + [''] * (width - len(row))
+
+        self._length = length
+
+    def __len__(self):
+        """ Number of rows, known after a full pass, counted with one more pass otherwise. """
+        if self._length is None:
+            sum(1 for _ in self)
+
+        return self._length
+
+    def row_total(self):
+        """ Number of rows without reading them, None when unknown.
+
+        Known after a full pass, otherwise taken from the sheet dimension of
+        xlsx or the row count of xls; csv rows are only known once read.
+        """
+        if self._length is not None or self.extension == '.csv':
+            return self._length
+
+        if self.extension == '.xls':
+            import xlrd
+
+            workbook = xlrd.open_workbook(self.path, on_demand=True)
+
+            try:
+                return workbook.sheet_by_index(0).nrows
+            finally:
+                workbook.release_resources()
+
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+
+        try:
+            return workbook.worksheets[0].max_row
+        finally:
+            if hasattr(workbook, 'close'):
+                workbook.close()
+            else:
+                workbook._archive.close()
+
+    def _xlsx_rows(self):
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+
+        try:
+            for cells in workbook.worksheets[0].iter_rows():
+                yield ['' if cell.value is None else cell.value for cell in cells]
+        finally:
+            # read-only workbooks keep the file open until closed
+            if hasattr(workbook, 'close'):
+                workbook.close()
+            else:
+                workbook._archive.close()
+
+    def _xls_rows(self):
+        import xlrd
+
+        workbook = xlrd.open_workbook(self.path, on_demand=True)
+
+        try:
+            sheet = workbook.sheet_by_index(0)
+
+            for index in range(sheet.nrows):
+                row = []
+
+                for cell in sheet.row(index):
+                    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                        row.append('')
+                    elif cell.ctype == xlrd.XL_CELL_DATE:
+                        row.append(xlrd.xldate.xldate_as_datetime(cell.value, workbook.datemode))
+                    elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                        row.append(bool(cell.value))
+                    else:
+                        row.append(_number(cell.value))
+
+                yield row
+        finally:
+            workbook.release_resources()
+
+    def _csv_encoding(self) -> str:
+        """ First encoding of CSV_ENCODINGS the leading CSV_SAMPLE_SIZE bytes decode with. """
+        if self._encoding is None:
+            with open(self.path, 'rb') as csv_file:
+                sample = csv_file.read(CSV_SAMPLE_SIZE)
+                final = not csv_file.read(1)
+
+            for encoding in CSV_ENCODINGS:
+                try:
+                    # a character cut by the end of the sample is left pending
+                    codecs.getincrementaldecoder(encoding)().decode(sample, final=final)
+
+                except UnicodeDecodeError:
+                    continue
+
+                self._encoding = encoding
+                break
+
+            else:
+                raise Http404('无法识别的文件编码.')
+
+        return self._encoding
+
+    def _csv_rows(self):
+        with open(self.path, encoding=self._csv_encoding(), newline='') as csv_file:
+            for row in csv.reader(csv_file):
+                yield [_csv_cell(cell) for cell in row]
+
+
+class _Pipe:
+    """ Unseekable file keeping what zipfile writes until taken. """
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _column_letter(index: int) -> str:
+    """ Column name of a 0-based column index: A, ..., Z, AA, ... """
+    letters = ''
+    index += 1
+
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+
+    return letters
+
+
+def _xlsx_cell(reference: str, value) -> str:
+    """ Cell element of a value, numbers as numbers & anything else as inline text; '' for an empty cell. """
+    if value is None or value == '':
+        return ''
+
+    if isinstance(value, bool):
+        return '<c r="%s" t="b"><v>%d</v></c>' % (reference, value)
+
+    if isinstance(value, (int, float, Decimal)) and value == value and value not in (float('inf'), float('-inf')):
+        return '<c r="%s"><v>%s</v></c>' % (reference, value)
+
+    return '<c r="%s" t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % (
+        reference, escape(XML_ILLEGAL.sub('', str(value))))
+
+
+def stream_xlsx(rows, chunk_rows=500):
+    """ Bytes of a one-sheet xlsx workbook of rows, yielded every chunk_rows rows.
+
+    The zip is written as it goes, with data descriptors instead of sizes, so
+    neither the sheet nor the file is ever held whole; the first bytes come
+    before the first row is read.
+    """
+    pipe = _Pipe()
+    letters = []
+
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, text in XLSX_PARTS:
+            archive.writestr(name, text)
+
+        yield pipe.take()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+
+            for index, row in enumerate(rows, 1):
+                letters.extend(_column_letter(column) for column in range(len(letters), len(row)))
+                cells = ''.join(_xlsx_cell('%s%d' % (letter, index), value) for letter, value in zip(letters, row))
+                sheet.write(('<row r="%d">%s</row>' % (index, cells)).encode())
+
+                if index % chunk_rows == 0:
+                    yield pipe.take()
+
+            sheet.write(b'</sheetData></worksheet>')
+
+    yield pipe.take()
+
+
+def normalize_header(cell) -> str:
+    """ Header cell as the parsers compare it. """
+    return str(cell).strip().upper()
+
+
+class SheetSchema:
+    """ Header spec of an upload sheet, compiled once.
+
+    Every spec is a dict like the parsers' *_HEADER entries: ex_header, r_offset,
+    in_header or field_name, optionally model_name, skip, match_display and a
+    convert callable. Headers are hashed by their normalised text, display
+    values of choice fields are reversed into dicts, and every column gets a
+    converter, so a located sheet turns each row into field dicts in one pass.
+    Values in empty (by model name, '' by default) become None.
+    """
+
+    def __init__(self, header: list, model_name: str = None, empty: dict = None):
+        self.header = header
+        self.headers = [normalize_header(spec['ex_header']) for spec in header]
+        self.keys = [
+            (spec.get('model_name', model_name).lower(), spec.get('field_name', spec.get('in_header')))
+            for spec in header
+        ]
+        self.model_names = list(OrderedDict.fromkeys(key[0] for key in self.keys))
+
+        # normalised header -> indexes of the specs it names
+        self.header_map = dict()
+
+        for index, text in enumerate(self.headers):
+            self.header_map.setdefault(text, []).append(index)
+
+        empty = empty or dict()
+        self.converters = [
+            self.converter(spec, model, field, empty.get(model, ('', )))
+            for spec, (model, field) in zip(header, self.keys)
+        ]
+
+    @staticmethod
+    def converter(spec: dict, model_name: str, field_name: str, empty: tuple):
+        """ Cell -> field value of one spec. """
+        if spec.get('match_display'):
+            choice = getattr(apps.get_model('costsummary', model_name), field_name + '_choice')
+            display = dict()
+
+            for int_val, str_val in choice:
+                display.setdefault(str_val.upper(), int_val)
+
+            def convert(value):
+                if isinstance(value, str):
+                    return display.get(value.strip().upper(), NO_CHOICE)
+
+                return NO_CHOICE
+
+            return convert
+
+        convert = spec.get('convert')
+
+        def convert_cell(value):
+            if value in empty:
+                return None
+
+            return convert(value) if convert else value
+
+        return convert_cell
+
+    def locate(self, matrix) -> 'SheetLayout':
+        """ Find every header, rows are read up to the one completing them. """
+        cols = [None] * len(self.header)
+        rows = [None] * len(self.header)
+        missing = len(self.header)
+
+        for i, row in enumerate(matrix):
+            for j, cell in enumerate(row):
+                for index in self.header_map.get(normalize_header(cell), ()):
+                    if cols[index] is None:
+                        missing -= 1
+
+                    cols[index] = j
+                    rows[index] = i
+
+            if not missing:
+                break
+
+        # check header row
+        data_row = None
+
+        for index, spec in enumerate(self.header):
+            if cols[index] is None:
+                raise Http404(f'数据列{self.headers[index]}没有找到')
+
+            if data_row is not None:
+                if rows[index] - spec['r_offset'] != data_row:
+                    raise Http404('Excel 格式不正确.')
+            else:
+                data_row = rows[index] + spec['r_offset']
+
+        return SheetLayout(self, cols, data_row + 1)
+
+    def split(self, matrix) -> tuple:
+        """ Layout, rows before the data & an iterator of the data rows, from one pass over matrix. """
+        rows = iter(matrix)
+        head = []
+
+        def read():
+            for row in rows:
+                head.append(row)
+                yield row
+
+        layout = self.locate(read())
+        head.extend(islice(rows, max(0, layout.start_row - len(head))))
+
+        return layout, head[:layout.start_row], chain(head[layout.start_row:], rows)
+
+
+class SheetLayout:
+    """ Columns of a schema as located in one sheet. """
+
+    def __init__(self, schema: SheetSchema, cols: list, start_row: int):
+        self.schema = schema
+        self.start_row = start_row
+        self.columns = dict(zip(schema.keys, cols))
+
+        self.cells = [
+            (col, model_name, field_name, convert)
+            for spec, (model_name, field_name), col, convert in zip(schema.header, schema.keys, cols, schema.converters)
+            if not spec.get('skip')
+        ]
+
+    def column(self, field_name: str, model_name: str = None) -> int:
+        """ Column of a field, of the only model by default. """
+        return self.columns[(model_name or self.schema.model_names[0]).lower(), field_name]
+
+    def fields(self, row: list) -> dict:
+        """ Field values of one row by model name. """
+        params = {model_name: dict() for model_name in self.schema.model_names}
+
+        for col, model_name, field_name, convert in self.cells:
+            value = convert(row[col])
+
+            if value is not NO_CHOICE:
+                params[model_name][field_name] = value
+
+        return params
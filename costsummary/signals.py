@@ -0,0 +1,47 @@
+from django.apps import apps
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+
+from .database import configure_connection
+from .metrics import instrument_connection
+from .dependencies import INPUT_FIELDS, input_deleted, input_saved
+from .models import WIDE_SATELLITES
+from .resolvers import EbomCounts, SupplierDirectory, TecMatcher
+from .snapshot import RATE_LOOKUPS, RateSnapshot
+from .wide import ebom_saved, satellite_deleted, satellite_saved
+
+
+def connect_signals():
+    """ Connect connection setup & model receivers, called once from CostsummaryConfig.ready(). """
+    connection_created.connect(configure_connection, dispatch_uid='configure_connection')
+    connection_created.connect(instrument_connection, dispatch_uid='instrument_connection')
+
+    for model_name in RATE_LOOKUPS:
+        model = apps.get_model('costsummary', model_name)
+        post_save.connect(RateSnapshot.invalidate, sender=model, dispatch_uid='rate_snapshot_save_%s' % model_name)
+        post_delete.connect(RateSnapshot.invalidate, sender=model, dispatch_uid='rate_snapshot_delete_%s' % model_name)
+
+    tec_core = apps.get_model('costsummary', 'TecCore')
+    post_save.connect(TecMatcher.invalidate, sender=tec_core, dispatch_uid='tec_matcher_save')
+    post_delete.connect(TecMatcher.invalidate, sender=tec_core, dispatch_uid='tec_matcher_delete')
+
+    for model_name in ('Supplier', 'SupplierDistance'):
+        model = apps.get_model('costsummary', model_name)
+        post_save.connect(SupplierDirectory.invalidate, sender=model, dispatch_uid='supplier_directory_save_%s' % model_name)
+        post_delete.connect(SupplierDirectory.invalidate, sender=model,
+                            dispatch_uid='supplier_directory_delete_%s' % model_name)
+
+    for model_name in INPUT_FIELDS:
+        model = apps.get_model('costsummary', model_name)
+        post_save.connect(input_saved, sender=model, dispatch_uid='calculation_input_save_%s' % model_name)
+        post_delete.connect(input_deleted, sender=model, dispatch_uid='calculation_input_delete_%s' % model_name)
+
+    ebom = apps.get_model('costsummary', 'Ebom')
+    post_save.connect(ebom_saved, sender=ebom, dispatch_uid='ebom_wide_save')
+    post_save.connect(EbomCounts.invalidate, sender=ebom, dispatch_uid='ebom_counts_save')
+    post_delete.connect(EbomCounts.invalidate, sender=ebom, dispatch_uid='ebom_counts_delete')
+
+    for model in WIDE_SATELLITES:
+        post_save.connect(satellite_saved, sender=model, dispatch_uid='ebom_wide_save_%s' % model._meta.object_name)
+        post_delete.connect(satellite_deleted, sender=model,
+                            dispatch_uid='ebom_wide_delete_%s' % model._meta.object_name)
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+import uuid
+from types import MappingProxyType
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+# rate tables & the field combinations they are filtered by
+RATE_LOOKUPS = {
+    'Constants': [('constant_key', )],
+    'VMIRate': [('base', 'whether_repacking')],
+    'InboundSupplierRate': [('base', 'pickup_location')],
+    'TruckRate': [('name', )],
+    'RegionRouteRate': [('related_base', 'region_or_route')],
+    'WhCubePrice': [('km', )],
+    'WaterwayRate': [('start_base', )],
+    'InboundOverseaRate': [('base', 'region')],
+    'InboundCCSupplierRate': [('supplier_duns', )],
+    'AirFreightRate': [('base', 'country')],
+    'PackingFoldingRate': [('packing_type', )],
+}
+
+
+def rate_key(model, **lookup) -> str:
+    """ Lookup fields & values as one string, values prepared like the ORM prepares them. """
+    return json.dumps([
+        [name, None if lookup[name] is None else model._meta.get_field(name).get_prep_value(lookup[name])]
+        for name in sorted(lookup)
+    ], ensure_ascii=False, default=str)
+
+
+class SharedSnapshot:
+    """ Immutable in-memory copy of reference data, shared by the whole process.
+
+    Subclasses read the database in __init__. invalidate() stores a new token in
+    SnapshotGeneration, in the writer's transaction, and every process rebuilds
+    its shared instance on first use once the token it was built under is gone.
+    The TTL setting bounds staleness from writes that skip both the signals and
+    invalidate(), e.g. queryset.update().
+    """
+    ttl_setting = 'RATE_SNAPSHOT_TTL'
+
+    _current = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.created = time.monotonic()
+        self.token = None
+
+    @classmethod
+    def shared_token(cls) -> str:
+        """ Token of the last invalidate(), in any process; '' before the first. """
+        generation = apps.get_model('costsummary', 'SnapshotGeneration')
+        token = generation.objects.filter(name=cls.__name__).values_list('token', flat=True).first()
+
+        return token or ''
+
+    @classmethod
+    def current(cls):
+        """ Shared snapshot, built on first use & rebuilt once invalidated. """
+        # read before the source tables, a change committed meanwhile leaves a stale token
+        token = cls.shared_token()
+        ttl = getattr(settings, cls.ttl_setting, 60)
+        snapshot = cls._current
+
+        if snapshot is None or snapshot.token != token or time.monotonic() - snapshot.created > ttl:
+            with cls._lock:
+                snapshot = cls._current
+
+                if snapshot is None or snapshot.token != token or time.monotonic() - snapshot.created > ttl:
+                    snapshot = cls()
+                    snapshot.token = token
+                    cls._current = snapshot
+
+        return snapshot
+
+    @classmethod
+    def invalidate(cls, **kwargs):
+        """ Drop the snapshot of every process; also usable as a signal receiver. """
+        generation = apps.get_model('costsummary', 'SnapshotGeneration')
+        token = uuid.uuid4().hex
+        cls._current = None
+
+        if not generation.objects.filter(name=cls.__name__).update(token=token):
+            try:
+                with transaction.atomic():
+                    generation.objects.create(name=cls.__name__, token=token)
+            except IntegrityError:
+                # created by another process meanwhile
+                generation.objects.filter(name=cls.__name__).update(token=token)
+
+
+class RateSnapshot(SharedSnapshot):
+    """ Rate tables, looked up like model.objects.filter(**lookup).first().
+
+    The row with the lowest primary key wins and lookup values are prepared like
+    the ORM prepares them. Invalidated on post_save / post_delete of any rate
+    model and by the upload loaders.
+    """
+
+    def __init__(self):
+        super().__init__()
+        indexes = dict()
+
+        for model_name, lookups in RATE_LOOKUPS.items():
+            model = apps.get_model('costsummary', model_name)
+            rows = list(model.objects.order_by('pk'))
+
+            for fields in lookups:
+                fields = tuple(sorted(fields))
+                index = dict()
+
+                for row in rows:
+                    index.setdefault(tuple(getattr(row, name) for name in fields), row)
+
+                indexes[(model, fields)] = MappingProxyType(index)
+
+        self._indexes = MappingProxyType(indexes)
+
+    def first(self, model, **lookup):
+        """ First row by primary key matching all lookup fields, or None. """
+        fields = tuple(sorted(lookup))
+        index = self._indexes[(model, fields)]
+
+        key = tuple(
+            None if lookup[name] is None else model._meta.get_field(name).get_prep_value(lookup[name])
+            for name in fields
+        )
+
+        return index.get(key)
@@ -1,3 +1,1261 @@
-from django.test import TestCase
+import contextlib
+import io
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.shortcuts import Http404
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import jobs, models, statistic
+from .admin import AEbomEntryAdmin, UploadHandlerAdmin
+from .benchmarks import pipeline, query_plans
+from .benchmarks.dataset import TA_EBOM_COLUMNS, create_ta_ebom, generate
+from .bulk import bulk_upsert, read_frame
+from .database import reporting_alias
+from .dependencies import consumers, mark_dirty
+from .engine import CALCULATED_FIELDS, BatchCostEngine
+from .loader import (SATELLITE_MODELS, WIDE_SATELLITE_MODELS, EbomBulkLoader, LoadError, WideTableLoader,
+                     replace_configures)
+from .metrics import REGISTRY, timer
+from .rollup import STATISTIC_FIELDS, StatisticRollup
+from .resolvers import EbomCounts, SupplierDirectory, TecMatcher
+from .sheets import SheetReader, SheetSchema, stream_xlsx
+from .snapshot import RATE_LOOKUPS, RateSnapshot, rate_key
+from .wide import attach_satellites, refresh_wide
 
 # Create your tests here.
+
+
+def synthetic_labels(labels=1, parts=48):
+    """ Synthetic dataset, loaded & wide-uploaded like the pipeline benchmark does; parts are left dirty. """
+    request = pipeline.admin_request()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        dataset = generate(labels, parts)
+        AEbomEntryAdmin(models.AEbomEntry, admin.site).load(
+            request, models.AEbomEntry.objects.filter(id__in=[entry.id for entry in dataset.entries]))
+
+        for label in dataset.labels:
+            UploadHandlerAdmin(models.UploadHandler, admin.site).parse_wide(dataset.wide_matrix(label), label, veh_pt=1)
+
+    return dataset
+
+
+def calculated_values(calc_object) -> list:
+    return [getattr(calc_object, name) for name in CALCULATED_FIELDS]
+
+
+class EbomChangelistQueryTest(TestCase):
+    """ Wide table changelist issues as many queries for a short page as for a full one. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.short_label = models.NominalLabelMapping.objects.create(value='SHORT 2018', plant_code='SHJQ')
+        cls.full_label = models.NominalLabelMapping.objects.create(value='FULL 2018', plant_code='SHJQ')
+
+        for label, count in ((cls.short_label, 2), (cls.full_label, 20)):
+            models.Ebom.objects.bulk_create([
+                models.Ebom(label=label, upc='U', fna='F', part_number='P%d' % i, quantity=1)
+                for i in range(count)
+            ])
+
+        ebom_objects = list(models.Ebom.objects.all())
+
+        for related_model in models.WIDE_SATELLITES:
+            related_model.objects.bulk_create([related_model(bom=ebom_object) for ebom_object in ebom_objects])
+
+        refresh_wide()
+
+        models.EbomConfiguration.objects.bulk_create([
+            models.EbomConfiguration(bom=ebom_object, quantity=quantity)
+            for ebom_object in ebom_objects for quantity in (1, 3)
+        ])
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.login(username='admin', password='password')
+        EbomCounts.invalidate()
+        EbomCounts.current()
+
+    def changelist_queries(self, label):
+        url = reverse('admin:costsummary_ebom_changelist') + '?label__id__exact=%d' % label.pk
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_constant_queries(self):
+        self.assertEqual(self.changelist_queries(self.short_label), self.changelist_queries(self.full_label))
+
+    def test_max_configuration_quantity(self):
+        model_admin = admin.site._registry[models.Ebom]
+        request = RequestFactory().get(reverse('admin:costsummary_ebom_changelist'))
+        request.user = User.objects.get(username='admin')
+
+        ebom_object = model_admin.get_queryset(request).get(pk=models.Ebom.objects.first().pk)
+        self.assertEqual(model_admin.get_quantity(ebom_object), 3)
+
+
+class KeysetPaginationTest(TestCase):
+    """ Changelist pages follow each other by key and are counted from EbomCounts. """
+
+    @classmethod
+    def setUpTestData(cls):
+        labels = [models.NominalLabelMapping.objects.create(value='KEY %d' % i, plant_code='SHJQ') for i in range(2)]
+
+        models.Ebom.objects.bulk_create([
+            models.Ebom(label=label, upc='U', fna='F', part_number='K%d' % i, quantity=1, veh_pt=1 + i % 2)
+            for i in range(7) for label in labels + [None]
+        ])
+        refresh_wide()
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.login(username='admin', password='password')
+        EbomCounts.invalidate()
+
+        self.model_admin = admin.site._registry[models.Ebom]
+        self.list_per_page = self.model_admin.list_per_page
+        self.model_admin.list_per_page = 5
+
+    def tearDown(self):
+        self.model_admin.list_per_page = self.list_per_page
+
+    def changelist(self, query_string):
+        response = self.client.get(reverse('admin:costsummary_ebom_changelist') + query_string)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_walk(self):
+        expected = [ebom_object.pk for ebom_object in sorted(
+            models.Ebom.objects.all(), key=lambda ebom_object: (ebom_object.label_id or 0, ebom_object.pk))]
+
+        pages = [self.changelist('?')]
+
+        while pages[-1].next_url:
+            pages.append(self.changelist(pages[-1].next_url))
+
+        self.assertEqual([ebom_object.pk for cl in pages for ebom_object in cl.result_list], expected)
+        self.assertEqual(len(pages), 5)
+        self.assertIsNone(pages[0].previous_url)
+
+        # and back again
+        backward = [pages[-1]]
+
+        while backward[-1].previous_url:
+            backward.append(self.changelist(backward[-1].previous_url))
+
+        self.assertEqual([ebom_object.pk for cl in reversed(backward) for ebom_object in cl.result_list], expected)
+
+    def test_count(self):
+        label = models.NominalLabelMapping.objects.get(value='KEY 0')
+
+        with CaptureQueriesContext(connection) as context:
+            cl = self.changelist('?label__id__exact=%d&veh_pt__exact=1' % label.pk)
+
+        self.assertEqual(cl.result_count, 4)
+        self.assertFalse(any('COUNT(' in query['sql'] and 'GROUP BY' not in query['sql'] for query in context))
+
+        models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='K9', veh_pt=1)
+        self.assertEqual(self.changelist('?label__id__exact=%d&veh_pt__exact=1' % label.pk).result_count, 5)
+
+    def test_invalid_key(self):
+        response = self.client.get(reverse('admin:costsummary_ebom_changelist') + '?after=x-y')
+        self.assertEqual(response.status_code, 302)
+
+
+class RateSnapshotTest(TestCase):
+    """ The snapshot answers like filter().first() and is rebuilt once any process invalidates it. """
+
+    def setUp(self):
+        self.vmi_rates = [models.VMIRate.objects.create(base=1, whether_repacking=True, rate=rate) for rate in (3, 2)]
+        models.Constants.objects.create(constant_key='美元汇率', value_type=2, constant_value_float=6.5)
+
+    def test_lookup(self):
+        rates = RateSnapshot()
+
+        # first row by primary key, lookup values prepared like the ORM prepares them
+        self.assertEqual(rates.first(models.VMIRate, base='1', whether_repacking=1), self.vmi_rates[0])
+        self.assertEqual(models.VMIRate.objects.filter(base='1', whether_repacking=1).first(), self.vmi_rates[0])
+        self.assertIsNone(rates.first(models.VMIRate, base=1, whether_repacking=False))
+        self.assertEqual(rates.first(models.Constants, constant_key='美元汇率').constant_value_float, 6.5)
+
+        self.assertEqual(rate_key(models.VMIRate, base='1', whether_repacking=1),
+                         rate_key(models.VMIRate, whether_repacking=True, base=1))
+        self.assertNotEqual(rate_key(models.VMIRate, base=1, whether_repacking=True),
+                            rate_key(models.VMIRate, base=1, whether_repacking=False))
+
+    def test_invalidate(self):
+        rates = RateSnapshot.current()
+        self.assertIs(RateSnapshot.current(), rates)
+
+        # saved in this process
+        self.vmi_rates[0].delete()
+        rates = RateSnapshot.current()
+        self.assertEqual(rates.first(models.VMIRate, base=1, whether_repacking=True), self.vmi_rates[1])
+
+        # invalidated by another process
+        models.Constants.objects.update(constant_value_float=7)
+        self.assertIs(RateSnapshot.current(), rates)
+        models.SnapshotGeneration.objects.filter(name='RateSnapshot').update(token='other')
+        self.assertEqual(RateSnapshot.current().first(models.Constants, constant_key='美元汇率').constant_value_float, 7)
+
+    def test_save_reads_snapshot(self):
+        RateSnapshot.current()
+        calc_object = models.InboundCalculation()
+
+        # only the invalidation token is read
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(calc_object._constant('美元汇率'), 6.5)
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn(models.SnapshotGeneration._meta.db_table, queries[0]['sql'])
+
+        # saved by another process
+        models.Constants.objects.update(constant_value_float=7)
+        models.SnapshotGeneration.objects.filter(name='RateSnapshot').update(token='other')
+        self.assertEqual(calc_object._constant('美元汇率'), 7)
+
+        with self.assertRaises(models.Constants.DoesNotExist):
+            calc_object._constant('欧元汇率')
+
+
+class BatchCostEngineTest(TestCase):
+    """ Batch recalculation stores what the per-object path calculates from the committed rows. """
+
+    def setUp(self):
+        self.dataset = synthetic_labels()
+        self.label = self.dataset.labels[0]
+
+    def assertMatchesOrm(self, calc_objects):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for calc_object in calc_objects:
+                fresh = models.InboundCalculation.objects.get(pk=calc_object.pk)
+                fresh.calculate()
+                self.assertEqual(calculated_values(calc_object), calculated_values(fresh), calc_object.bom.part_number)
+
+    def test_rate_changed_elsewhere(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            BatchCostEngine().recalculate_dirty()
+
+        before = {calc_object.pk: calculated_values(calc_object) for calc_object in models.InboundCalculation.objects.all()}
+        RateSnapshot.current()
+
+        # saved by another process: flags the consumers & invalidates, leaves this process' snapshot as it is
+        key = 'Milkrun管理费系数'
+        models.Constants.objects.filter(constant_key=key).update(constant_value_float=0.5)
+        models.SnapshotGeneration.objects.filter(name='RateSnapshot').update(token='other')
+        flagged = mark_dirty(consumers(models.Constants, {rate_key(models.Constants, constant_key=key)}))
+        self.assertGreater(flagged, 0)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(BatchCostEngine().recalculate_dirty(), flagged)
+
+        calc_objects = list(models.InboundCalculation.objects.select_related('bom'))
+        self.assertFalse(any(calc_object.dirty for calc_object in calc_objects))
+        self.assertTrue(any(calculated_values(calc_object) != before[calc_object.pk] for calc_object in calc_objects))
+        self.assertMatchesOrm(calc_objects)
+
+    def test_rates_read_once(self):
+        RateSnapshot.current()
+        rate_tables = [apps.get_model('costsummary', name)._meta.db_table for name in RATE_LOOKUPS]
+
+        with CaptureQueriesContext(connection) as queries, contextlib.redirect_stdout(io.StringIO()):
+            BatchCostEngine(batch_size=10).recalculate(self.label)
+
+        self.assertEqual([query['sql'] for query in queries
+                          if any('"%s"' % table in query['sql'] for table in rate_tables)], [])
+
+    def test_same_as_save(self):
+        # parts without package, address & buyer, in costed & skipped modes
+        for i, (incoterm, operation) in enumerate(((1, 1), (1, 2), (3, 1))):
+            ebom_object = models.Ebom.objects.create(label=self.label, upc='U', fna='F', part_number='BARE%d' % i,
+                                                     quantity=2)
+            models.InboundMode.objects.create(bom=ebom_object, logistics_incoterm_mode=incoterm, operation_mode=operation)
+            models.InboundCalculation.objects.create(bom=ebom_object)
+
+        # a veh value set by hand is kept on a part the calculation skips
+        manual = models.InboundCalculation.objects.get(bom__part_number='BARE2')
+        models.InboundCalculation.objects.filter(pk=manual.pk).update(inbound_ttl_veh=123.0)
+
+        def stored():
+            return (
+                {calc_object.pk: calculated_values(calc_object) for calc_object in models.InboundCalculation.objects.all()},
+                set(models.RateConsumption.objects.values_list('bom_id', 'table', 'key')),
+            )
+
+        savepoint = transaction.savepoint()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for calc_object in models.InboundCalculation.objects.filter(bom__label=self.label):
+                calc_object.save()
+
+        saved = stored()
+        transaction.savepoint_rollback(savepoint)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(BatchCostEngine().recalculate(self.label), self.dataset.part_count() + 3)
+
+        self.assertEqual(stored(), saved)
+        self.assertEqual(models.InboundCalculation.objects.get(pk=manual.pk).inbound_ttl_veh, 123.0)
+        self.assertTrue(models.InboundCalculation.objects.filter(bom__label=self.label, inbound_ttl_pcs__gt=0).exists())
+
+
+class DirtyMarkingTest(TestCase):
+    """ Saving a calculation input flags only the parts reading the changed fields. """
+
+    def setUp(self):
+        label = models.NominalLabelMapping.objects.create(value='DIRTY 2018', plant_code='SHJQ')
+        self.eboms = []
+
+        for i in range(3):
+            ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='D%d' % i, quantity=1)
+            models.InboundMode.objects.create(bom=ebom_object, logistics_incoterm_mode=3)
+            models.InboundAddress.objects.create(bom=ebom_object)
+            models.InboundCalculation.objects.create(bom=ebom_object)
+            self.eboms.append(ebom_object)
+
+    def dirty(self):
+        return set(models.InboundCalculation.objects.filter(dirty=True).values_list('bom_id', flat=True))
+
+    def test_changed_inputs(self):
+        self.assertEqual(self.dirty(), set())
+
+        address = models.InboundAddress.objects.get(bom=self.eboms[0])
+        address.save()
+        self.assertEqual(self.dirty(), set())
+
+        address.city = '上海'
+        address.save()
+        self.assertEqual(self.dirty(), {self.eboms[0].pk})
+
+        ebom_object = models.Ebom.objects.get(pk=self.eboms[1].pk)
+        ebom_object.structure_node = 'N'
+        ebom_object.save()
+        self.assertEqual(self.dirty(), {self.eboms[0].pk})
+
+        ebom_object.quantity = 4
+        ebom_object.save()
+        self.assertEqual(self.dirty(), {self.eboms[0].pk, self.eboms[1].pk})
+
+    def test_recalculate_dirty(self):
+        models.Ebom.objects.filter(pk=self.eboms[2].pk).update(quantity=2)
+        models.InboundCalculation.objects.filter(bom=self.eboms[2]).update(dirty=True, ddp_pcs=None)
+
+        self.assertEqual(BatchCostEngine().recalculate_dirty(), 1)
+        self.assertEqual(self.dirty(), set())
+        self.assertEqual(models.InboundCalculation.objects.get(bom=self.eboms[2]).ddp_pcs, 0)
+
+    def test_rate_consumers(self):
+        constant = models.Constants.objects.create(constant_key='美元汇率', value_type=2, constant_value_float=6.5)
+        models.InboundCalculation.objects.update(consumption_recorded=True)
+        models.RateConsumption.objects.create(
+            bom=self.eboms[0], table='Constants', key=rate_key(models.Constants, constant_key='美元汇率'))
+
+        constant = models.Constants.objects.get(pk=constant.pk)
+        constant.constant_value_float = 7
+        constant.save()
+        self.assertEqual(self.dirty(), {self.eboms[0].pk})
+
+        models.InboundCalculation.objects.filter(bom=self.eboms[2]).update(consumption_recorded=False)
+        constant.constant_key = '欧元汇率'
+        constant.save()
+        self.assertEqual(self.dirty(), {self.eboms[0].pk, self.eboms[2].pk})
+
+
+class RateImpactAdminTest(TestCase):
+    """ A rate edit is confirmed with the parts reading its stored & submitted keys before it is saved. """
+
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+        label = models.NominalLabelMapping.objects.create(value='RATE 2018', plant_code='SHJQ')
+        self.eboms = [models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='R%d' % i)
+                      for i in range(3)]
+        models.InboundCalculation.objects.bulk_create([
+            models.InboundCalculation(bom=ebom_object, consumption_recorded=True) for ebom_object in self.eboms])
+
+        for ebom_object, location in zip(self.eboms, ('OLD', 'NEW')):
+            models.RateConsumption.objects.create(bom=ebom_object, table='InboundSupplierRate', key=rate_key(
+                models.InboundSupplierRate, base=0, pickup_location=location))
+
+        self.rate = models.InboundSupplierRate.objects.create(base=0, pickup_location='OLD', supplier='S')
+        models.InboundCalculation.objects.update(dirty=False)
+
+    def post(self, url, **extra):
+        data = {'base': 0, 'pickup_location': 'NEW', 'supplier': 'S', '_save': 'Save'}
+        data.update(extra)
+
+        return self.client.post(url, data)
+
+    def test_change(self):
+        url = reverse('admin:costsummary_inboundsupplierrate_change', args=(self.rate.pk, ))
+        response = self.post(url)
+
+        self.assertEqual(response.context['impact'], 2)
+        self.assertContains(response, '<input type="hidden" name="pickup_location" value="NEW" />', html=True)
+        self.assertEqual(models.InboundSupplierRate.objects.get().pickup_location, 'OLD')
+        self.assertFalse(models.InboundCalculation.objects.filter(dirty=True).exists())
+
+        self.assertEqual(self.post(url, _confirm_impact='1').status_code, 302)
+        self.assertEqual(models.InboundSupplierRate.objects.get().pickup_location, 'NEW')
+        self.assertEqual(set(models.InboundCalculation.objects.filter(dirty=True).values_list('bom_id', flat=True)),
+                         {self.eboms[0].pk, self.eboms[1].pk})
+
+    def test_add(self):
+        response = self.post(reverse('admin:costsummary_inboundsupplierrate_add'))
+
+        self.assertEqual(response.context['impact'], 1)
+        self.assertEqual(models.InboundSupplierRate.objects.count(), 1)
+
+
+class SheetReaderTest(TestCase):
+    """ Streamed rows look like get_array() rows. """
+
+    def test_csv(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+
+        with os.fdopen(handle, 'w', encoding='gbk', newline='') as csv_file:
+            csv_file.write('零件,数量,费率\r\nP1,2,1.50\r\nP2\r\n')
+
+        sheet = SheetReader(path)
+        rows = [['零件', '数量', '费率'], ['P1', 2, 1.5], ['P2', '', '']]
+
+        # rows of a csv are only known once read
+        self.assertIsNone(sheet.row_total())
+        self.assertEqual(list(sheet), rows)
+        self.assertEqual(sheet.row_total(), 3)
+        self.assertEqual(list(sheet), rows)
+        self.assertEqual(len(sheet), 3)
+
+        # encoding told from a sample ending within a character
+        with mock.patch('costsummary.sheets.CSV_SAMPLE_SIZE', 3):
+            self.assertEqual(list(SheetReader(path)), rows)
+
+    def test_xlsx_total(self):
+        import openpyxl
+
+        handle, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        workbook = openpyxl.Workbook()
+
+        for row in (['P/N', 'DUNS'], ['P1', 'D1'], ['P2', None]):
+            workbook.active.append(row)
+
+        workbook.save(path)
+
+        sheet = SheetReader(path)
+        self.assertEqual(sheet.row_total(), 3)
+        self.assertEqual(list(sheet), [['P/N', 'DUNS'], ['P1', 'D1'], ['P2', '']])
+
+
+class SheetSchemaTest(TestCase):
+    """ Compiled header spec locates its columns & converts rows in one pass. """
+
+    HEADER = [
+        {'r_offset': 0, 'ex_header': 'P/N', 'in_header': 'part_number', 'skip': True},
+        {'r_offset': 0, 'ex_header': 'DUNS', 'in_header': 'duns'},
+        {'r_offset': 0, 'ex_header': 'SGM\'s Transport Duty', 'in_header': 'sgm_transport_duty',
+         'match_display': True},
+    ]
+
+    def test_fields(self):
+        schema = SheetSchema(self.HEADER, 'UnsortedInboundTCS')
+        matrix = [
+            ['title'],
+            ['', ' sgm\'s transport duty ', 'p/n', 'Duns'],
+            ['', ' 从中转库至sgm厂区', 'P1', ''],
+            ['', 'unknown', 'P2', 'D2'],
+        ]
+
+        layout = schema.locate(matrix)
+        self.assertEqual(layout.start_row, 2)
+        self.assertEqual(layout.column('part_number'), 2)
+        self.assertEqual([layout.fields(row)['unsortedinboundtcs'] for row in matrix[2:]], [
+            {'duns': None, 'sgm_transport_duty': 5},
+            {'duns': 'D2'},
+        ])
+
+    def test_missing_header(self):
+        with self.assertRaises(Http404):
+            SheetSchema(self.HEADER, 'UnsortedInboundTCS').locate([['P/N', 'DUNS']])
+
+    def test_split(self):
+        matrix = [
+            ['title'],
+            ['P/N', 'DUNS', 'SGM\'s Transport Duty'],
+            ['P1', 'D1', ''],
+            ['P2', 'D2', ''],
+        ]
+
+        # a sheet read once
+        layout, head, rows = SheetSchema(self.HEADER, 'UnsortedInboundTCS').split(iter(matrix))
+        self.assertEqual(layout.start_row, 2)
+        self.assertEqual(head, matrix[:2])
+        self.assertEqual(list(rows), matrix[2:])
+
+
+class EbomBulkLoaderTest(TestCase):
+    """ A ta_ebom entry loads into the parts, configurations & satellites the per-row saves created. """
+
+    def setUp(self):
+        self.label = models.NominalLabelMapping.objects.create(value='M1 2019', book='B1', plant_code='SHJQ', model='M1')
+        self.entry = models.AEbomEntry.objects.create(label=self.label, model_year=2019)
+
+        models.TecCore.objects.bulk_create([models.TecCore(tec_id=1, mgo_part_name_list='FRONT BRACKET',
+                                                           common_part_name='BRACKET')])
+        TecMatcher.invalidate()
+
+        suppliers = [
+            models.Supplier.objects.create(duns=duns, name='S', address=address, post_code='0', region='华东',
+                                           province='江苏', district='苏州')
+            for duns, address in (('D1', 'A1'), ('D2', 'A2'), ('D2', 'A3'))
+        ]
+        models.SupplierDistance.objects.create(supplier=suppliers[0], base=0, distance=10)
+        models.UnsortedInboundTCS.objects.create(part_number='P1', duns='D1', program='PRG')
+        models.UnsortedInboundBuyer.objects.create(part_number='P1', part_name='P', duns='D1', buyer='BUY')
+
+        create_ta_ebom()
+        rows = [
+            ('M1', 'P1', 'front bracket', 'H1', 'AR', 'D1', 'S1', 'PKG1', 2),
+            ('M1', 'P1', 'front bracket', 'H1', 'AR', 'D1', 'S1', 'PKG2', 1),
+            ('M1', 'P2', 'bumper', 'H1', 'EM', 'D2', 'S2', 'PKG1', 1),
+            ('M1', 'H1', 'assembly', None, None, 'D3', 'ASM', 'PKG1', 1),
+            ('M2', 'P3', 'other label', None, None, 'D1', 'S1', 'PKG1', 1),
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.executemany('INSERT INTO ta_ebom (%s) VALUES (%s)' % (
+                ', '.join(TA_EBOM_COLUMNS), ', '.join(['%s'] * len(TA_EBOM_COLUMNS))), [
+                ('B1', 2019, 'SHJQ', model, 'U', 'F', part_number, description, '零件', header_part_number, ar_em, 'W',
+                 duns, supplier_name, 'E', 'O', 'V', package, 'S', quantity)
+                for model, part_number, description, header_part_number, ar_em, duns, supplier_name, package, quantity
+                in rows
+            ])
+
+        # a part loaded before, with a satellite of its own
+        self.existing = models.Ebom.objects.create(
+            label=self.label, upc='U', fna='F', part_number='P2', description_en='bumper', description_cn='零件',
+            header_part_number='H1', ar_em_material_indicator=False, work_shop='W', vendor_duns_number='D2',
+            supplier_name='S2', ewo_number='E', model_and_option='O', vpps='V')
+        models.InboundTCS.objects.create(bom=self.existing, program='KEPT')
+
+    def test_load_entry(self):
+        self.assertEqual(EbomBulkLoader().load_entry(self.entry), 2)
+
+        eboms = {ebom_object.part_number: ebom_object for ebom_object in models.Ebom.objects.filter(label=self.label)}
+        self.assertEqual(set(eboms), {'P1', 'P2', 'H1'})
+        self.assertEqual(eboms['P2'].pk, self.existing.pk)
+        # a CharField, stored as get_or_create(ar_em_material_indicator=True) stored it
+        self.assertEqual((eboms['P1'].duns, eboms['P1'].ar_em_material_indicator), ('D1', 'True'))
+
+        for ebom_object in eboms.values():
+            tec = models.TecCore.objects.filter(Q(mgo_part_name_list__contains=ebom_object.description_en.upper()) |
+                                                Q(common_part_name__contains=ebom_object.description_en.upper())).first()
+            self.assertEqual(ebom_object.tec_id, tec.pk if tec else None)
+
+        self.assertEqual(eboms['P1'].tec_id, 1)
+        self.assertEqual(
+            sorted(models.EbomConfiguration.objects.values_list('bom__part_number', 'package', 'quantity')),
+            [('H1', 'PKG1', 1), ('P1', 'PKG1', 2), ('P1', 'PKG2', 1), ('P2', 'PKG1', 1)])
+
+        for model in SATELLITE_MODELS:
+            self.assertEqual(sorted(model.objects.values_list('bom_id', flat=True)),
+                             sorted(ebom_object.pk for ebom_object in eboms.values()), model)
+
+        get = lambda model, part_number: model.objects.get(bom=eboms[part_number])
+        self.assertEqual(get(models.InboundTCS, 'P1').program, 'PRG')
+        self.assertEqual(get(models.InboundTCS, 'P2').program, 'KEPT')
+        self.assertEqual(get(models.InboundBuyer, 'P1').buyer, 'BUY')
+        self.assertEqual(get(models.InboundHeaderPart, 'P1').assembly_supplier, 'ASM')
+        self.assertEqual(get(models.InboundAddress, 'P1').distance_to_shanghai_cc, 10)
+        self.assertEqual(get(models.InboundAddress, 'P1').mfg_location, 'A1')
+        self.assertIsNone(get(models.InboundAddress, 'P2').supplier_matched)
+        self.assertEqual(get(models.InboundCalculation, 'P1').inbound_ttl_pcs, 0)
+
+        # as created & saved one by one
+        for model in (models.InboundTCS, models.InboundBuyer, models.InboundAddress, models.InboundTCSPackage,
+                      models.InboundHeaderPart):
+            for part_number in ('P1', 'H1'):
+                loaded = get(model, part_number)
+                values = [getattr(loaded, field.attname) for field in model._meta.concrete_fields]
+                loaded.save()
+                saved = get(model, part_number)
+                self.assertEqual([getattr(saved, field.attname) for field in model._meta.concrete_fields], values)
+
+
+class WideTableLoaderTest(TestCase):
+    """ Wide table rows are matched to the parts of a label & upserted in bulk. """
+
+    def fields(self, **ebom_fields):
+        params = {model._meta.model_name: dict() for model in WIDE_SATELLITE_MODELS}
+        params['ebom'] = ebom_fields
+        params['inboundpackage'] = {'supplier_pkg_length': 100, 'supplier_pkg_width': 100, 'supplier_pkg_height': 100,
+                                    'supplier_pkg_pcs': 10}
+        return params
+
+    def test_load(self):
+        label = models.NominalLabelMapping.objects.create(value='WIDE 2018', plant_code='SHJQ')
+        existing = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='P1', header_part_number='H1',
+                                              veh_pt=1)
+
+        loader = WideTableLoader(label, 1)
+        ebom_ids = loader.load([
+            ('P1', '', 'U', 'F', self.fields(quantity=2)),
+            ('P2', 'H2', 'U', 'F', self.fields(quantity=1)),
+            ('P2', 'H2', 'U', 'F', self.fields(quantity=3)),
+        ])
+
+        self.assertEqual(ebom_ids[0], existing.pk)
+        self.assertEqual(ebom_ids[1], ebom_ids[2])
+        self.assertEqual(models.Ebom.objects.get(pk=existing.pk).quantity, 2)
+        self.assertEqual(models.Ebom.objects.get(pk=ebom_ids[1]).quantity, 3)
+
+        # a later chunk matches the parts created by an earlier one
+        self.assertEqual(loader.load([('P2', 'H2', 'U', 'F', self.fields(quantity=4))]), ebom_ids[1: 2])
+        self.assertEqual(models.Ebom.objects.count(), 2)
+
+        for model in WIDE_SATELLITE_MODELS:
+            self.assertEqual(model.objects.count(), 2)
+
+        self.assertEqual(models.InboundHeaderPart.objects.get(bom_id=ebom_ids[1]).head_part_number, 'H2')
+        self.assertAlmostEqual(models.InboundPackage.objects.get(bom_id=ebom_ids[1]).supplier_pkg_cubic_veh, 4e-4)
+        self.assertEqual(models.InboundCalculation.objects.filter(dirty=True).count(), 2)
+        self.assertAlmostEqual(models.EbomWide.objects.get(bom_id=ebom_ids[1]).inboundpackage_supplier_pkg_cubic_veh, 4e-4)
+
+    def test_written_meanwhile(self):
+        label = models.NominalLabelMapping.objects.create(value='WIDE 2018', plant_code='SHJQ')
+        bulk_create = models.Ebom.objects.bulk_create
+
+        def insert_first(part_number):
+            """ bulk_create after another process inserted a part of the label. """
+            def insert(*args, **kwargs):
+                models.Ebom.objects.create(label=label, upc='U', fna='F', part_number=part_number, veh_pt=1)
+                return bulk_create(*args, **kwargs)
+
+            return mock.patch.object(models.Ebom.objects, 'bulk_create', side_effect=insert)
+
+        with insert_first('OTHER'):
+            ebom_ids = WideTableLoader(label, 1).load([
+                ('P1', '', 'U', 'F', self.fields()), ('P2', '', 'U', 'F', self.fields())])
+
+        self.assertEqual([models.Ebom.objects.get(pk=pk).part_number for pk in ebom_ids], ['P1', 'P2'])
+
+        # same key as a part of this upload
+        with insert_first('P3'), self.assertRaises(LoadError):
+            WideTableLoader(label, 1).load([('P3', '', 'U', 'F', self.fields())])
+
+    def test_same_as_save(self):
+        label = models.NominalLabelMapping.objects.create(value='WIDE 2018', plant_code='SHJQ')
+        models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='H1', supplier_name='ASM')
+        models.PackingFoldingRate.objects.bulk_create([models.PackingFoldingRate(packing_type='BOX', folding_rate=0.5)])
+        RateSnapshot.invalidate()
+        models.UnsortedInboundBuyer.objects.create(part_number='P1', part_name='P', duns='D1', buyer='B', transport_cost=1.5)
+
+        for program in ('OLD', 'NEW'):
+            models.UnsortedInboundTCS.objects.create(
+                part_number='P1', duns='D1', program=program, supplier_pkg_name='BOX', supplier_pkg_pcs=4,
+                supplier_pkg_length=100, supplier_pkg_width=100, supplier_pkg_height=100)
+
+        # a final package without any size has no cubic
+        fields = self.fields(quantity=2, vendor_duns_number='D1')
+        fields['inboundpackage'] = {'supplier_pkg_name': 'BOX'}
+        fields['inboundoperationalpackage'] = {'sgm_pkg_name': 'BOX'}
+        ebom_id, = WideTableLoader(label, 1).load([('P1', 'H1', 'U', 'F', fields)])
+
+        get = lambda model: model.objects.get(bom_id=ebom_id)
+        self.assertEqual(get(models.InboundTCS).program, 'NEW')
+        self.assertEqual(get(models.InboundBuyer).contract_supplier_transportation_cost, 1.5)
+        self.assertEqual(get(models.InboundHeaderPart).assembly_supplier, 'ASM')
+        self.assertAlmostEqual(get(models.InboundTCSPackage).supplier_pkg_cubic_veh, 5e-4)
+        self.assertEqual(get(models.InboundTCSPackage).supplier_pkg_folding_rate, 0.5)
+        self.assertEqual(get(models.InboundOperationalPackage).sgm_pkg_folding_rate, 0.5)
+        self.assertEqual((get(models.InboundPackage).pkg_folding_rate, get(models.InboundPackage).pkg_cubic_pcs), (0.5, None))
+
+        # save() derives the very same values one part at a time
+        for model in WIDE_SATELLITE_MODELS:
+            if hasattr(model, 'derive'):
+                loaded = get(model)
+                values = [getattr(loaded, field.attname) for field in model._meta.concrete_fields]
+                loaded.save()
+                saved = get(model)
+                self.assertEqual([getattr(saved, field.attname) for field in model._meta.concrete_fields], values)
+
+
+class ConfigureValueTest(TestCase):
+    """ Configure values of uploaded parts replace theirs only. """
+
+    def setUp(self):
+        label = models.NominalLabelMapping.objects.create(value='CONF 2018', plant_code='SHJQ')
+        self.eboms = [
+            models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='C%d' % i) for i in range(2)
+        ]
+
+    def values(self):
+        return set(models.ConfigureValue.objects.values_list('bom_id', 'conf_name', 'value'))
+
+    def test_replace(self):
+        first, second = self.eboms
+        replace_configures({first.pk: {'A': 1, 'B': 2}, second.pk: {'A': 'X'}})
+        replace_configures({first.pk: {'A': None, 'C': 3}})
+
+        self.assertEqual(self.values(), {(first.pk, 'C', '3'), (second.pk, 'A', 'X')})
+
+    def test_import_csv(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+
+        with os.fdopen(handle, 'w', encoding='gbk', newline='') as csv_file:
+            csv_file.write('id,配置 A,B\r\n%d,1.0,\r\n%d,-,2\r\n999,1,1\r\n' % (self.eboms[0].pk, self.eboms[1].pk))
+
+        call_command('import_configures', path, stdout=io.StringIO())
+        self.assertEqual(self.values(), {(self.eboms[0].pk, '配置A', '1'), (self.eboms[1].pk, 'B', '2')})
+
+
+class SupplierDirectoryTest(TestCase):
+    """ Addresses resolve to their first supplier & its first distance to the plant base. """
+
+    def setUp(self):
+        self.suppliers = [
+            models.Supplier.objects.create(duns='D%d' % i, name='S%d' % i, address=address, post_code='0',
+                                           region='华东', province='江苏', district='苏州')
+            for i, address in enumerate(('A1', 'A1', 'W1'))
+        ]
+
+        for supplier_object in self.suppliers:
+            for base, distance in ((0, 10), (1, 20), (1, 30)):
+                models.SupplierDistance.objects.create(supplier=supplier_object, base=base,
+                                                       distance=distance + supplier_object.pk)
+
+    def test_lookup(self):
+        directory = SupplierDirectory.current()
+
+        self.assertEqual(directory.supplier('A1'), self.suppliers[0])
+        self.assertIsNone(directory.supplier('A2'))
+        self.assertEqual(directory.suppliers(['A1', 'W1', 'A2', '']), {'A1': self.suppliers[0], 'W1': self.suppliers[2]})
+        self.assertEqual(directory.distance(self.suppliers[1].pk, 1).distance, 20 + self.suppliers[1].pk)
+        self.assertIs(SupplierDirectory.current(), directory)
+
+        # rebuilt once suppliers change
+        self.suppliers[0].address = 'A0'
+        self.suppliers[0].save()
+        self.assertEqual(SupplierDirectory.current().supplier('A1'), self.suppliers[1])
+
+    def test_address_save(self):
+        label = models.NominalLabelMapping.objects.create(value='DY 2018', plant_code='DY01')
+        ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='A')
+        address = models.InboundAddress.objects.create(bom=ebom_object, mfg_location='A1', warehouse_address='W1')
+
+        first, _, warehouse = self.suppliers
+        self.assertEqual(address.supplier_matched, first)
+        self.assertEqual((address.country, address.city), ('中国', '苏州'))
+        self.assertEqual(address.distance_to_sgm_plant, 20 + first.pk)
+        self.assertEqual(address.distance_to_shanghai_cc, 10 + first.pk)
+        self.assertEqual(address.warehouse_to_sgm_plant, 20 + warehouse.pk)
+
+
+class TecMatcherTest(TestCase):
+    """ The substring index matches descriptions like the ORM lookup Ebom.save() made. """
+
+    def setUp(self):
+        # overlapping names, the lowest tec_id wins; lower case & non ascii letters as sqlite LIKE sees them
+        models.TecCore.objects.bulk_create([
+            models.TecCore(tec_id=tec_id, mgo_part_name_list=mgo_part_name_list, common_part_name=common_part_name)
+            for tec_id, mgo_part_name_list, common_part_name in (
+                (3, 'Rear Bumper', 'BUMPER'),
+                (1, 'FRONT BRACKET ASM; brkt', 'BRACKET ASSEMBLY'),
+                (2, 'BRACKET', 'BRKT'),
+                (4, 'Straße clip; café', 'CLIP'),
+                (5, 'BRACKET_ASM', 'BRACKET 100%'),
+            )
+        ])
+        TecMatcher.invalidate()
+
+    @staticmethod
+    def orm_match(description):
+        tec = models.TecCore.objects.filter(Q(mgo_part_name_list__contains=description.upper()) |
+                                            Q(common_part_name__contains=description.upper())).first()
+        return tec.pk if tec else None
+
+    def test_match(self):
+        descriptions = [
+            'bracket', 'BRKT', 'brkt', 'ASM', 'asm;', 'bumper', 'rear bumper', 'clip', 'STRASSE', 'straße', 'café',
+            'CAFÉ', 'bracket_asm', 'BRACKET%', '100%', '_ASM', 'BRKTBRACKET', 'ASSEMBLYBRACKET', 'BUMPERFRONT', 'ZZZ',
+        ]
+        matcher = TecMatcher.current()
+
+        for description in descriptions:
+            self.assertEqual(matcher.match(description), self.orm_match(description), description)
+
+        self.assertEqual(matcher.match('bracket'), 1)
+        self.assertEqual(matcher.match('bumper'), 3)
+        self.assertEqual(matcher.match('_ASM'), 5)
+        self.assertIsNone(matcher.match('BRKTBRACKET'))
+        self.assertEqual(matcher.match_many(descriptions + ['', None]),
+                         {description: self.orm_match(description) for description in descriptions})
+
+        # rebuilt with the new corpus
+        models.TecCore.objects.filter(tec_id=1).delete()
+        self.assertEqual(TecMatcher.current().match('bracket'), 2)
+
+
+class StatisticReadTest(TestCase):
+    """ The statistic pipeline reads the configured database, here the test one. """
+
+    def test_read_frame(self):
+        for i in range(5):
+            models.NominalLabelMapping.objects.create(value='M%d 2019' % i, plant_code='SY01')
+
+        frame = read_frame('select value from costsummary_nominallabelmapping where plant_code = %s order by id',
+                           ['SY01'], chunksize=2)
+        self.assertEqual(list(frame['value']), ['M%d 2019' % i for i in range(5)])
+        self.assertEqual(list(read_frame('select constant_key, value_type from costsummary_constants').columns),
+                         ['constant_key', 'value_type'])
+
+    def test_configure_statistic(self):
+        label = models.NominalLabelMapping.objects.create(value='M1 2019', plant_code='SY01')
+        ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='A', quantity=2)
+        models.InboundPackage.objects.bulk_create([models.InboundPackage(bom=ebom_object, pkg_cubic_pcs=0.5)])
+        models.InboundAddress.objects.bulk_create([models.InboundAddress(bom=ebom_object, property=1)])
+        refresh_wide([ebom_object.pk])
+        replace_configures({ebom_object.pk: {'C1': 'X'}})
+
+        statistic.conf_calculation(labels=[label])
+        self.assertEqual(list(models.ConfigureCalculation.objects.values_list('value', 'conf_name', 'volume')),
+                         [('M1 2019', 'C1', 1.0)])
+
+
+class StatisticRollupTest(TestCase):
+    """ Every level is averaged by production over its groups; rows without a model year are left out. """
+
+    @staticmethod
+    def statistic(model, production, volume, **keys):
+        return model.objects.create(
+            production=production, volume=volume, inbound_ttl_veh=volume * 10, import_ib=0, dom_ddp_ib=0, dom_fca_ib=0,
+            dom_volume=volume / 2, dom_rate=0, local_volume=volume / 4, local_rate=0, park_volume=0, park_rate=0,
+            **keys)
+
+    def setUp(self):
+        for base, plant_code, value, model_year, production, volume in (
+                ('0', 'SHJQ', 'A', 2019, 1, 10),
+                ('0', 'SHJQ', 'B', 2019, 3, 20),
+                ('0', 'SHJQ2', 'C', 2019, 2, 30),
+                ('1', 'DY01', 'D', 2019, 4, 40),
+                ('1', 'DY01', 'E', None, 10, 1000)):
+            self.statistic(models.SummaryModelStatistic, production, volume, base=base, plant_code=plant_code,
+                           value=value, model_year=model_year)
+
+        for conf_name, model_year, production, volume in (('C1', 2019, 1, 10), ('C2', 2019, 3, 20), ('C3', None, 5, 99)):
+            self.statistic(models.ConfigureCalculation, production, volume, base='0', plant_code='SHJQ', value='A',
+                           conf_name=conf_name, model_year=model_year)
+
+    def assertStatistic(self, statistic_object, production, volume):
+        self.assertEqual(statistic_object.production, production)
+        self.assertAlmostEqual(statistic_object.volume, volume)
+        self.assertAlmostEqual(statistic_object.inbound_ttl_veh, volume * 10)
+        self.assertAlmostEqual(statistic_object.dom_rate, 0.5)
+        self.assertAlmostEqual(statistic_object.local_rate, 0.25)
+        self.assertEqual(statistic_object.park_rate, 0)
+
+    def test_levels(self):
+        rollup = StatisticRollup()
+        rollup.run()
+
+        self.assertEqual(dict(rollup.counts), {'model': (1, 0), 'plant': (3, 0), 'base': (2, 0), 'company': (1, 0)})
+        self.assertStatistic(models.ModelStatistic.objects.get(value='A', model_year=2019), 4, 17.5)
+
+        plants = {(plant.plant_code, plant.model_year): plant for plant in models.PlantStatistic.objects.all()}
+        self.assertEqual(set(plants), {('SHJQ', 2019), ('SHJQ2', 2019), ('DY01', 2019)})
+        self.assertStatistic(plants['SHJQ', 2019], 4, 17.5)
+        self.assertEqual(plants['SHJQ', 2019].base, '0')
+        self.assertStatistic(plants['SHJQ2', 2019], 2, 30)
+
+        self.assertEqual(models.BaseStatistic.objects.count(), 2)
+        self.assertStatistic(models.BaseStatistic.objects.get(base='0', model_year=2019), 6, 130 / 6)
+        self.assertStatistic(models.BaseStatistic.objects.get(base='1', model_year=2019), 4, 40)
+        self.assertStatistic(models.SummaryStatistic.objects.get(company='SGM', model_year=2019), 10, 29)
+
+        # a second run updates the same rows
+        models.SummaryModelStatistic.objects.filter(value='C').update(production=0)
+        rollup = StatisticRollup()
+        rollup.run(('plant', 'company'))
+
+        self.assertEqual(dict(rollup.counts), {'plant': (0, 3), 'company': (0, 1)})
+        self.assertEqual(models.PlantStatistic.objects.get(plant_code='SHJQ2').volume, 0)
+        self.assertStatistic(models.SummaryStatistic.objects.get(), 8, 28.75)
+
+
+class BulkUpsertTest(TestCase):
+    """ One row per key, inserted or updated; a missing key value matches NULL. """
+
+    def frame(self, keys, volume):
+        frame = pd.DataFrame(keys, columns=['model_year', 'value'])
+
+        for name in STATISTIC_FIELDS:
+            frame[name] = float(volume)
+
+        frame['base'] = '0'
+        frame['plant_code'] = 'SHJQ'
+        return frame
+
+    def upsert(self, frame):
+        return bulk_upsert(models.ModelStatistic, frame, ['model_year', 'value'], ['base', 'plant_code'] + STATISTIC_FIELDS)
+
+    def test_counts(self):
+        keys = [(2019, 'A'), (np.nan, 'A'), (2020, 'A'), (2019, 'B')]
+        self.assertEqual(self.upsert(self.frame(keys, 1)), (4, 0))
+        self.assertEqual(self.upsert(self.frame(keys[1:] + [(2021, 'B')], 2)), (1, 3))
+
+        # the last of several rows with the same key wins
+        self.assertEqual(self.upsert(pd.concat(
+            [self.frame([(np.nan, 'A')], 3), self.frame([(np.nan, 'A')], 4)], ignore_index=True)), (0, 1))
+        self.assertEqual(self.upsert(self.frame([], 5)), (0, 0))
+
+        self.assertEqual(
+            sorted(models.ModelStatistic.objects.values_list('model_year', 'value', 'volume'), key=str),
+            sorted([(2019, 'A', 1), (None, 'A', 4), (2020, 'A', 2), (2019, 'B', 2), (2021, 'B', 2)], key=str))
+
+
+class DatabaseProfileTest(TestCase):
+    """ sqlite connections are tuned; reads within a transaction stay on its connection. """
+
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_reporting_alias(self):
+        self.assertTrue(connection.in_atomic_block)
+        self.assertEqual(reporting_alias(), 'default')
+
+
+class EbomWideTest(TestCase):
+    """ Wide table rows follow satellite saves & deletes, and stand in for the satellites when read. """
+
+    def setUp(self):
+        label = models.NominalLabelMapping.objects.create(value='WIDE 2018', plant_code='SHJQ')
+        self.ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='W')
+
+    def wide(self):
+        return models.EbomWide.objects.get(bom=self.ebom_object)
+
+    def test_signals(self):
+        self.assertIsNone(self.wide().inboundheaderpart_pk)
+
+        header = models.InboundHeaderPart.objects.create(bom=self.ebom_object, color='RED')
+        self.assertEqual((self.wide().inboundheaderpart_pk, self.wide().inboundheaderpart_color), (header.pk, 'RED'))
+
+        header.delete()
+        self.assertEqual((self.wide().inboundheaderpart_pk, self.wide().inboundheaderpart_color), (None, None))
+
+        self.ebom_object.delete()
+        self.assertFalse(models.EbomWide.objects.exists())
+
+    def test_save_updates_columns(self):
+        header = models.InboundHeaderPart.objects.create(bom=self.ebom_object, color='RED')
+        models.InboundMode.objects.create(bom=self.ebom_object, logistics_incoterm_mode=3, operation_mode=1)
+        calc_object = models.InboundCalculation.objects.create(bom=self.ebom_object)
+        header.color = 'BLUE'
+
+        with CaptureQueriesContext(connection) as queries:
+            header.save()
+
+        wide_queries = [query['sql'] for query in queries if models.EbomWide._meta.db_table in query['sql']]
+        self.assertEqual(len(wide_queries), 1)
+        self.assertTrue(wide_queries[0].startswith('UPDATE'))
+
+        # same row as a rebuild, bookkeeping fields left out
+        saved = models.EbomWide.objects.values().get()
+        refresh_wide([self.ebom_object.pk])
+        self.assertEqual(models.EbomWide.objects.values().get(), saved)
+        self.assertEqual((saved['inboundheaderpart_color'], saved['inboundcalculation_pk']), ('BLUE', calc_object.pk))
+        self.assertNotIn('inboundcalculation_dirty', saved)
+
+    def test_attach(self):
+        models.InboundMode.objects.bulk_create([models.InboundMode(bom=self.ebom_object, operation_mode=1)])
+        refresh_wide([self.ebom_object.pk])
+
+        display = models.InboundMode.objects.get().get_operation_mode_display()
+        ebom_object, = attach_satellites(models.Ebom.objects.select_related('rel_wide'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(ebom_object.rel_mode.get_operation_mode_display(), display)
+            self.assertFalse(hasattr(ebom_object, 'rel_header'))
+
+
+class WideTableDownloadTest(TestCase):
+    """ The wide table is streamed as a spreadsheet unless csv is asked for. """
+
+    def setUp(self):
+        self.label = models.NominalLabelMapping.objects.create(value='DL 2018', plant_code='SHJQ')
+        models.Ebom.objects.create(label=self.label, upc='U', fna='F', part_number='D<1>', quantity=2)
+        self.url = reverse('dl_wide', args=(self.label.pk, ))
+
+    def test_xlsx(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertIn('.xlsx', response['Content-Disposition'])
+
+        handle, path = tempfile.mkstemp(suffix='.xlsx')
+        self.addCleanup(os.remove, path)
+
+        with os.fdopen(handle, 'wb') as xlsx_file:
+            xlsx_file.write(b''.join(response.streaming_content))
+
+        header, row = SheetReader(path)
+        self.assertEqual(len(header), len(row))
+        self.assertIn('D<1>', row)
+        self.assertIn(2, row)
+
+    def test_first_bytes(self):
+        def rows():
+            raise AssertionError('read before the first bytes')
+            yield
+
+        self.assertTrue(next(stream_xlsx(rows())).startswith(b'PK'))
+
+    def test_csv(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+        self.assertEqual(len(lines), 2)
+        self.assertIn('D<1>', lines[1])
+
+
+class BackgroundJobTest(TestCase):
+    """ Queued jobs are claimed once, run, cancelled or failed with their traceback. """
+
+    def setUp(self):
+        self.steps = []
+        patcher = mock.patch.dict(jobs.HANDLERS, {'test': self.handle})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, progress, fail=False, cancel=False):
+        progress.stage('first', 2)
+        self.steps.append('first')
+
+        if cancel:
+            # requested meanwhile, e.g. from the admin
+            self.assertTrue(jobs.cancel(progress.job_id))
+
+        if fail:
+            raise ValueError('broken sheet')
+
+        progress.stage('second')
+        self.steps.append('second')
+        return 'done'
+
+    def test_claim(self):
+        first, second = jobs.enqueue('test'), jobs.enqueue('test')
+        self.assertEqual(first.status, models.BackgroundJob.QUEUED)
+
+        claimed = jobs.claim(worker='w1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker), (first.pk, models.BackgroundJob.RUNNING, 'w1'))
+        self.assertIsNone(jobs.claim(first.pk, worker='w2'))
+        self.assertEqual(jobs.claim(worker='w2').pk, second.pk)
+        self.assertIsNone(jobs.claim(worker='w3'))
+
+        with self.assertRaises(ValueError):
+            jobs.enqueue('unknown')
+
+    def test_run(self):
+        job = jobs.run(jobs.claim(jobs.enqueue('test').pk).pk)
+
+        self.assertEqual((job.status, job.message, job.stage), (models.BackgroundJob.DONE, 'done', 'second'))
+        self.assertIsNotNone(job.finished)
+        self.assertFalse(jobs.cancel(job.pk))
+
+    def test_cancel_queued(self):
+        job = jobs.enqueue('test')
+        self.assertTrue(jobs.cancel(job.pk))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.BackgroundJob.CANCELLED)
+        self.assertIsNotNone(job.finished)
+        self.assertIsNone(jobs.claim(job.pk))
+        self.assertEqual(self.steps, [])
+
+    def test_cancel_running(self):
+        job = jobs.run(jobs.claim(jobs.enqueue('test', cancel=True).pk).pk)
+
+        self.assertEqual(job.status, models.BackgroundJob.CANCELLED)
+        self.assertTrue(job.cancel_requested)
+        self.assertEqual(self.steps, ['first'])
+
+    def test_failure(self):
+        with self.assertLogs('costsummary.jobs', 'ERROR'):
+            job = jobs.run(jobs.claim(jobs.enqueue('test', fail=True).pk).pk)
+
+        self.assertEqual((job.status, job.stage), (models.BackgroundJob.FAILED, 'first'))
+        self.assertIn('Traceback', job.message)
+        self.assertIn('ValueError: broken sheet', job.message)
+        self.assertIsNotNone(job.finished)
+
+
+class MetricsTest(TestCase):
+    """ Requests, admin actions & timed stages are recorded, flushed to MetricSample and served as JSON. """
+
+    def setUp(self):
+        REGISTRY.take()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def test_timer(self):
+        with timer('count eboms', rows=2) as span:
+            models.Ebom.objects.count()
+            models.Ebom.objects.exists()
+
+        self.assertEqual(span.queries, 2)
+        stat = REGISTRY.snapshot()['count eboms']
+        self.assertEqual((stat['calls'], stat['queries'], stat['rows']), (1, 2, 2))
+
+    def test_timed_stages(self):
+        label = models.NominalLabelMapping.objects.create(value='METRIC 2018', plant_code='SHJQ')
+        ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='M', quantity=1)
+        models.InboundMode.objects.create(bom=ebom_object, logistics_incoterm_mode=3)
+        models.InboundCalculation.objects.create(bom=ebom_object)
+        BatchCostEngine().recalculate(models.Ebom.objects.filter(pk=ebom_object.pk))
+
+        stats = REGISTRY.snapshot()
+        self.assertEqual(stats['BatchCostEngine.recalculate']['rows'], 1)
+        self.assertEqual(stats['InboundCalculation.calculate']['calls'], 2)
+        self.assertEqual(stats['InboundCalculation.save']['calls'], 1)
+
+    def test_requests(self):
+        job = models.BackgroundJob.objects.create(kind='statistic')
+        changelist = reverse('admin:costsummary_backgroundjob_changelist')
+
+        response = self.client.post(changelist, {'action': 'cancel_jobs', '_selected_action': [job.pk]})
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        stats = REGISTRY.snapshot()
+        self.assertIn('request admin:costsummary_backgroundjob_changelist', stats)
+        self.assertGreater(stats['action admin:costsummary_backgroundjob_changelist cancel_jobs']['queries'], 0)
+
+    def test_history(self):
+        REGISTRY.add('parse', 2.0, rows=100)
+        self.assertEqual(REGISTRY.flush(force=True), 1)
+        REGISTRY.add('parse', 1.0, rows=100)
+        REGISTRY.flush(force=True)
+
+        data = self.client.get(reverse('metrics') + '?name=parse').json()
+
+        self.assertEqual([sample['rows_per_second'] for sample in data['samples']], [100, 50])
+        self.assertEqual([(row['name'], row['calls'], row['rows']) for row in data['releases']], [('parse', 2, 200)])
+        self.assertEqual(data['current'], [])
+
+
+class QueryPlanTest(TestCase):
+    """ Every lookup repeated per part or per statistic row is served by an index. """
+
+    def test_no_full_scans(self):
+        for name, queryset in query_plans.hot_queries():
+            plan = query_plans.query_plan(queryset)
+            self.assertEqual(query_plans.full_scans(queryset, plan), [], name)
+
+
+class SyncSchemaTest(TestCase):
+    """ Columns declared after a table was created by syncdb are added, existing rows getting the default. """
+
+    def columns(self, model):
+        with connection.cursor() as cursor:
+            return {column.name for column in
+                    connection.introspection.get_table_description(cursor, model._meta.db_table)}
+
+    def test_dirty(self):
+        label = models.NominalLabelMapping.objects.create(value='SYNC 2018', plant_code='SHJQ')
+        ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='S')
+        models.InboundCalculation.objects.bulk_create([models.InboundCalculation(bom=ebom_object, dirty=True)])
+        field = models.InboundCalculation._meta.get_field('dirty')
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.remove_field(models.InboundCalculation, field)
+
+        self.assertNotIn('dirty', self.columns(models.InboundCalculation))
+
+        output = io.StringIO()
+        call_command('sync_schema', stdout=output)
+
+        self.assertIn('dirty', self.columns(models.InboundCalculation))
+        self.assertIn('1 columns', output.getvalue())
+        self.assertEqual(list(models.InboundCalculation.objects.values_list('dirty', flat=True)), [False])
+        self.assertEqual(mark_dirty(), 1)
+
+    def test_rate_consumption(self):
+        label = models.NominalLabelMapping.objects.create(value='SYNC 2018', plant_code='SHJQ')
+        ebom_object = models.Ebom.objects.create(label=label, upc='U', fna='F', part_number='S')
+        models.InboundCalculation.objects.bulk_create([models.InboundCalculation(bom=ebom_object)])
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(models.RateConsumption)
+            schema_editor.remove_field(
+                models.InboundCalculation, models.InboundCalculation._meta.get_field('consumption_recorded'))
+
+        call_command('sync_schema', stdout=io.StringIO())
+
+        with connection.cursor() as cursor:
+            self.assertIn(models.RateConsumption._meta.db_table, connection.introspection.table_names(cursor))
+            constraints = connection.introspection.get_constraints(cursor, models.RateConsumption._meta.db_table)
+
+        self.assertIn(models.RateConsumption._meta.indexes[0].name, constraints)
+        self.assertIn('consumption_recorded', self.columns(models.InboundCalculation))
+
+        # lookups of existing rows are not recorded, any rate change flags them
+        self.assertEqual(consumers(models.Constants, []).count(), 1)
+
+
+class PipelineBenchmarkTest(TestCase):
+    """ The synthetic dataset goes through every stage, costed in every operation mode. """
+
+    def test_run(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = pipeline.run(labels=2, parts=32, sample=4)
+
+        stages = results['stages']
+        self.assertEqual(list(stages)[-1], 'download_wide_table')
+        self.assertEqual(['statistic.%s' % name for name in pipeline.STATISTIC_STAGES],
+                         [stage for stage in stages if stage.startswith('statistic.')])
+
+        for stage in ('load', 'parse_wide', 'recalculate_label', 'download_wide_table'):
+            self.assertEqual(stages[stage]['rows'], 64, stage)
+
+        self.assertEqual(stages['recalculate_part']['rows'], 4)
+        self.assertIn('InboundCalculation.calculate', stages['recalculate_label']['calls'])
+        self.assertEqual(
+            set(models.InboundMode.objects.values_list('operation_mode', flat=True)), set(range(1, 17)))
+        self.assertTrue(models.InboundCalculation.objects.filter(inbound_ttl_pcs__gt=0).exists())
+        self.assertTrue(models.PlantStatistic.objects.exists())
+
+    def test_compare(self):
+        meta = {'labels': 1, 'parts': 10, 'seed': 0, 'sample': 5}
+        baseline = {'meta': meta, 'stages': {'load': {'seconds': 1.0}, 'parse_wide': {'seconds': 1.0}}}
+        result = {'meta': meta, 'stages': {'load': {'seconds': 2.0}, 'parse_wide': {'seconds': 1.05}}}
+
+        self.assertEqual([(row[0], row[-1]) for row in pipeline.compare(result, baseline)],
+                         [('load', True), ('parse_wide', False)])
+
+        with self.assertRaises(ValueError):
+            pipeline.compare(result, dict(baseline, meta=dict(meta, parts=20)))
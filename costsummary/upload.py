@@ -1,4 +1,8 @@
+from itertools import islice
+
 from . import models
+from .resolvers import SupplierDirectory, TecMatcher
+from .snapshot import RateSnapshot
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 
@@ -10,7 +14,7 @@ def load_initial_tec_num(matrix: list):
     models.TecCore.objects.all().delete()
         # row index
     index = len(matrix)
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         tec_id = row[0]
         common_part_name = row[1].strip()
         mgo = row[2].strip()
@@ -24,6 +28,9 @@ def load_initial_tec_num(matrix: list):
         # save models
         t.save()
 
+    # drop cached tec names
+    TecMatcher.invalidate()
+
     # return loaded row number
     return index
 
@@ -37,7 +44,7 @@ def load_initial_packing_folding_rate(matrix: list):
 
     # row index
     index = len(matrix)
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         packing_type = row[0].strip()
         folding_rate = row[1]
 
@@ -49,6 +56,9 @@ def load_initial_packing_folding_rate(matrix: list):
         # save models
         t.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
     # return loaded row number
     return index
 
@@ -62,7 +72,7 @@ def load_initial_air_freight_rate(matrix: list):
 
     # row index
     index = len(matrix)
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         country = row[0].strip()
         base = row[1].strip()
         rate = row[2]
@@ -77,6 +87,9 @@ def load_initial_air_freight_rate(matrix: list):
         # save models
         t.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
     # return loaded row number
     return index
 
@@ -90,7 +103,7 @@ def load_initial_wh_cube_price(matrix: list):
 
     # row index
     index = 0
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         km = row[0]
         cube_price = row[1]
 
@@ -101,6 +114,10 @@ def load_initial_wh_cube_price(matrix: list):
 
         # save models
         t.save()
+
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
     # return loaded row number
     return index
 
@@ -112,7 +129,7 @@ def load_initial_nl_mapping(matrix: list):
     # delete existed objects
     # models.NominalLabelMapping.objects.all().delete()
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         book = row[0].strip()
         plant_code = row[1].strip()
         model = row[2].strip()
@@ -145,7 +162,7 @@ def load_initial_os_rate(matrix: list):
         if _i >= 0:  # exclude 3rd party
             REV_BASE_CHOICE[_s] = _i
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         region = row[0].strip().upper()
         base = REV_BASE_CHOICE[row[1].strip().upper()]
         cc = row[2].strip().upper()
@@ -193,6 +210,9 @@ def load_initial_os_rate(matrix: list):
         # save models
         i.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
 
 def load_initial_cc_location(matrix: list):
     """ Load cc location. """
@@ -201,7 +221,7 @@ def load_initial_cc_location(matrix: list):
     # delete existed objects
     models.InboundCcLocations.objects.all().delete()
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         cc_group = int(row[0])
         cn_location_name = row[1].strip()
         en_location_name = row[2].strip().upper()
@@ -234,7 +254,7 @@ def load_initial_cc_danger(matrix: list):
     # delete existed objects
     models.InboundDangerPackage.objects.all().delete()
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         from_to_type = int(row[0])
         from_one = row[1].strip().upper()
         to_one = row[2].strip().upper()
@@ -259,7 +279,7 @@ def load_initial_cc_supplier(matrix: list):
     # delete existed objects
     models.InboundCCSupplierRate.objects.all().delete()
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         supplier_duns = row[0]
         supplier_name = row[1].strip()
         pick_up_location = row[2].strip()
@@ -285,6 +305,9 @@ def load_initial_cc_supplier(matrix: list):
         # save models
         s.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
 
 
 def load_initial_supplier_rate(matrix: list):
@@ -299,7 +322,7 @@ def load_initial_supplier_rate(matrix: list):
         if _i >= 0:  # exclude 3rd party
             REV_BASE_CHOICE[_s] = _i
     # row index
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         base = REV_BASE_CHOICE[row[0]]
         pickup_location = row[1].strip() if row[1].strip() else None
         supplier = row[2].strip() if row[2].strip() else None
@@ -323,6 +346,9 @@ def load_initial_supplier_rate(matrix: list):
         # save models
         s.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
 
 def load_initial_distance(matrix: list):
     print("Start loading...")
@@ -380,7 +406,7 @@ def load_initial_distance(matrix: list):
         if _i >= 0:  # exclude 3rd party
             REV_BASE_CHOICE[_s] = _i
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         if not row[3]:  # primary key is the 4-th column (the duns)
             break
 
@@ -491,6 +517,9 @@ def load_initial_distance(matrix: list):
         )
         wh_object.save()
 
+    # drop the cached supplier directory
+    SupplierDirectory.invalidate()
+
 
 def load_initial_truck_rate(matrix: list):
     """ Load truck rate data into backend database. """
@@ -520,7 +549,7 @@ def load_initial_truck_rate(matrix: list):
         if _i >= 0:  # exclude 3rd party
             REV_BASE_CN_NAME_CHOICE[BASE_CN_NAME_ABBR[_s]] = _i
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         name = row[0].strip()
         cube = float(row[1])
         loading_ratio = float(row[2])
@@ -552,6 +581,9 @@ def load_initial_truck_rate(matrix: list):
         # save models
         t.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
 
 def load_initial_region_route_rate(matrix: list):
     """ Load region/route rate data into backend database. """
@@ -568,7 +600,7 @@ def load_initial_region_route_rate(matrix: list):
         (-1, '3rd Party')
     )
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         related_base = None
         for _i, _s in BASE_CHOICE:
             if row[1].strip() == _s:
@@ -592,13 +624,16 @@ def load_initial_region_route_rate(matrix: list):
         # save models
         r.save()
 
+    # drop cached rate tables
+    RateSnapshot.invalidate()
+
 
 # 上传新车车型级别报表
 def load_new_model_statistic(matrix: list):
     """ Load truck rate data into backend database. """
     print("Start loading...")
 
-    for row in matrix[1:]:
+    for row in islice(matrix, 1, None):
         base = row[0].strip()
         plant_code = row[1].strip()
         value = row[2]
@@ -32,4 +32,9 @@ urlpatterns = [
     url(r'^ebom/update$', views.update_ebom, name='ebom_update'),
 
     url(r'^configure/update$', views.update_configure, name='configure_update'),
+
+    url(r'^jobs/(?P<job_id>[0-9]+)$', views.job_status, name='job_status'),
+    url(r'^jobs/(?P<job_id>[0-9]+)/cancel$', views.cancel_job, name='job_cancel'),
+
+    url(r'^metrics$', views.metrics, name='metrics'),
 ]
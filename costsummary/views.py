@@ -1,20 +1,36 @@
 import os
+import csv
 import inspect
+from itertools import chain
+from urllib.parse import quote
 
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.db import connection as RawConnection
-from django.db.models import Model
+from django.db.models import Max, Model, Sum
 from django.shortcuts import Http404, redirect, reverse
 from django.contrib.admin import site as wide_table_dummy_param
 from django.apps import apps
+from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.http import HttpResponseRedirect
 
 import django_excel
 
+from . import jobs
 from . import models
+from .database import reporting_alias
 from .dumps import InitializeData, PERSISTENCE_DIR
+from .metrics import REGISTRY, release, rows_per_second, worker_name
+from .sheets import stream_xlsx
+from .wide import attach_satellites
 from .admin import EbomAdmin as WideTable
 
+# ebom objects read per query when exporting the wide table
+WIDE_TABLE_CHUNK_SIZE = 500
+
+# latest metric samples answered by default
+METRIC_SAMPLES = 500
+
 
 # Create your views here.
 def initialize_data(request, data):
@@ -94,6 +110,7 @@ def group_ebom_by_label(request):
         return HttpResponse(f'{index} entries generated.')
 
 from . import statistic
+from .engine import BatchCostEngine
 def update_ebom(request):
     id_lst = models.Ebom.objects.values('id').distinct()
     for char in id_lst:
@@ -101,32 +118,81 @@ def update_ebom(request):
         # print(id_num)
         # ebom_object=models.Ebom.objects.filter(id = id_num).first()
         # ebom_object.save()
-        for model in ['inboundcalculation','inboundaddress',
+        for model in ['inboundaddress',
                                     'inboundpackage',
                                     'inboundtcspackage']:
             related_model = apps.get_model('costsummary', model_name=model)
             related_object = related_model.objects.filter(bom_id = id_num).first()
             related_object.save()
 
+    # cost fields of all parts, set-based, once addresses & packages are saved again
+    BatchCostEngine().recalculate(models.Ebom.objects.all())
+
     statistic.conf_calculation()
-    statistic.model_statistic()
-    statistic.plant_statistic()
-    statistic.base_statistic()
-    statistic.sgm_statistic()
+    statistic.rollup_statistics()
 
     return redirect(reverse(f'admin:costsummary_{models.Ebom._meta.model_name}_changelist'))
 
 def update_configure(request):
-    statistic.conf_calculation()
-    statistic.model_statistic()
-    statistic.plant_statistic()
-    statistic.base_statistic()
-    statistic.sgm_statistic()
-    statistic.future_model_table()
-    statistic.summary_model_calculate()
+    """ Queue a refresh of all statistics. """
+    job = jobs.enqueue('statistic')
+    messages.info(request, '后台任务 #%d: %s' % (job.pk, job.get_status_display()))
     return redirect(reverse(f'admin:costsummary_{models.ConfigureCalculation._meta.model_name}_changelist'))
 
 
+def job_status(request, job_id):
+    """ Status of a background job as JSON. """
+    job = models.BackgroundJob.objects.filter(pk=job_id).first()
+
+    if job is None:
+        raise Http404('任务不存在.')
+
+    return JsonResponse(job.as_dict())
+
+
+@require_POST
+def cancel_job(request, job_id):
+    """ Cancel a background job, answer its status as JSON. """
+    if not jobs.cancel(job_id):
+        raise Http404('任务不存在或已结束.')
+
+    return JsonResponse(models.BackgroundJob.objects.get(pk=job_id).as_dict())
+
+
+def metrics(request):
+    """ Metrics of this process since the last flush & the recorded history as JSON.
+
+    ?name= keeps the metrics starting with it, ?release= the history of one
+    release, ?limit= the number of latest samples. History is also summed by
+    release & metric, to compare the throughput of releases.
+    """
+    prefix = request.GET.get('name', '')
+    samples = models.MetricSample.objects.using(reporting_alias()).filter(name__startswith=prefix)
+
+    if 'release' in request.GET:
+        samples = samples.filter(release=request.GET['release'])
+
+    try:
+        limit = int(request.GET.get('limit', METRIC_SAMPLES))
+    except ValueError:
+        raise Http404('limit 必须是整数.')
+
+    current = [dict(stat, name=name, rows_per_second=rows_per_second(stat['rows'], stat['seconds']))
+               for name, stat in REGISTRY.snapshot().items() if name.startswith(prefix)]
+
+    releases = samples.order_by().values('release', 'name').annotate(
+        calls=Sum('calls'), seconds=Sum('seconds'), max_seconds=Max('max_seconds'), queries=Sum('queries'),
+        db_seconds=Sum('db_seconds'), rows=Sum('rows'), finished=Max('finished')).order_by('name', 'finished')
+
+    return JsonResponse({
+        'release': release(),
+        'worker': worker_name(),
+        'current': current,
+        'releases': [dict(row, rows_per_second=rows_per_second(row['rows'], row['seconds'])) for row in releases],
+        'samples': [sample.as_dict() for sample in samples.order_by('-finished')[:limit]],
+    })
+
+
 def download_sheet_template(request, sheet):
     """ Download sheet template. """
     dst_file = None
@@ -217,14 +283,13 @@ get_{model_name}_{field_name}.short_description = '{model_verbose_name}/{field_v
     return HttpResponse(dsl_str, content_type='text/plain')
 
 
-def download_wide_table(request, nl_mapping_id):
-    """ Download wide table. """
+def wide_table_columns():
+    """ Wide table columns: (field, is_native, header) in list_display order, label excluded. """
     all_fields = WideTable.list_display
     concerned_fields = [e for e in all_fields if e not in ('label',)]
 
     # native fields are ones of Ebom class
-    is_native = []
-    header = []
+    columns = []
     ebom_fields = dict([
         (e.name, e.verbose_name if hasattr(e, 'verbose_name') else e.name)
         for e in models.Ebom._meta.get_fields()
@@ -233,50 +298,103 @@ def download_wide_table(request, nl_mapping_id):
     for field in concerned_fields:
         if not hasattr(WideTable, field):
             if field in ebom_fields:
-                is_native.append(True)
-                header.append(ebom_fields[field])
+                columns.append((field, True, ebom_fields[field]))
         else:
             _method = getattr(WideTable, field)
 
             if field[0: 4] == 'get_' and callable(_method):
-                is_native.append(False)
-                header.append(_method.short_description)
+                columns.append((field, False, _method.short_description))
+
+    assert len(concerned_fields) == len(columns)
+
+    return columns
 
-    assert len(concerned_fields) == len(is_native)
 
+def wide_table_rows(ebom_objects, columns):
+    """ Yield a wide table row per ebom object, reading chunk by chunk along the primary key. """
     # initialize a wide table object
     wide_table_object = WideTable(models.Ebom, wide_table_dummy_param)
+    ebom_objects = ebom_objects.select_related(*WideTable.list_select_related).order_by('pk')
+    last_pk = 0
 
-    # export two-dimensional array
-    wide_table_matrix = [header]
-    ebom_objects = models.Ebom.objects.filter(label__id=nl_mapping_id)
+    while True:
+        chunk = attach_satellites(ebom_objects.filter(pk__gt=last_pk)[:WIDE_TABLE_CHUNK_SIZE])
 
-    for ebom_object in ebom_objects:
-        # a row for wide table
-        wide_table_row = []
-        index = 0
+        for ebom_object in chunk:
+            # a row for wide table
+            wide_table_row = []
+
+            for field, is_native, _ in columns:
+                if is_native:
+                    field_or_fk = getattr(ebom_object, field)
 
-        for field in concerned_fields:
-            if is_native[index]:
-                field_or_fk = getattr(ebom_object, field)
+                    if isinstance(field_or_fk, Model):
+                        wide_table_row.append(str(field_or_fk))
+                    else:
+                        wide_table_row.append(field_or_fk)
 
-                if isinstance(field_or_fk, Model):
-                    wide_table_row.append(str(field_or_fk))
                 else:
-                    wide_table_row.append(field_or_fk)
+                    method = getattr(wide_table_object, field)
+                    wide_table_row.append(method(ebom_object))
 
-            else:
-                method = getattr(wide_table_object, field)
-                wide_table_row.append(method(ebom_object))
+            yield wide_table_row
 
-            index += 1
+        if len(chunk) < WIDE_TABLE_CHUNK_SIZE:
+            break
+
+        last_pk = chunk[-1].pk
+
+
+class Echo:
+    """ File-like object handing back what is written, for csv.writer. """
 
-        wide_table_matrix.append(wide_table_row)
+    def write(self, value):
+        return value
+
+
+def download_wide_table(request, nl_mapping_id):
+    """ Download wide table.
+
+    Streamed as an xlsx workbook by default or as csv with ?format=csv, the
+    first bytes are sent before any row is read. ?format=xls builds the legacy
+    sheet in memory, limited to 65536 rows.
+    """
+    columns = wide_table_columns()
+    header = [e[2] for e in columns]
+    # read-only connection, so a long export does not hold up uploads
+    ebom_objects = models.Ebom.objects.using(reporting_alias()).filter(label__id=nl_mapping_id)
 
     # download file name
     label = models.NominalLabelMapping.objects.get(pk=nl_mapping_id)
+    file_format = request.GET.get('format', 'xlsx')
 
-    return django_excel.make_response_from_array(wide_table_matrix, 'xls', file_name=str(label))
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+
+        def csv_lines():
+            yield '\ufeff' + writer.writerow(header)
+
+            for wide_table_row in wide_table_rows(ebom_objects, columns):
+                yield writer.writerow(['' if e is None else e for e in wide_table_row])
+
+        response = StreamingHttpResponse(csv_lines(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = "attachment; filename*=UTF-8''%s.csv" % quote(str(label))
+        return response
+
+    elif file_format == 'xlsx':
+        response = StreamingHttpResponse(
+            stream_xlsx(chain([header], wide_table_rows(ebom_objects, columns))),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = "attachment; filename*=UTF-8''%s.xlsx" % quote(str(label))
+        return response
+
+    elif file_format == 'xls':
+        # export two-dimensional array
+        wide_table_matrix = [header] + list(wide_table_rows(ebom_objects, columns))
+        return django_excel.make_response_from_array(wide_table_matrix, 'xls', file_name=str(label))
+
+    else:
+        raise Http404('未知文件格式.')
 
 
 def clear_label_session(request):
@@ -290,30 +408,7 @@ def clear_label_session(request):
 def dsl_parse_wide_schema(request):
     """ Schema to parse wide table. """
     # generate header
-    all_fields = WideTable.list_display
-    concerned_fields = [e for e in all_fields if e not in ('label',)]
-
-    # native fields are ones of Ebom class
-    is_native = []
-    header = []
-    ebom_fields = dict([
-        (e.name, e.verbose_name if hasattr(e, 'verbose_name') else e.name)
-        for e in models.Ebom._meta.get_fields()
-    ])
-
-    for field in concerned_fields:
-        if not hasattr(WideTable, field):
-            if field in ebom_fields:
-                is_native.append(True)
-                header.append(ebom_fields[field])
-        else:
-            _method = getattr(WideTable, field)
-
-            if field[0: 4] == 'get_' and callable(_method):
-                is_native.append(False)
-                header.append(_method.short_description)
-
-    assert len(concerned_fields) == len(is_native)
+    concerned_fields, is_native, header = zip(*wide_table_columns())
 
     # wide table header
     WIDE_HEADER = []
@@ -0,0 +1,158 @@
+from django.db import connections, router, transaction
+
+from . import models
+
+# sqlite allows 999 variables per statement
+CHUNK_SIZE = 500
+
+
+def _related_cache(related_name: str) -> str:
+    """ Attribute an Ebom caches a reverse one-to-one object in. """
+    return models.Ebom._meta.get_field(related_name).get_cache_name()
+
+
+# related name & cache attribute of each mirrored satellite
+SATELLITE_CACHES = [
+    (satellite, satellite._meta.get_field('bom').related_query_name(),
+     _related_cache(satellite._meta.get_field('bom').related_query_name()))
+    for satellite in models.WIDE_SATELLITES
+]
+
+WIDE_CACHE = _related_cache('rel_wide')
+
+
+def wide_select(connection) -> tuple:
+    """ EbomWide columns & the select reading them from Ebom left joined with every satellite. """
+    qn = connection.ops.quote_name
+    wide_opts = models.EbomWide._meta
+
+    columns = [wide_opts.get_field('bom').column, wide_opts.get_field('label').column]
+    expressions = ['e.%s' % qn(models.Ebom._meta.pk.column), 'e.%s' % qn(models.Ebom._meta.get_field('label').column)]
+    joins = []
+
+    for index, satellite in enumerate(models.WIDE_SATELLITES):
+        alias = 's%d' % index
+        opts = satellite._meta
+
+        joins.append('LEFT JOIN %s %s ON %s.%s = e.%s' % (
+            qn(opts.db_table), alias, alias, qn(opts.get_field('bom').column), qn(models.Ebom._meta.pk.column)))
+
+        columns.append(wide_opts.get_field(models.wide_column(satellite, 'pk')).column)
+        expressions.append('%s.%s' % (alias, qn(opts.pk.column)))
+
+        for field in models.wide_fields(satellite):
+            columns.append(wide_opts.get_field(models.wide_column(satellite, field.name)).column)
+            expressions.append('%s.%s' % (alias, qn(field.column)))
+
+    sql = 'INSERT INTO %s (%s) SELECT %s FROM %s e %s' % (
+        qn(wide_opts.db_table), ', '.join(qn(column) for column in columns), ', '.join(expressions),
+        qn(models.Ebom._meta.db_table), ' '.join(joins))
+
+    return columns, sql
+
+
+def refresh_wide(bom_ids=None) -> int:
+    """ Rebuild the EbomWide rows of given parts from Ebom & its satellites, every part by default.
+
+    Rows are deleted & inserted again by one INSERT ... SELECT over the joined
+    satellites per chunk of parts; returns the number of parts given, or of
+    rows written for a full rebuild.
+    """
+    using = router.db_for_write(models.EbomWide)
+    connection = connections[using]
+    _, insert_sql = wide_select(connection)
+    qn = connection.ops.quote_name
+    table = qn(models.EbomWide._meta.db_table)
+    pk = 'e.%s' % qn(models.Ebom._meta.pk.column)
+
+    with transaction.atomic(using=using, savepoint=False):
+        with connection.cursor() as cursor:
+            if bom_ids is None:
+                cursor.execute('DELETE FROM %s' % table)
+                cursor.execute(insert_sql)
+                return cursor.rowcount
+
+            bom_ids = list(set(bom_ids))
+
+            for start in range(0, len(bom_ids), CHUNK_SIZE):
+                chunk = bom_ids[start: start + CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+
+                cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (
+                    table, qn(models.EbomWide._meta.pk.column), placeholders), chunk)
+                cursor.execute('%s WHERE %s IN (%s)' % (insert_sql, pk, placeholders), chunk)
+
+    return len(bom_ids)
+
+
+def fill_wide(ebom_objects) -> int:
+    """ Build the missing EbomWide rows of an Ebom queryset, e.g. parts stored before the wide table. """
+    return refresh_wide(list(ebom_objects.filter(rel_wide__isnull=True).values_list('pk', flat=True)))
+
+
+def write_satellite(instance, update_fields=None):
+    """ Copy the values of a saved satellite into the row of its part with one UPDATE.
+
+    Only update_fields if given, loaded fields otherwise; a part without a row
+    yet gets it built in full.
+    """
+    model = type(instance)
+    deferred = instance.get_deferred_fields()
+    fields = {models.wide_column(model, 'pk'): instance.pk}
+
+    for field in models.wide_fields(model):
+        if field.attname in deferred or (update_fields is not None and field.name not in update_fields):
+            continue
+
+        fields[models.wide_column(model, field.name)] = getattr(instance, field.attname)
+
+    if not models.EbomWide.objects.filter(bom_id=instance.bom_id).update(**fields):
+        refresh_wide([instance.bom_id])
+
+
+def clear_satellite(model, bom_id):
+    """ Blank the columns of a deleted satellite, whether or not its part is being deleted too. """
+    fields = {models.wide_column(model, 'pk'): None}
+    fields.update({models.wide_column(model, field.name): None for field in models.wide_fields(model)})
+    models.EbomWide.objects.filter(bom_id=bom_id).update(**fields)
+
+
+def attach_satellites(ebom_objects) -> list:
+    """ Cache the satellites of eboms read with select_related('rel_wide'), so accessors need no query.
+
+    Parts without an EbomWide row keep reading their satellites from their tables.
+    """
+    ebom_objects = list(ebom_objects)
+
+    for ebom_object in ebom_objects:
+        wide_object = getattr(ebom_object, WIDE_CACHE, None)
+
+        if wide_object is None:
+            continue
+
+        for satellite, _, cache_name in SATELLITE_CACHES:
+            setattr(ebom_object, cache_name, wide_object.satellite(satellite))
+
+    return ebom_objects
+
+
+def ebom_saved(sender, instance, created=False, raw=False, **kwargs):
+    """ post_save receiver of Ebom, a new part has no satellites yet. """
+    if raw:
+        return
+
+    if created:
+        models.EbomWide.objects.create(bom_id=instance.pk, label_id=instance.label_id)
+    elif not models.EbomWide.objects.filter(bom_id=instance.pk).update(label_id=instance.label_id):
+        refresh_wide([instance.pk])
+
+
+def satellite_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """ post_save receiver of mirrored satellites. """
+    if not raw:
+        write_satellite(instance, update_fields)
+
+
+def satellite_deleted(sender, instance, **kwargs):
+    """ post_delete receiver of mirrored satellites. """
+    clear_satellite(sender, instance.bom_id)